@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class CameraAiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'camera_ai'
+
+    def ready(self):
+        # Chỉ process phục vụ camera mới cần load YOLO/OCR sớm,
+        # các process khác (manage.py, seed scripts, admin) load lazy khi dùng
+        if getattr(settings, 'CAMERA_AI_WARMUP', False):
+            import threading
+            from camera_ai.service import camera_service
+
+            threading.Thread(target=camera_service.warm_up, daemon=True).start()
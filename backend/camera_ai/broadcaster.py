@@ -0,0 +1,264 @@
+# camera_ai/broadcaster.py
+"""
+MJPEG broadcaster - mỗi camera chỉ detect + encode JPEG 1 lần cho mọi người xem
+
+Mỗi camera có 1 thread producer (chỉ chạy khi có người xem). Producer lấy frame, chạy
+detection, vẽ overlay, encode JPEG và lưu thành 1 chunk MJPEG (bytes bất biến). Mọi
+subscriber (tab trình duyệt) nhận cùng chunk đó, nên số người xem không ảnh hưởng CPU.
+
+Người xem qua ASGI dùng asubscribe(): mỗi tab chỉ là 1 coroutine chờ asyncio.Event,
+producer đánh thức các event loop khi có chunk mới (không giữ worker thread).
+
+Đóng tab: Django ≥ 5.0 nhận http.disconnect và hủy task đang stream → finally của
+asubscribe() giảm subscribers, producer dừng sau IDLE_TIMEOUT. (Django 4.2 không theo dõi
+disconnect với streaming response, uvicorn bỏ qua send sau khi ngắt → generator chạy mãi.)
+"""
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+PLACEHOLDER_PATH = Path(__file__).parent / 'static' / 'camera_offline.png'
+
+# Producer dừng khi không còn ai xem trong khoảng này (giây)
+IDLE_TIMEOUT = 5.0
+
+
+def mjpeg_chunk(jpeg_bytes):
+    """Đóng gói 1 frame JPEG thành 1 part của multipart/x-mixed-replace"""
+    return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg_bytes + b'\r\n'
+
+
+def encode_jpeg(frame):
+    ret, buffer = cv2.imencode('.jpg', frame)
+    return buffer.tobytes() if ret else None
+
+
+_placeholder_jpeg = None
+_placeholder_lock = threading.Lock()
+
+
+def get_offline_placeholder():
+    """JPEG "Camera Offline" (encode 1 lần, dùng lại cho mọi stream)"""
+    global _placeholder_jpeg
+    if _placeholder_jpeg is None:
+        with _placeholder_lock:
+            if _placeholder_jpeg is None:
+                placeholder = cv2.imread(str(PLACEHOLDER_PATH))
+                if placeholder is None:
+                    # Create black frame with text
+                    placeholder = 255 * np.ones((480, 640, 3), dtype=np.uint8)
+                    cv2.putText(placeholder, 'Camera Offline', (200, 240),
+                                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                _placeholder_jpeg = encode_jpeg(placeholder)
+    return _placeholder_jpeg
+
+
+def mjpeg_response(request, broadcaster):
+    """
+    StreamingHttpResponse MJPEG cho 1 người xem
+
+    Chạy dưới ASGI → async iterator (coroutine), dưới WSGI (runserver) → generator thường.
+    """
+    if isinstance(request, ASGIRequest):
+        stream = broadcaster.asubscribe()
+    else:
+        stream = broadcaster.subscribe()
+    return StreamingHttpResponse(stream, content_type='multipart/x-mixed-replace; boundary=frame')
+
+
+class FrameBroadcaster:
+    """
+    Broadcaster cho 1 camera
+
+    Args:
+        name: Tên camera (dùng cho log)
+        produce_fn: Hàm trả về frame đã vẽ overlay (numpy), hoặc None nếu camera offline
+        offline: 'placeholder' (phát ảnh Camera Offline) hoặc 'close' (kết thúc stream)
+        max_fps: Giới hạn tốc độ producer
+    """
+
+    def __init__(self, name, produce_fn, offline='placeholder', max_fps=30):
+        self.name = name
+        self.produce_fn = produce_fn
+        self.offline = offline
+        self.frame_interval = 1.0 / max_fps
+
+        self.condition = threading.Condition()
+        self.seq = 0
+        self.chunk = None
+        self.jpeg = None
+        self.closed = False
+        self.subscribers = 0
+        self.async_waiters = set()  # (event loop, asyncio.Event) của người xem async
+        self.last_subscriber_at = 0.0
+        self.stats = {'frames_encoded': 0, 'chunks_sent': 0}
+
+        self._thread = None
+
+    def _ensure_running(self):
+        if self._thread is None or not self._thread.is_alive():
+            self.closed = False
+            self._thread = threading.Thread(target=self._run, name=f'broadcaster-{self.name}', daemon=True)
+            self._thread.start()
+
+    def _publish(self, jpeg, closed=False):
+        with self.condition:
+            self.seq += 1
+            self.jpeg = jpeg
+            self.chunk = mjpeg_chunk(jpeg) if jpeg else None
+            self.closed = closed
+            self.condition.notify_all()
+            waiters = list(self.async_waiters)
+
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Event loop đã đóng
+                pass
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if self.subscribers == 0 and time.time() - self.last_subscriber_at > IDLE_TIMEOUT:
+                    self._thread = None
+                    return
+
+            start = time.time()
+            try:
+                frame = self.produce_fn()
+            except Exception as e:
+                print(f"Stream error [{self.name}]: {e}")
+                frame = None
+
+            if frame is None:
+                if self.offline == 'close':
+                    self._publish(None, closed=True)
+                    with self.condition:
+                        self._thread = None
+                    return
+                # Placeholder không đổi → chỉ phát lại 1 lần/giây cho người xem mới
+                self._publish(get_offline_placeholder())
+                time.sleep(1.0)
+                continue
+
+            jpeg = encode_jpeg(frame)
+            if jpeg:
+                self.stats['frames_encoded'] += 1
+                self._publish(jpeg)
+
+            time.sleep(max(0, self.frame_interval - (time.time() - start)))
+
+    def latest_jpeg(self):
+        """JPEG mới nhất (None nếu producer chưa chạy)"""
+        return self.jpeg
+
+    def subscribe(self):
+        """Generator trả về các chunk MJPEG cho 1 người xem"""
+        with self.condition:
+            self.subscribers += 1
+            self.last_subscriber_at = time.time()
+            # Stream trước đã đóng → bỏ qua chunk cũ, chờ frame mới
+            last_seq = self.seq if self.closed else 0
+            self._ensure_running()
+
+        try:
+            while True:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.seq != last_seq, timeout=IDLE_TIMEOUT)
+                    if self.seq == last_seq:
+                        # Producer có thể đã dừng (VD: camera offline rồi bật lại)
+                        self._ensure_running()
+                        continue
+                    last_seq = self.seq
+                    chunk = self.chunk
+                    closed = self.closed
+
+                if closed or chunk is None:
+                    return
+
+                self.stats['chunks_sent'] += 1
+                yield chunk
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+                self.last_subscriber_at = time.time()
+
+    async def asubscribe(self):
+        """Async generator trả về các chunk MJPEG cho 1 người xem (ASGI)"""
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+
+        with self.condition:
+            self.subscribers += 1
+            self.async_waiters.add(waiter)
+            self.last_subscriber_at = time.time()
+            last_seq = self.seq if self.closed else 0
+            self._ensure_running()
+
+        try:
+            while True:
+                with self.condition:
+                    seq, chunk, closed = self.seq, self.chunk, self.closed
+
+                if seq == last_seq:
+                    try:
+                        await asyncio.wait_for(event.wait(), timeout=IDLE_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        with self.condition:
+                            self._ensure_running()
+                    event.clear()
+                    continue
+
+                last_seq = seq
+                if closed or chunk is None:
+                    return
+
+                self.stats['chunks_sent'] += 1
+                yield chunk
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+                self.async_waiters.discard(waiter)
+                self.last_subscriber_at = time.time()
+
+    def status(self):
+        return {
+            'subscribers': self.subscribers,
+            'async_subscribers': len(self.async_waiters),
+            'running': self._thread is not None,
+            'frames_encoded': self.stats['frames_encoded'],
+            'chunks_sent': self.stats['chunks_sent']
+        }
+
+
+class BroadcasterRegistry:
+    """Quản lý broadcaster theo camera (1 broadcaster / camera / process)"""
+
+    def __init__(self):
+        self._broadcasters = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, produce_fn, **kwargs):
+        with self._lock:
+            broadcaster = self._broadcasters.get(name)
+            if broadcaster is None:
+                broadcaster = FrameBroadcaster(name, produce_fn, **kwargs)
+                self._broadcasters[name] = broadcaster
+            return broadcaster
+
+    def find(self, name):
+        return self._broadcasters.get(name)
+
+    def status(self):
+        return {name: b.status() for name, b in self._broadcasters.items()}
+
+
+# Singleton instance
+broadcasters = BroadcasterRegistry()
@@ -0,0 +1,150 @@
+# camera_ai/detection_scheduler.py
+"""
+Detection scheduler - tách tần suất detection khỏi tốc độ stream
+
+- YOLO chỉ chạy theo nhịp cấu hình (VD: 3 Hz), không phải trên mọi frame
+- OCR chỉ chạy khi xuất hiện box biển số mới (IoU thấp so với box đã OCR)
+- Các frame ở giữa được vẽ lại overlay gần nhất, stream giữ nguyên FPS của camera
+- Kết quả detection/OCR được nhớ theo version của frame: frame đứng yên (ảnh inject)
+  chỉ được phân tích đúng 1 lần
+"""
+import os
+import threading
+import time
+
+from camera_ai.inference_scheduler import InferenceRejected, inference_priority
+
+DEFAULT_DETECTION_HZ = float(os.getenv('CAMERA_AI_DETECTION_HZ', '3'))
+
+
+def bbox_iou(a, b):
+    """IoU của 2 bbox [x1, y1, x2, y2]"""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    if inter == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+class DetectionScheduler:
+    """
+    Lịch chạy detection/OCR cho 1 camera
+
+    Args:
+        ai_service: CameraAIService (detect_license_plate, extract_text_from_plate, visualize_detection)
+        detection_hz: Số lần chạy YOLO mỗi giây
+        new_plate_iou: Box có IoU < ngưỡng này với box đã OCR được coi là biển số mới
+    """
+
+    def __init__(self, ai_service, detection_hz=DEFAULT_DETECTION_HZ, new_plate_iou=0.5):
+        self.ai_service = ai_service
+        self.detection_interval = 1.0 / detection_hz if detection_hz > 0 else 0.0
+        self.new_plate_iou = new_plate_iou
+
+        self.lock = threading.Lock()
+        self.last_detect_at = 0.0
+        self.plate = None          # Box tốt nhất lần detect gần nhất
+        self.ocr_bbox = None       # Box đã được OCR
+        self.detected_plate = None
+        self.confidence = 0.0
+        self.analysed_version = None  # Version của frame đã phân tích gần nhất
+
+        self.stats = {'frames': 0, 'detections': 0, 'ocr_runs': 0, 'cache_hits': 0, 'cache_misses': 0,
+                      'dropped': 0}
+
+    def _is_new_plate(self, bbox):
+        return self.ocr_bbox is None or bbox_iou(bbox, self.ocr_bbox) < self.new_plate_iou
+
+    def _detect(self, frame):
+        """
+        Chạy YOLO, và OCR nếu box là biển số mới
+
+        Returns:
+            bool: Kết quả được nhớ theo version của frame (False nếu OCR chưa đọc được,
+                frame cùng version sẽ được phân tích lại ở nhịp sau)
+        """
+        plates = self.ai_service.detect_license_plate(frame)
+        self.stats['detections'] += 1
+
+        if not plates:
+            # Xe đã đi khỏi → xóa overlay
+            self.plate = None
+            self.ocr_bbox = None
+            self.detected_plate = None
+            self.confidence = 0.0
+            return True
+
+        best_plate = max(plates, key=lambda x: x['confidence'])
+        self.plate = best_plate
+
+        if self._is_new_plate(best_plate['bbox']):
+            ocr_result = self.ai_service.extract_text_from_plate(frame, best_plate['bbox'])
+            self.stats['ocr_runs'] += 1
+            if not ocr_result or not ocr_result.get('text'):
+                # Không nhớ lần đọc lỗi: box này vẫn là "mới" và được OCR lại ở nhịp sau
+                self.ocr_bbox = None
+                self.detected_plate = None
+                self.confidence = 0.0
+                return False
+            self.ocr_bbox = best_plate['bbox']
+            self.detected_plate = ocr_result['text']
+            self.confidence = ocr_result['confidence']
+        return True
+
+    def process(self, frame, version=None, now=None):
+        """
+        Xử lý 1 frame của stream
+
+        Args:
+            frame: Frame hiện tại
+            version: Version của frame (None = không memoize)
+
+        Returns:
+            dict: {'frame' (đã vẽ overlay), 'detected_plate', 'confidence', 'detection_ran'}
+        """
+        now = now or time.time()
+
+        with self.lock:
+            self.stats['frames'] += 1
+            detection_ran = False
+            if now - self.last_detect_at >= self.detection_interval:
+                self.last_detect_at = now
+                if version is not None and version == self.analysed_version:
+                    # Frame chưa đổi → dùng lại kết quả đã có
+                    self.stats['cache_hits'] += 1
+                else:
+                    self.stats['cache_misses'] += 1
+                    try:
+                        # Live view: lớp ưu tiên thấp hơn quét cổng, bị bỏ khi CPU bận
+                        with inference_priority('live'):
+                            cacheable = self._detect(frame)
+                        self.analysed_version = version if cacheable else None
+                        detection_ran = True
+                    except InferenceRejected:
+                        # Giữ overlay cũ, thử lại ở nhịp sau
+                        self.stats['dropped'] += 1
+
+            plate = self.plate
+            detected_plate = self.detected_plate
+            confidence = self.confidence
+
+        # Vẽ overlay gần nhất
+        if plate:
+            frame = self.ai_service.visualize_detection(frame, [plate], detected_plate)
+
+        return {
+            'frame': frame,
+            'detected_plate': detected_plate,
+            'confidence': confidence,
+            'detection_ran': detection_ran
+        }
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        lookups = stats['cache_hits'] + stats['cache_misses']
+        stats['cache_hit_rate'] = round(stats['cache_hits'] / lookups, 3) if lookups else 0.0
+        stats['detection_hz'] = round(1.0 / self.detection_interval, 2) if self.detection_interval else None
+        return stats
@@ -0,0 +1,267 @@
+# camera_ai/detectors.py
+"""
+Detector backends cho YOLO biển số
+
+- torch: ultralytics.YOLO chạy PyTorch eager (mặc định cũ)
+- onnx: export 1 lần sang ONNX, chạy bằng ONNX Runtime (CPUExecutionProvider)
+- openvino: export 1 lần sang OpenVINO IR, chạy bằng OpenVINO runtime trên CPU
+
+Mọi backend đều trả về cùng format với CameraAIService.detect_license_plate:
+[{'bbox': [x1, y1, x2, y2], 'confidence': float, 'class': int}, ...]
+"""
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+DETECTOR_BACKENDS = ('torch', 'onnx', 'openvino')
+
+
+class BaseDetector:
+    """Interface chung của các detector backend"""
+
+    name = None
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = Path(model_path)
+        self.num_threads = num_threads  # Thread nội bộ của runtime (None = mặc định)
+
+    def predict(self, frame, conf_threshold):
+        """
+        Nhận diện biển số trên 1 frame
+
+        Returns:
+            list: [{'bbox', 'confidence', 'class'}, ...]
+        """
+        raise NotImplementedError
+
+    def predict_batch(self, frames, conf_threshold):
+        """Nhận diện trên nhiều frame (mặc định chạy lần lượt)"""
+        return [self.predict(frame, conf_threshold) for frame in frames]
+
+
+class TorchDetector(BaseDetector):
+    """YOLO chạy qua ultralytics (PyTorch)"""
+
+    name = 'torch'
+
+    def __init__(self, model_path, num_threads=None):
+        super().__init__(model_path, num_threads)
+        from ultralytics import YOLO
+        self.model = YOLO(str(self.model_path))
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+
+    def predict(self, frame, conf_threshold):
+        return self.predict_batch([frame], conf_threshold)[0]
+
+    def predict_batch(self, frames, conf_threshold):
+        # ultralytics nhận list ảnh và chạy 1 batch
+        results = self.model(list(frames), conf=conf_threshold, verbose=False)
+
+        batch_plates = []
+        for result in results:
+            plates = []
+            for box in result.boxes:
+                cls = int(box.cls[0])
+                conf = float(box.conf[0])
+
+                if conf > conf_threshold:
+                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
+                    plates.append({
+                        'bbox': [int(x1), int(y1), int(x2), int(y2)],
+                        'confidence': conf,
+                        'class': cls
+                    })
+            batch_plates.append(plates)
+
+        return batch_plates
+
+
+class ExportedDetector(BaseDetector):
+    """
+    Base cho các backend chạy model đã export (ONNX / OpenVINO)
+
+    Tự export từ file .pt nếu artifact chưa có, sau đó tự làm letterbox,
+    decode output YOLOv8 (1, 4 + num_classes, N) và NMS bằng OpenCV.
+    """
+
+    export_format = None
+    iou_threshold = 0.7  # Giống mặc định của ultralytics
+
+    def __init__(self, model_path, num_threads=None, imgsz=640):
+        super().__init__(model_path, num_threads)
+        self.imgsz = imgsz
+        self.artifact_path = self._ensure_exported()
+        self._load(self.artifact_path)
+
+    @property
+    def expected_artifact(self):
+        """Đường dẫn artifact cache cạnh file .pt trong camera_ai/models"""
+        raise NotImplementedError
+
+    def _ensure_exported(self):
+        """Export model sang định dạng của backend (chỉ làm 1 lần)"""
+        if self.model_path.suffix != '.pt':
+            # Đã truyền thẳng artifact
+            return self.model_path
+
+        artifact = self.expected_artifact
+        if artifact.exists() and artifact.stat().st_mtime >= self.model_path.stat().st_mtime:
+            return artifact
+
+        print(f"[INFO] Exporting {self.model_path.name} → {self.export_format} (chỉ chạy 1 lần)...")
+        from ultralytics import YOLO
+        exported = YOLO(str(self.model_path)).export(format=self.export_format, imgsz=self.imgsz)
+        print(f"[OK] Exported: {exported}")
+        return Path(exported)
+
+    def _load(self, artifact_path):
+        raise NotImplementedError
+
+    def _infer(self, blob):
+        """Chạy model, trả về output thô (1, 4 + num_classes, N)"""
+        raise NotImplementedError
+
+    def predict(self, frame, conf_threshold):
+        blob, ratio, pad = self._letterbox(frame)
+        output = self._infer(blob)
+        return self._postprocess(output, ratio, pad, frame.shape, conf_threshold)
+
+    def _letterbox(self, frame):
+        """Resize giữ tỉ lệ + padding 114 giống ultralytics"""
+        h, w = frame.shape[:2]
+        ratio = min(self.imgsz / h, self.imgsz / w)
+        new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+        pad_x, pad_y = (self.imgsz - new_w) / 2, (self.imgsz - new_h) / 2
+
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+        left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+        padded = cv2.copyMakeBorder(resized, top, bottom, left, right,
+                                    cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+        # BGR → RGB, HWC → NCHW, [0, 1]
+        blob = padded[:, :, ::-1].transpose(2, 0, 1)
+        blob = np.ascontiguousarray(blob, dtype=np.float32)[None] / 255.0
+
+        return blob, ratio, (left, top)
+
+    def _postprocess(self, output, ratio, pad, frame_shape, conf_threshold):
+        preds = np.squeeze(output, axis=0).T  # (N, 4 + num_classes)
+        scores = preds[:, 4:]
+        classes = scores.argmax(axis=1)
+        confs = scores.max(axis=1)
+
+        keep = confs > conf_threshold
+        if not np.any(keep):
+            return []
+
+        preds, classes, confs = preds[keep], classes[keep], confs[keep]
+
+        # cx, cy, w, h (tọa độ letterbox) → x, y, w, h (tọa độ ảnh gốc)
+        pad_x, pad_y = pad
+        boxes = preds[:, :4].copy()
+        boxes[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2 - pad_x) / ratio
+        boxes[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2 - pad_y) / ratio
+        boxes[:, 2] /= ratio
+        boxes[:, 3] /= ratio
+
+        indices = cv2.dnn.NMSBoxes(boxes.tolist(), confs.tolist(), conf_threshold, self.iou_threshold)
+
+        frame_h, frame_w = frame_shape[:2]
+        plates = []
+        for i in np.array(indices).flatten():
+            x, y, bw, bh = boxes[i]
+            x1, y1 = max(0, int(x)), max(0, int(y))
+            x2, y2 = min(frame_w, int(x + bw)), min(frame_h, int(y + bh))
+            plates.append({
+                'bbox': [x1, y1, x2, y2],
+                'confidence': float(confs[i]),
+                'class': int(classes[i])
+            })
+
+        return plates
+
+
+class OnnxRuntimeDetector(ExportedDetector):
+    """YOLO chạy qua ONNX Runtime (CPUExecutionProvider)"""
+
+    name = 'onnx'
+    export_format = 'onnx'
+
+    @property
+    def expected_artifact(self):
+        return self.model_path.with_suffix('.onnx')
+
+    def _load(self, artifact_path):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        self.session = ort.InferenceSession(
+            str(artifact_path), sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+        # Dùng kích thước input tĩnh của model nếu có
+        input_shape = self.session.get_inputs()[0].shape
+        if isinstance(input_shape[-1], int):
+            self.imgsz = input_shape[-1]
+
+    def _infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVINODetector(ExportedDetector):
+    """YOLO chạy qua OpenVINO runtime trên CPU"""
+
+    name = 'openvino'
+    export_format = 'openvino'
+
+    @property
+    def expected_artifact(self):
+        return self.model_path.parent / f'{self.model_path.stem}_openvino_model'
+
+    def _load(self, artifact_path):
+        import openvino as ov
+
+        xml_files = list(Path(artifact_path).glob('*.xml'))
+        if not xml_files:
+            raise FileNotFoundError(f"OpenVINO IR not found in: {artifact_path}")
+
+        core = ov.Core()
+        config = {'INFERENCE_NUM_THREADS': self.num_threads} if self.num_threads else {}
+        self.compiled_model = core.compile_model(core.read_model(str(xml_files[0])), 'CPU', config)
+        self.output_layer = self.compiled_model.output(0)
+
+    def _infer(self, blob):
+        return self.compiled_model([blob])[self.output_layer]
+
+
+def create_detector(model_path, backend='onnx', num_threads=None):
+    """
+    Tạo detector theo backend, tự fallback về torch nếu backend không khả dụng
+
+    Args:
+        model_path: Đường dẫn file .pt (hoặc artifact đã export)
+        backend: 'torch', 'onnx' hoặc 'openvino'
+        num_threads: Số thread nội bộ của runtime (thread budget / số inference đồng thời)
+    """
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Invalid detector backend. Must be one of: {DETECTOR_BACKENDS}")
+
+    if backend == 'onnx':
+        try:
+            return OnnxRuntimeDetector(model_path, num_threads)
+        except Exception as e:
+            print(f"[WARNING] ONNX Runtime backend failed, using torch: {e}")
+    elif backend == 'openvino':
+        try:
+            return OpenVINODetector(model_path, num_threads)
+        except Exception as e:
+            print(f"[WARNING] OpenVINO backend failed, using torch: {e}")
+
+    return TorchDetector(model_path, num_threads)
@@ -0,0 +1,435 @@
+# camera_ai/frame_bus.py
+"""
+Frame bus - chia sẻ frame camera giữa các process qua shared memory
+
+- Camera owner daemon (manage.py camera_frame_bus) là process DUY NHẤT mở/decode camera,
+  mỗi camera ghi frame vào 1 ring buffer shared memory có sequence number
+- Inference server đọc frame trực tiếp từ shared memory (zero-copy, view chỉ đọc), chạy model
+  trên view rồi kiểm tra lại seq của slot: slot bị ghi đè trong lúc dùng → kết quả bị bỏ,
+  client gửi lại bytes của frame
+- Web worker copy frame 1 lần (vẽ overlay / lưu ảnh / dùng qua nhiều thread), không decode lại camera
+- Lệnh điều khiển (start/stop/inject/status) gửi tới daemon qua Unix socket
+
+Layout 1 ring (tên shm: parking_frames_<camera_id>):
+    header  uint64[8]  : magic, slots, height, width, channels, latest_seq, active, closed
+    seqs    uint64[N]  : sequence number của từng slot (0 = đang ghi)
+    stamps  float64[N] : thời điểm capture (time.time())
+    data    uint8[N * height * width * channels]
+"""
+import os
+import socket
+import socketserver
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import cv2
+import numpy as np
+
+from camera_ai.inference_server import recv_message, send_message
+
+RING_MAGIC = 0x50524B46  # 'PRKF'
+HEADER_FIELDS = 8
+H_MAGIC, H_SLOTS, H_HEIGHT, H_WIDTH, H_CHANNELS, H_LATEST, H_ACTIVE, H_CLOSED = range(HEADER_FIELDS)
+
+DEFAULT_SLOTS = 4
+
+
+def ring_name(camera_id):
+    return f'parking_frames_{camera_id}'
+
+
+class BusFrame(np.ndarray):
+    """
+    Frame đọc từ frame bus, mang theo bus_ref = (camera_id, seq)
+
+    InferenceClient gửi bus_ref thay vì bytes của frame, inference server đọc lại
+    trực tiếp từ shared memory. bus_ref chỉ giữ khi shape không đổi (crop sẽ mất ref).
+    """
+
+    def __array_finalize__(self, obj):
+        ref = getattr(obj, 'bus_ref', None)
+        self.bus_ref = ref if ref is not None and getattr(obj, 'shape', None) == self.shape else None
+
+
+class _FrameRing:
+    """Các view numpy trên vùng shared memory của 1 ring"""
+
+    def _map(self, shm, slots, shape):
+        self.shm = shm
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.frame_size = int(np.prod(self.shape))
+
+        buf = shm.buf
+        offset = 0
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.uint64, buffer=buf, offset=offset)
+        offset += HEADER_FIELDS * 8
+        self.seqs = np.ndarray((slots,), dtype=np.uint64, buffer=buf, offset=offset)
+        offset += slots * 8
+        self.stamps = np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=offset)
+        offset += slots * 8
+        self.data = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=buf, offset=offset)
+
+    @staticmethod
+    def _size(slots, shape):
+        return HEADER_FIELDS * 8 + slots * 16 + slots * int(np.prod(shape))
+
+
+class FrameRingWriter(_FrameRing):
+    """Ghi frame vào ring (chỉ camera owner daemon dùng)"""
+
+    def __init__(self, camera_id, shape, slots=DEFAULT_SLOTS, start_seq=0):
+        self.camera_id = camera_id
+        name = ring_name(camera_id)
+
+        # Xóa ring cũ (VD: daemon trước bị kill)
+        try:
+            old = SharedMemory(name=name)
+            old.close()
+            old.unlink()
+        except FileNotFoundError:
+            pass
+
+        shm = SharedMemory(name=name, create=True, size=self._size(slots, shape))
+        self._map(shm, slots, shape)
+
+        self.seqs[:] = 0
+        self.stamps[:] = 0
+        # start_seq: ring tạo lại (đổi kích thước) vẫn tiếp tục dãy seq cũ → seq luôn tăng
+        self.header[:] = [RING_MAGIC, slots, shape[0], shape[1], shape[2], start_seq, 1, 0]
+
+    def publish(self, frame, timestamp=None):
+        """Ghi 1 frame, trả về sequence number"""
+        if frame.shape != self.shape:
+            frame = cv2.resize(frame, (self.shape[1], self.shape[0]))
+
+        seq = int(self.header[H_LATEST]) + 1
+        slot = seq % self.slots
+
+        # Seqlock: đánh dấu slot đang ghi → copy → công bố seq mới
+        self.seqs[slot] = 0
+        self.data[slot][...] = frame
+        self.stamps[slot] = timestamp or time.time()
+        self.seqs[slot] = seq
+        self.header[H_LATEST] = seq
+        self.header[H_ACTIVE] = 1
+        return seq
+
+    def set_active(self, active):
+        self.header[H_ACTIVE] = 1 if active else 0
+
+    def close(self):
+        """Đánh dấu ring đã đóng (reader sẽ attach lại ring mới) và giải phóng"""
+        self.header[H_ACTIVE] = 0
+        self.header[H_CLOSED] = 1
+        del self.header, self.seqs, self.stamps, self.data
+        self.shm.close()
+        self.shm.unlink()
+
+
+class FrameRingReader(_FrameRing):
+    """Đọc frame mới nhất từ ring (web worker, inference server)"""
+
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        shm = SharedMemory(name=ring_name(camera_id))
+
+        # Reader không sở hữu shm → không để resource_tracker unlink khi process thoát
+        resource_tracker.unregister(shm._name, 'shared_memory')
+
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.uint64, buffer=shm.buf)
+        if int(header[H_MAGIC]) != RING_MAGIC:
+            shm.close()
+            raise ValueError(f"Invalid frame ring: {ring_name(camera_id)}")
+
+        slots = int(header[H_SLOTS])
+        shape = (int(header[H_HEIGHT]), int(header[H_WIDTH]), int(header[H_CHANNELS]))
+        del header
+        self._map(shm, slots, shape)
+
+    @property
+    def closed(self):
+        return bool(self.header[H_CLOSED])
+
+    @property
+    def active(self):
+        return bool(self.header[H_ACTIVE]) and not self.closed
+
+    @property
+    def latest_seq(self):
+        return int(self.header[H_LATEST])
+
+    def read(self, seq, copy=False):
+        """
+        Đọc frame theo sequence number
+
+        Returns:
+            tuple: (seq, timestamp, frame) hoặc None nếu slot đã bị ghi đè / đang ghi.
+                copy=False trả về view zero-copy, chỉ hợp lệ đến khi writer quay vòng ring
+                (slots frame sau) — caller không được ghi vào view này.
+        """
+        if seq <= 0:
+            return None
+
+        slot = seq % self.slots
+        if int(self.seqs[slot]) != seq:
+            return None
+
+        timestamp = float(self.stamps[slot])
+        frame = self.data[slot]
+        if copy:
+            frame = frame.copy()
+        else:
+            frame = frame.view()
+            frame.flags.writeable = False
+
+        # Kiểm tra lại: slot không bị ghi đè trong lúc đọc
+        if int(self.seqs[slot]) != seq:
+            return None
+
+        frame = frame.view(BusFrame)
+        frame.bus_ref = (self.camera_id, seq)
+        return seq, timestamp, frame
+
+    def is_current(self, seq):
+        """
+        Slot của seq chưa bị ghi đè?
+
+        Gọi sau khi dùng xong view zero-copy (read(copy=False)): False → writer đã quay vòng
+        ring trong lúc dùng, dữ liệu view đọc được có thể lẫn frame mới.
+        """
+        return seq > 0 and int(self.seqs[seq % self.slots]) == seq
+
+    def read_latest(self, copy=False):
+        """Đọc frame mới nhất (thử lại vài lần nếu đụng lúc writer đang ghi)"""
+        for _ in range(3):
+            result = self.read(self.latest_seq, copy=copy)
+            if result is not None:
+                return result
+        return None
+
+    def close(self):
+        """
+        Đóng mapping shared memory
+
+        Returns:
+            bool: False nếu còn BusFrame zero-copy (copy=False) đang trỏ vào ring → chưa đóng
+                được, gọi lại close() sau khi các view đó được giải phóng
+        """
+        for name in ('header', 'seqs', 'stamps', 'data'):
+            self.__dict__.pop(name, None)
+        try:
+            self.shm.close()
+        except BufferError:
+            return False
+        return True
+
+
+class FrameBusReaders:
+    """Cache reader theo camera, tự attach lại khi daemon tạo ring mới"""
+
+    def __init__(self):
+        self._readers = {}
+        self._closing = []  # Ring cũ còn view zero-copy đang dùng → đóng lại ở lần get sau
+        self._lock = threading.Lock()
+
+    def _close_reader(self, reader):
+        if not reader.close():
+            self._closing.append(reader)
+
+    def get(self, camera_id):
+        with self._lock:
+            if self._closing:
+                self._closing = [old for old in self._closing if not old.close()]
+            reader = self._readers.get(camera_id)
+            if reader is not None and reader.closed:
+                self._close_reader(reader)
+                reader = None
+            if reader is None:
+                try:
+                    reader = FrameRingReader(camera_id)
+                except (FileNotFoundError, ValueError):
+                    return None
+                self._readers[camera_id] = reader
+            return reader
+
+    def read_latest(self, camera_id, copy=False):
+        reader = self.get(camera_id)
+        if reader is None or not reader.active:
+            return None
+        return reader.read_latest(copy=copy)
+
+    def read(self, camera_id, seq, copy=False):
+        reader = self.get(camera_id)
+        if reader is None:
+            return None
+        return reader.read(seq, copy=copy)
+
+    def is_current(self, camera_id, seq):
+        """Frame (camera_id, seq) vẫn còn nguyên trong ring (xem FrameRingReader.is_current)"""
+        with self._lock:
+            reader = self._readers.get(camera_id)
+        return reader is not None and not reader.closed and reader.is_current(seq)
+
+
+# ============================================
+# CAMERA OWNER DAEMON
+# ============================================
+
+class CameraOwnerDaemon:
+    """
+    Process duy nhất mở/decode camera, publish frame vào frame bus
+
+    - Camera mô phỏng trong registry: dùng SimulatedCamera, điều khiển qua control socket
+    - Camera thật (registry source.type = 'capture', hoặc captures={'gate_1': 0}): mở 1 lần và publish liên tục
+    """
+
+    def __init__(self, control_socket, slots=DEFAULT_SLOTS, captures=None):
+        from camera_ai.registry import camera_registry
+        from camera_ai.simulation import SimulatedCamera
+
+        self.control_socket = control_socket
+        self.slots = slots
+        self.writers = {}
+        self._writer_lock = threading.Lock()
+
+        self.cameras = {
+            config.id: SimulatedCamera(config.id, config.video_type)
+            for config in camera_registry.simulated()
+        }
+        for camera_id, camera in self.cameras.items():
+            camera.on_frame = lambda frame, camera_id=camera_id: self.publish(camera_id, frame)
+
+        # Camera thật trong registry + camera truyền thêm từ command line
+        self.captures = {config.id: config.capture_source for config in camera_registry.captures()}
+        self.captures.update(captures or {})
+
+    def publish(self, camera_id, frame):
+        with self._writer_lock:
+            writer = self.writers.get(camera_id)
+            start_seq = 0
+            # Video mới có kích thước khác → tạo ring mới (reader tự attach lại)
+            if writer is not None and frame.shape != writer.shape and not self._is_injection(camera_id):
+                start_seq = int(writer.header[H_LATEST])
+                writer.close()
+                writer = None
+            if writer is None:
+                writer = FrameRingWriter(camera_id, frame.shape, self.slots, start_seq)
+                self.writers[camera_id] = writer
+        writer.publish(frame)
+
+    def _is_injection(self, camera_id):
+        camera = self.cameras.get(camera_id)
+        return bool(camera and camera.injection_active)
+
+    def _set_inactive(self, camera_id):
+        writer = self.writers.get(camera_id)
+        if writer is not None:
+            writer.set_active(False)
+
+    def _capture_loop(self, camera_id, source):
+        """Đọc camera thật liên tục, chỉ giữ frame mới nhất trong ring"""
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            print(f"[ERROR] [{camera_id}] Cannot open capture: {source}")
+            return
+
+        print(f"[{camera_id}] Capturing from: {source}")
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                time.sleep(0.1)
+                continue
+            self.publish(camera_id, frame)
+
+    def handle(self, header):
+        op = header.get('op')
+        camera_id = header.get('camera_id')
+
+        if op == 'status':
+            status = {cid: camera.status() for cid, camera in self.cameras.items()}
+            for cid in self.captures:
+                status[cid] = {'id': cid, 'type': 'capture', 'active': cid in self.writers}
+            return {'ok': True, 'status': status}
+
+        camera = self.cameras.get(camera_id)
+        if camera is None:
+            return {'ok': False, 'error': f'Invalid camera_id: {camera_id}'}
+
+        if op == 'start':
+            camera.start(header.get('video_filename'))
+        elif op == 'stop':
+            camera.stop()
+            self._set_inactive(camera_id)
+        elif op == 'inject':
+            camera.inject_image(header['image_filename'], header.get('duration', 5.0))
+        else:
+            return {'ok': False, 'error': f'Unknown op: {op}'}
+
+        return {'ok': True}
+
+    def serve_forever(self):
+        for camera_id, source in self.captures.items():
+            threading.Thread(target=self._capture_loop, args=(camera_id, source), daemon=True).start()
+
+        if os.path.exists(self.control_socket):
+            os.unlink(self.control_socket)
+
+        daemon = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        header, _ = recv_message(self.request)
+                    except ConnectionError:
+                        return
+                    try:
+                        response = daemon.handle(header)
+                    except Exception as e:
+                        response = {'ok': False, 'error': str(e)}
+                    send_message(self.request, response)
+
+        try:
+            with socketserver.ThreadingUnixStreamServer(self.control_socket, Handler) as server:
+                server.daemon_threads = True
+                print(f"[OK] Camera owner daemon listening on {self.control_socket}")
+                server.serve_forever()
+        finally:
+            for camera in self.cameras.values():
+                camera.stop()
+            for writer in self.writers.values():
+                writer.close()
+
+
+class FrameBusClient:
+    """Client của web worker: đọc frame từ shared memory, gửi lệnh điều khiển qua socket"""
+
+    def __init__(self, control_socket, timeout=5.0):
+        self.control_socket = control_socket
+        self.timeout = timeout
+        self.readers = FrameBusReaders()
+
+    def call(self, header):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.control_socket)
+                send_message(sock, header)
+                response, _ = recv_message(sock)
+            except OSError as e:
+                raise ConnectionError(f"Không kết nối được camera daemon ({self.control_socket}): {e}")
+
+        if not response.get('ok'):
+            raise ValueError(response.get('error'))
+        return response
+
+    def get_frame(self, camera_id, copy=True):
+        result = self.readers.read_latest(camera_id, copy=copy)
+        return result[2] if result else None
+
+    def is_active(self, camera_id):
+        reader = self.readers.get(camera_id)
+        return bool(reader and reader.active)
@@ -0,0 +1,116 @@
+# camera_ai/frame_grabber.py
+"""
+Frame grabber - 1 thread đọc camera liên tục, chỉ giữ frame mới nhất
+
+cv2.VideoCapture (RTSP / USB) có buffer nội bộ: gọi cap.read() theo yêu cầu sẽ trả về
+frame cũ vài trăm ms. Grabber đọc liên tục trên thread riêng nên buffer luôn rỗng,
+request chỉ lấy frame mới nhất (kèm thời điểm chụp) mà không bị block, và không còn
+nhiều thread tranh nhau cùng 1 VideoCapture.
+"""
+import threading
+import time
+
+import cv2
+
+
+class FrameGrabber:
+    """
+    Grabber cho 1 camera
+
+    Args:
+        source: Index webcam hoặc RTSP URL
+        reconnect_delay: Thời gian chờ trước khi mở lại camera khi mất kết nối (giây)
+    """
+
+    def __init__(self, source, reconnect_delay=1.0):
+        self.source = source
+        self.reconnect_delay = reconnect_delay
+
+        self.cap = None
+        self.lock = threading.Lock()
+        self.frame = None
+        self.timestamp = 0.0
+        self.seq = 0
+        self.running = False
+        self._thread = None
+
+    def start(self):
+        """Mở camera và chạy thread grab"""
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            self.cap.release()
+            self.cap = None
+            raise Exception(f"Không thể mở camera: {self.source}")
+
+        # Buffer tối thiểu (backend không hỗ trợ thì bỏ qua)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name=f'grabber-{self.source}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Dừng thread grab
+
+        VideoCapture do chính thread grab release khi thoát vòng lặp: cap.read() có thể
+        block lâu hơn timeout của join (RTSP treo), release từ thread khác lúc đó không an toàn.
+        """
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+            if self._thread.is_alive():
+                print(f"[WARNING] Camera {self.source}: thread grab chưa thoát, camera sẽ được release khi read() trả về")
+            self._thread = None
+        with self.lock:
+            self.frame = None
+
+    def _run(self):
+        cap = self.cap
+        try:
+            while self.running:
+                ret, frame = cap.read()
+                if not ret:
+                    # Mất kết nối (RTSP) → mở lại
+                    print(f"[WARNING] Camera {self.source}: không đọc được frame, kết nối lại...")
+                    time.sleep(self.reconnect_delay)
+                    if self.running:
+                        cap.release()
+                        cap = self.cap = cv2.VideoCapture(self.source)
+                    continue
+
+                with self.lock:
+                    self.frame = frame
+                    self.timestamp = time.time()
+                    self.seq += 1
+        finally:
+            cap.release()
+            if self.cap is cap:
+                self.cap = None
+
+    @property
+    def is_active(self):
+        return self.running and self.cap is not None
+
+    def latest(self):
+        """
+        Frame mới nhất (không block)
+
+        Returns:
+            tuple: (frame, timestamp, seq) hoặc None nếu chưa có frame
+        """
+        with self.lock:
+            if self.frame is None:
+                return None
+            # Copy: caller có thể vẽ overlay lên frame
+            return self.frame.copy(), self.timestamp, self.seq
+
+    def wait_for_frame(self, timeout=2.0):
+        """Chờ frame đầu tiên sau khi start"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            result = self.latest()
+            if result is not None:
+                return result
+            time.sleep(0.01)
+        return None
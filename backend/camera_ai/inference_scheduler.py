@@ -0,0 +1,188 @@
+# camera_ai/inference_scheduler.py
+"""
+Inference scheduler - chia CPU giữa các loại công việc theo độ ưu tiên
+
+- interactive: quét QR ở cổng (có xe đang chờ barrier) → luôn được ưu tiên
+- live: overlay cho live view → bỏ frame khi hệ thống bận (frame cũ không còn giá trị)
+- batch: test / đánh giá offline → chỉ chạy khi còn slot trống
+
+Mỗi lớp có hàng đợi giới hạn, số lượng chạy đồng thời tối đa và thời gian chờ tối đa.
+Tổng số inference chạy cùng lúc bị giới hạn theo thread budget; số thread nội bộ của
+torch / ONNX Runtime / OpenVINO = thread budget / số inference đồng thời.
+
+Luồng gọi chọn lớp bằng context manager:
+
+    with inference_priority('live'):
+        camera_service.detect_license_plate(frame)
+
+Cấu hình qua env:
+    CAMERA_AI_INFERENCE_THREADS=4        # Thread budget (mặc định: số CPU)
+    CAMERA_AI_INFERENCE_CONCURRENCY=2    # Số inference chạy đồng thời
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PRIORITY_CLASSES = ('interactive', 'live', 'batch')
+DEFAULT_PRIORITY = 'batch'
+
+# max_queue: số request chờ tối đa, concurrency: số request chạy cùng lúc,
+# max_wait: thời gian chờ tối đa (giây) trước khi bị bỏ
+DEFAULT_LIMITS = {
+    'interactive': {'max_queue': 32, 'concurrency': 2, 'max_wait': 5.0},
+    'live': {'max_queue': 4, 'concurrency': 1, 'max_wait': 0.2},
+    'batch': {'max_queue': 16, 'concurrency': 1, 'max_wait': 30.0},
+}
+
+_local = threading.local()
+
+
+class InferenceRejected(Exception):
+    """Request bị từ chối (hàng đợi đầy, hệ thống quá tải hoặc chờ quá lâu)"""
+
+
+def current_priority():
+    return getattr(_local, 'priority', None) or DEFAULT_PRIORITY
+
+
+@contextmanager
+def inference_priority(priority):
+    """Đặt lớp ưu tiên cho các inference gọi trong block (theo thread)"""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Invalid priority. Must be one of: {PRIORITY_CLASSES}")
+    previous = getattr(_local, 'priority', None)
+    _local.priority = priority
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+class InferenceScheduler:
+    """
+    Admission control cho inference trên CPU
+
+    Args:
+        thread_budget: Tổng số thread CPU dành cho inference
+        max_concurrent: Số inference chạy đồng thời (mọi lớp)
+        limits: Ghi đè DEFAULT_LIMITS theo lớp
+    """
+
+    def __init__(self, thread_budget=None, max_concurrent=None, limits=None):
+        self.thread_budget = thread_budget or int(os.getenv('CAMERA_AI_INFERENCE_THREADS', '0')) or os.cpu_count() or 1
+        self.max_concurrent = max_concurrent or int(os.getenv('CAMERA_AI_INFERENCE_CONCURRENCY', '2'))
+        self.limits = {cls: dict(DEFAULT_LIMITS[cls], **(limits or {}).get(cls, {})) for cls in PRIORITY_CLASSES}
+
+        self.condition = threading.Condition()
+        # Thread đang giữ slot của scheduler này (mỗi scheduler 1 trạng thái riêng)
+        self._holding = threading.local()
+        self.waiting = {cls: 0 for cls in PRIORITY_CLASSES}
+        self.running = {cls: 0 for cls in PRIORITY_CLASSES}
+        self.stats = {
+            cls: {'completed': 0, 'dropped': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+            for cls in PRIORITY_CLASSES
+        }
+
+    @property
+    def threads_per_inference(self):
+        """Số thread nội bộ cho mỗi inference (torch / ORT intra-op)"""
+        return max(1, self.thread_budget // self.max_concurrent)
+
+    def _higher(self, priority):
+        return PRIORITY_CLASSES[:PRIORITY_CLASSES.index(priority)]
+
+    def _can_run(self, priority):
+        if sum(self.running.values()) >= self.max_concurrent:
+            return False
+        if self.running[priority] >= self.limits[priority]['concurrency']:
+            return False
+        # Nhường slot cho lớp ưu tiên cao hơn đang chờ (và còn quota)
+        for higher in self._higher(priority):
+            if self.waiting[higher] and self.running[higher] < self.limits[higher]['concurrency']:
+                return False
+        return True
+
+    def _is_overloaded(self, priority):
+        """Lớp thấp bị bỏ ngay khi lớp cao hơn đang phải chờ"""
+        return any(self.waiting[higher] for higher in self._higher(priority))
+
+    def _reject(self, priority, reason):
+        self.stats[priority]['dropped'] += 1
+        raise InferenceRejected(f"[{priority}] {reason}")
+
+    def run(self, fn, *args, priority=None, **kwargs):
+        """
+        Chạy fn khi lớp ưu tiên được cấp slot
+
+        Raises:
+            InferenceRejected: Hàng đợi đầy, quá tải hoặc chờ quá max_wait
+        """
+        # Thread đang giữ slot của scheduler này (VD: OCR lồng trong 1 request đã được cấp) → chạy luôn
+        if getattr(self._holding, 'active', False):
+            return fn(*args, **kwargs)
+
+        priority = priority or current_priority()
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Invalid priority. Must be one of: {PRIORITY_CLASSES}")
+        limits = self.limits[priority]
+        enqueued_at = time.monotonic()
+
+        with self.condition:
+            if priority != 'interactive' and self._is_overloaded(priority):
+                self._reject(priority, 'shed under load')
+            if self.waiting[priority] >= limits['max_queue']:
+                self._reject(priority, 'queue full')
+
+            self.waiting[priority] += 1
+            try:
+                granted = self.condition.wait_for(lambda: self._can_run(priority), timeout=limits['max_wait'])
+            finally:
+                self.waiting[priority] -= 1
+
+            if not granted:
+                # Slot vừa được nhường cho lớp khác → đánh thức các request còn lại
+                self.condition.notify_all()
+                self._reject(priority, f"waited > {limits['max_wait']}s")
+
+            self.running[priority] += 1
+            wait = time.monotonic() - enqueued_at
+            stats = self.stats[priority]
+            stats['total_wait'] += wait
+            stats['max_wait'] = max(stats['max_wait'], wait)
+
+        self._holding.active = True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._holding.active = False
+            with self.condition:
+                self.running[priority] -= 1
+                self.stats[priority]['completed'] += 1
+                self.condition.notify_all()
+
+    def status(self):
+        """Độ sâu hàng đợi, số đang chạy và thời gian chờ theo lớp"""
+        with self.condition:
+            classes = {}
+            for cls in PRIORITY_CLASSES:
+                stats = self.stats[cls]
+                classes[cls] = {
+                    'queue_depth': self.waiting[cls],
+                    'running': self.running[cls],
+                    'completed': stats['completed'],
+                    'dropped': stats['dropped'],
+                    'avg_wait_ms': round(stats['total_wait'] / stats['completed'] * 1000, 1) if stats['completed'] else 0.0,
+                    'max_wait_ms': round(stats['max_wait'] * 1000, 1),
+                    'limits': self.limits[cls]
+                }
+            return {
+                'thread_budget': self.thread_budget,
+                'max_concurrent': self.max_concurrent,
+                'threads_per_inference': self.threads_per_inference,
+                'classes': classes
+            }
+
+
+# Singleton instance (1 scheduler / process)
+inference_scheduler = InferenceScheduler()
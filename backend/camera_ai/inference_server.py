@@ -0,0 +1,368 @@
+# camera_ai/inference_server.py
+"""
+Inference server - 1 process duy nhất giữ YOLO + EasyOCR, các Django worker là thin client
+
+- Giao tiếp qua Unix socket: mỗi message = 4 byte độ dài header + header JSON + payload (frame thô)
+- Các request đồng thời (process_qr_scan, test_detection, stream generators...) được gom batch
+  theo max_batch_size / max_wait_ms trước khi chạy model
+
+Chạy server:
+    python manage.py camera_inference_server --socket /tmp/parking_inference.sock
+
+Bật client ở Django worker:
+    CAMERA_AI_INFERENCE_SOCKET=/tmp/parking_inference.sock
+"""
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from camera_ai.inference_scheduler import (
+    PRIORITY_CLASSES, InferenceRejected, InferenceScheduler, current_priority, inference_priority, inference_scheduler
+)
+
+HEADER_SIZE = struct.Struct('!I')
+
+
+# ============================================
+# WIRE PROTOCOL
+# ============================================
+
+def _json_default(value):
+    """Chuyển kiểu numpy sang kiểu Python để serialize JSON"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def send_message(sock, header, payload=b''):
+    """Gửi 1 message: header (dict) + payload (bytes)"""
+    header = dict(header, payload_size=len(payload))
+    header_bytes = json.dumps(header, default=_json_default).encode('utf-8')
+    sock.sendall(HEADER_SIZE.pack(len(header_bytes)) + header_bytes)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_message(sock):
+    """Nhận 1 message, trả về (header, payload)"""
+    header_size = HEADER_SIZE.unpack(_recv_exact(sock, HEADER_SIZE.size))[0]
+    header = json.loads(_recv_exact(sock, header_size).decode('utf-8'))
+    payload = _recv_exact(sock, header['payload_size']) if header['payload_size'] else b''
+    return header, payload
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("Inference server connection closed")
+        received += n
+    return bytes(buffer)
+
+
+def encode_frame(frame):
+    """Frame numpy → (metadata, bytes)"""
+    frame = np.ascontiguousarray(frame)
+    return {'shape': list(frame.shape), 'dtype': str(frame.dtype)}, frame.tobytes()
+
+
+def decode_frame(meta, payload):
+    """(metadata, bytes) → frame numpy"""
+    return np.frombuffer(payload, dtype=meta['dtype']).reshape(meta['shape'])
+
+
+# ============================================
+# BATCHING
+# ============================================
+
+class RequestBatcher:
+    """
+    Gom các request đồng thời thành batch
+
+    Worker thread lấy request đầu tiên, chờ thêm tối đa max_wait_ms (hoặc đến khi đủ
+    max_batch_size) rồi gọi batch_fn(list_items) 1 lần, kết quả trả về qua Future.
+    Có scheduler → batch chạy qua scheduler.run với lớp ưu tiên cao nhất trong batch.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10, name='batcher', scheduler=None):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.scheduler = scheduler
+        self.queue = queue.Queue()
+        self.stats = {'requests': 0, 'batches': 0, 'max_batch': 0}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item, priority=None):
+        future = Future()
+        self.queue.put((item, priority, future))
+        return future
+
+    def _execute(self, batch):
+        items = [item for item, _, _ in batch]
+        if self.scheduler is None:
+            return self.batch_fn(items)
+        priorities = [priority for _, priority, _ in batch if priority in PRIORITY_CLASSES]
+        priority = min(priorities, key=PRIORITY_CLASSES.index) if priorities else None
+        return self.scheduler.run(self.batch_fn, items, priority=priority)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+
+            # Chờ thêm request trong cửa sổ max_wait
+            wait_until = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = wait_until - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = list(self._execute(batch))
+                for (_, _, future), result in zip(batch, results):
+                    future.set_result(result)
+                if len(results) < len(batch):
+                    raise RuntimeError(f"{self.name}: batch_fn trả về {len(results)} kết quả cho {len(batch)} request")
+            except Exception as e:
+                # Request chưa có kết quả không bị treo
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+
+
+# ============================================
+# SERVER
+# ============================================
+
+class InferenceServer:
+    """Server giữ model và phục vụ các Django worker qua Unix socket"""
+
+    def __init__(self, socket_path, max_batch_size=8, max_wait_ms=10, service=None):
+        from camera_ai.frame_bus import FrameBusReaders
+        from camera_ai.service import CameraAIService
+
+        self.socket_path = socket_path
+        # inference_socket='' → service chạy model tại chỗ, không tự gọi lại server
+        self.service = service or CameraAIService(inference_socket='')
+        self.bus_readers = FrameBusReaders()
+
+        # Batch chạy qua inference_scheduler của process (thread budget của model),
+        # theo lớp ưu tiên cao nhất trong batch
+        self.detect_batcher = RequestBatcher(
+            self._detect_batch, max_batch_size, max_wait_ms, name='detect-batcher', scheduler=inference_scheduler
+        )
+        self.ocr_batcher = RequestBatcher(
+            self.service.extract_text_from_plates_many, max_batch_size, max_wait_ms, name='ocr-batcher',
+            scheduler=inference_scheduler
+        )
+        
+        # Admission request theo lớp ưu tiên của client (quét cổng > live view > batch)
+        self.scheduler = InferenceScheduler(
+            max_concurrent=max_batch_size,
+            limits={
+                'interactive': {'concurrency': max_batch_size},
+                'live': {'concurrency': max(1, max_batch_size // 2)}
+            }
+        )
+
+    def _resolve_frame(self, header, payload):
+        """
+        Frame gửi kèm payload, hoặc tham chiếu (camera_id, seq) trên frame bus
+
+        Frame bus: trả về view zero-copy (chỉ đọc) trên shared memory, không copy.
+        handle() kiểm tra lại seq sau khi chạy model (_frame_still_valid).
+        """
+        if 'frame_ref' in header:
+            ref = header['frame_ref']
+            result = self.bus_readers.read(ref['camera_id'], ref['seq'], copy=False)
+            return result[2] if result else None
+        return decode_frame(header['frame'], payload)
+
+    def _frame_still_valid(self, header):
+        """Slot frame bus không bị ghi đè trong lúc inference (frame gửi kèm payload → luôn đúng)"""
+        ref = header.get('frame_ref')
+        return ref is None or self.bus_readers.is_current(ref['camera_id'], ref['seq'])
+
+    def _detect_batch(self, frames):
+        if not self.service.model:
+            return [[] for _ in frames]
+        return self.service.model.predict_batch(frames, self.service.conf_threshold)
+
+    def handle(self, header, payload):
+        """Xử lý 1 request, trả về dict kết quả"""
+        op = header.get('op')
+
+        if op == 'ping':
+            return {'ok': True, 'loaded': self.service.is_loaded}
+
+        if op == 'stats':
+            return {
+                'ok': True,
+                'detect': self.detect_batcher.stats,
+                'ocr': self.ocr_batcher.stats,
+                'scheduler': self.scheduler.status(),
+                'inference': inference_scheduler.status()
+            }
+
+        frame = self._resolve_frame(header, payload)
+        if frame is None:
+            return {'ok': False, 'error': 'Frame expired in frame bus', 'error_code': 'FRAME_EXPIRED'}
+
+        priority = header.get('priority') or current_priority()
+        if op == 'detect':
+            run = lambda: self.detect_batcher.submit(frame, priority).result()
+        elif op == 'ocr':
+            item = (frame, header['bboxes'], header.get('expected_text'), header.get('mode'))
+            run = lambda: self.ocr_batcher.submit(item, priority).result()
+        elif op == 'ocr_single':
+            run = lambda: self.service.extract_text_from_plate(frame, header['bbox'], header.get('mode'))
+        else:
+            return {'ok': False, 'error': f'Unknown op: {op}'}
+
+        try:
+            # ocr_single gọi service trực tiếp → inference_scheduler đọc lớp ưu tiên của thread
+            with inference_priority(priority):
+                result = self.scheduler.run(run, priority=priority)
+        except InferenceRejected as e:
+            return {'ok': False, 'error': str(e), 'error_code': 'REJECTED'}
+        if not self._frame_still_valid(header):
+            # Writer đã quay vòng ring trong lúc chạy model → client gửi lại bytes của frame
+            return {'ok': False, 'error': 'Frame overwritten during inference', 'error_code': 'FRAME_EXPIRED'}
+        return {'ok': True, 'result': result}
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        # Load model trước khi nhận request
+        self.service.warm_up()
+
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                # Giữ kết nối cho nhiều request liên tiếp của cùng 1 client
+                while True:
+                    try:
+                        header, payload = recv_message(self.request)
+                    except ConnectionError:
+                        return
+                    try:
+                        response = server.handle(header, payload)
+                    except Exception as e:
+                        response = {'ok': False, 'error': str(e)}
+                    send_message(self.request, response)
+
+        with socketserver.ThreadingUnixStreamServer(self.socket_path, Handler) as unix_server:
+            unix_server.daemon_threads = True
+            print(f"[OK] Inference server listening on {self.socket_path}")
+            unix_server.serve_forever()
+
+
+# ============================================
+# CLIENT
+# ============================================
+
+class InferenceClient:
+    """
+    Thin client cho Django worker, cùng interface với CameraAIService
+
+    Mỗi thread giữ 1 kết nối riêng tới server (tự kết nối lại nếu bị ngắt).
+    """
+
+    def __init__(self, socket_path, timeout=10.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _reset(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    def _call(self, header, frame=None):
+        # Lớp ưu tiên của thread gọi (xem inference_priority)
+        header = dict(header, priority=current_priority())
+        payload = b''
+        bus_ref = getattr(frame, 'bus_ref', None)
+        if bus_ref is not None:
+            # Frame nằm trên frame bus → chỉ gửi tham chiếu, server đọc shared memory
+            camera_id, seq = bus_ref
+            response = self._send(dict(header, frame_ref={'camera_id': camera_id, 'seq': seq}))
+            if response.get('error_code') != 'FRAME_EXPIRED':
+                return self._check(response)
+        if frame is not None:
+            header['frame'], payload = encode_frame(frame)
+        return self._check(self._send(header, payload))
+
+    def _send(self, header, payload=b''):
+        try:
+            sock = self._connection()
+            send_message(sock, header, payload)
+            response, _ = recv_message(sock)
+        except (OSError, ConnectionError) as e:
+            self._reset()
+            raise ConnectionError(f"Không kết nối được inference server ({self.socket_path}): {e}")
+        return response
+
+    def _check(self, response):
+        if response.get('error_code') == 'REJECTED':
+            raise InferenceRejected(response.get('error'))
+        if not response.get('ok'):
+            raise RuntimeError(f"Inference server error: {response.get('error')}")
+        return response
+
+    def ping(self):
+        return self._call({'op': 'ping'})
+
+    def stats(self):
+        return self._call({'op': 'stats'})
+
+    def detect_license_plate(self, frame):
+        return self._call({'op': 'detect'}, frame)['result']
+
+    def extract_text_from_plates(self, frame, bboxes, expected_text=None, mode=None):
+        if not bboxes:
+            return []
+        header = {
+            'op': 'ocr', 'bboxes': [list(map(int, b)) for b in bboxes],
+            'expected_text': expected_text, 'mode': mode
+        }
+        return self._call(header, frame)['result']
+
+    def extract_text_from_plate(self, frame, bbox, mode=None):
+        header = {'op': 'ocr_single', 'bbox': list(map(int, bbox)), 'mode': mode}
+        return self._call(header, frame)['result']
@@ -0,0 +1,31 @@
+"""
+Chạy camera owner daemon: decode/capture mỗi camera đúng 1 lần và publish lên frame bus
+
+Ví dụ:
+    python manage.py camera_frame_bus --socket /tmp/parking_camera_bus.sock
+    python manage.py camera_frame_bus --capture gate_1=0 --capture gate_2=rtsp://10.0.0.12/stream
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from camera_ai.frame_bus import DEFAULT_SLOTS, CameraOwnerDaemon
+
+
+class Command(BaseCommand):
+    help = 'Run the camera owner daemon that publishes frames into shared memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default='/tmp/parking_camera_bus.sock', help='Control socket path')
+        parser.add_argument('--slots', type=int, default=DEFAULT_SLOTS, help='Số frame trong mỗi ring buffer')
+        parser.add_argument('--capture', action='append', default=[],
+                            help='Camera thật: CAMERA_ID=SOURCE (index webcam hoặc RTSP URL)')
+
+    def handle(self, *args, **options):
+        captures = {}
+        for item in options['capture']:
+            if '=' not in item:
+                raise CommandError(f'Invalid --capture (CAMERA_ID=SOURCE): {item}')
+            camera_id, source = item.split('=', 1)
+            captures[camera_id] = int(source) if source.isdigit() else source
+
+        daemon = CameraOwnerDaemon(options['socket'], slots=options['slots'], captures=captures)
+        daemon.serve_forever()
@@ -0,0 +1,27 @@
+"""
+Chạy inference server (YOLO + EasyOCR) cho các Django worker
+
+Ví dụ:
+    python manage.py camera_inference_server --socket /tmp/parking_inference.sock --max-batch-size 8 --max-wait-ms 10
+"""
+from django.core.management.base import BaseCommand
+
+from camera_ai.inference_server import InferenceServer
+
+
+class Command(BaseCommand):
+    help = 'Run the shared camera inference server on a local Unix socket'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default='/tmp/parking_inference.sock', help='Unix socket path')
+        parser.add_argument('--max-batch-size', type=int, default=8)
+        parser.add_argument('--max-wait-ms', type=float, default=10,
+                            help='Thời gian tối đa chờ gom batch (ms)')
+
+    def handle(self, *args, **options):
+        server = InferenceServer(
+            options['socket'],
+            max_batch_size=options['max_batch_size'],
+            max_wait_ms=options['max_wait_ms']
+        )
+        server.serve_forever()
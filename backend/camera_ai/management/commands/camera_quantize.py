@@ -0,0 +1,58 @@
+"""
+Tạo và đánh giá quantization profile cho Camera AI
+
+Ví dụ:
+    python manage.py camera_quantize --eval-dir camera_ai/eval_images
+    python manage.py camera_quantize --profile int8_static --eval-dir camera_ai/eval_images
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from camera_ai.quantization import MAX_ACCURACY_DROP, build_detector_artifact, run_report
+
+DEFAULT_MODEL_PATH = Path(__file__).resolve().parents[2] / 'models' / 'license-plate-finetune-v1m.pt'
+
+
+class Command(BaseCommand):
+    help = 'Build int8 quantized detector artifacts and report accuracy delta against fp32'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=['int8_dynamic', 'int8_static', 'all'], default='all')
+        parser.add_argument('--model', default=str(DEFAULT_MODEL_PATH), help='YOLO .pt model')
+        parser.add_argument('--calibration-dir', default='camera_ai/captured_images',
+                            help='Ảnh dùng để calibrate int8_static')
+        parser.add_argument('--max-calibration-images', type=int, default=100)
+        parser.add_argument('--eval-dir', required=True,
+                            help='Tập ảnh có nhãn (chứa labels.json: {"file.jpg": "BIEN_SO"})')
+
+    def handle(self, *args, **options):
+        model_path = Path(options['model'])
+        if not model_path.exists():
+            raise CommandError(f'Model file not found: {model_path}')
+
+        profiles = ['int8_dynamic', 'int8_static'] if options['profile'] == 'all' else [options['profile']]
+
+        for profile in profiles:
+            self.stdout.write(f'🔄 Building detector artifact: {profile}')
+            build_detector_artifact(
+                model_path,
+                profile,
+                calibration_dir=options['calibration_dir'],
+                max_images=options['max_calibration_images']
+            )
+
+        self.stdout.write('🔄 Evaluating profiles against fp32...')
+        report = run_report(profiles, options['eval_dir'], model_path)
+
+        for profile in ['fp32'] + profiles:
+            entry = report[profile]
+            status = '✅ approved' if entry['approved'] else '❌ rejected'
+            self.stdout.write(
+                f"  {profile:<13} accuracy={entry['accuracy']:.3f} "
+                f"delta={entry['delta']:+.3f} latency={entry['avg_latency_ms']}ms {status}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done. Profiles within -{MAX_ACCURACY_DROP:.0%} accuracy can be enabled via CAMERA_AI_QUANT_PROFILE.'
+        ))
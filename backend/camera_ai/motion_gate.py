@@ -0,0 +1,130 @@
+# camera_ai/motion_gate.py
+"""
+Motion gate - chỉ cho YOLO chạy khi có vật thể đi vào làn xe
+
+So sánh frame thu nhỏ (grayscale) với background trung bình động trong vùng ROI.
+Khi tỉ lệ pixel thay đổi vượt ngưỡng → mở gate trong hold_seconds; làn trống thì
+detection bị bỏ qua hoàn toàn, camera idle gần như không tốn CPU.
+
+Cấu hình qua env:
+    CAMERA_AI_MOTION_ROI=0,0.4,1,1        # x1,y1,x2,y2 (tỉ lệ theo kích thước frame)
+    CAMERA_AI_MOTION_PIXEL_THRESHOLD=25   # Chênh lệch mức xám tối thiểu của 1 pixel
+    CAMERA_AI_MOTION_MIN_AREA=0.01        # Tỉ lệ pixel thay đổi tối thiểu trong ROI
+"""
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+def _parse_roi(value):
+    """'x1,y1,x2,y2' → tuple float, None nếu không cấu hình"""
+    if not value:
+        return None
+    roi = tuple(float(v) for v in value.split(','))
+    if len(roi) != 4:
+        raise ValueError(f"Invalid motion ROI: {value}")
+    return roi
+
+
+class MotionGate:
+    """
+    Gate phát hiện chuyển động trên 1 camera
+
+    Args:
+        roi: (x1, y1, x2, y2) theo tỉ lệ 0-1, None = toàn frame
+        pixel_threshold: Chênh lệch mức xám để coi 1 pixel là thay đổi
+        min_area: Tỉ lệ pixel thay đổi trong ROI để mở gate
+        hold_seconds: Giữ gate mở sau lần chuyển động cuối
+        downscale_width: Chiều rộng frame thu nhỏ khi so sánh
+        learning_rate: Tốc độ cập nhật background
+    """
+
+    def __init__(self, roi=None, pixel_threshold=25, min_area=0.01, hold_seconds=2.0,
+                 downscale_width=160, learning_rate=0.05):
+        self.roi = roi
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.hold_seconds = hold_seconds
+        self.downscale_width = downscale_width
+        self.learning_rate = learning_rate
+
+        self.lock = threading.Lock()
+        self.background = None
+        self.open_until = 0.0
+        self.is_open = False
+        self.last_motion_ratio = 0.0
+
+        self.stats = {'frames': 0, 'passed': 0, 'skipped': 0, 'triggers': 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            roi=_parse_roi(os.getenv('CAMERA_AI_MOTION_ROI')),
+            pixel_threshold=int(os.getenv('CAMERA_AI_MOTION_PIXEL_THRESHOLD', '25')),
+            min_area=float(os.getenv('CAMERA_AI_MOTION_MIN_AREA', '0.01'))
+        )
+
+    def _prepare(self, frame):
+        """Cắt ROI, thu nhỏ, grayscale + blur"""
+        h, w = frame.shape[:2]
+        if self.roi:
+            x1, y1, x2, y2 = self.roi
+            frame = frame[int(y1 * h):int(y2 * h), int(x1 * w):int(x2 * w)]
+            h, w = frame.shape[:2]
+
+        scale = self.downscale_width / float(w)
+        small = cv2.resize(frame, (self.downscale_width, max(1, int(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0).astype(np.float32)
+
+    def check(self, frame, now=None):
+        """
+        Kiểm tra frame, trả về True nếu nên chạy detection
+        """
+        now = now or time.time()
+        gray = self._prepare(frame)
+
+        with self.lock:
+            self.stats['frames'] += 1
+
+            if self.background is None or self.background.shape != gray.shape:
+                # Frame đầu tiên: chưa có background → cho qua để detect 1 lần
+                self.background = gray
+                motion_ratio = 1.0
+            else:
+                diff = cv2.absdiff(gray, self.background)
+                motion_ratio = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+                cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+
+            self.last_motion_ratio = motion_ratio
+
+            if motion_ratio >= self.min_area:
+                if not self.is_open:
+                    self.stats['triggers'] += 1
+                self.open_until = now + self.hold_seconds
+
+            self.is_open = now < self.open_until
+            self.stats['passed' if self.is_open else 'skipped'] += 1
+            return self.is_open
+
+    def reset(self):
+        """Xóa background (VD: khi khởi động lại camera)"""
+        with self.lock:
+            self.background = None
+            self.open_until = 0.0
+            self.is_open = False
+
+    def status(self):
+        return {
+            'roi': list(self.roi) if self.roi else None,
+            'pixel_threshold': self.pixel_threshold,
+            'min_area': self.min_area,
+            'hold_seconds': self.hold_seconds,
+            'is_open': self.is_open,
+            'last_motion_ratio': round(self.last_motion_ratio, 4),
+            **self.stats
+        }
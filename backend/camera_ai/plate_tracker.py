@@ -0,0 +1,142 @@
+# camera_ai/plate_tracker.py
+"""
+Theo dõi biển số qua nhiều frame + vote từng ký tự
+
+Dùng cho burst mode của process_vehicle_entry: chụp N frame liên tiếp, ghép box
+biển số giữa các frame bằng IoU, mỗi track gom các lần OCR và vote theo từng vị trí
+ký tự (có trọng số confidence). Track ngừng OCR khi kết quả vote đã hội tụ.
+"""
+from collections import Counter, defaultdict
+
+from camera_ai.detection_scheduler import bbox_iou
+
+
+class PlateTrack:
+    """1 biển số được theo dõi qua các frame"""
+
+    def __init__(self, track_id, plate):
+        self.track_id = track_id
+        self.bbox = plate['bbox']
+        self.detection_confidence = plate['confidence']
+        self.hits = 1
+        self.reads = []           # [{'text', 'confidence', 'frame_index'}]
+
+    def update(self, plate):
+        self.bbox = plate['bbox']
+        self.detection_confidence = max(self.detection_confidence, plate['confidence'])
+        self.hits += 1
+
+    def add_read(self, text, confidence, frame_index):
+        if text:
+            self.reads.append({'text': text, 'confidence': confidence, 'frame_index': frame_index})
+
+    def vote(self):
+        """
+        Vote ký tự theo từng vị trí
+
+        Độ dài được chọn trước (theo tổng confidence), sau đó mỗi vị trí lấy ký tự
+        có tổng confidence cao nhất trong các lần đọc cùng độ dài.
+
+        Returns:
+            str hoặc None
+        """
+        if not self.reads:
+            return None
+
+        length_weights = Counter()
+        for read in self.reads:
+            length_weights[len(read['text'])] += read['confidence']
+        length = length_weights.most_common(1)[0][0]
+
+        positions = [defaultdict(float) for _ in range(length)]
+        for read in self.reads:
+            if len(read['text']) == length:
+                for i, char in enumerate(read['text']):
+                    positions[i][char] += read['confidence']
+
+        return ''.join(max(weights, key=weights.get) for weights in positions)
+
+    @property
+    def confidence(self):
+        """Confidence trung bình của các lần đọc trùng kết quả vote"""
+        voted = self.vote()
+        agreeing = [r['confidence'] for r in self.reads if r['text'] == voted]
+        if agreeing:
+            return sum(agreeing) / len(agreeing)
+        return max((r['confidence'] for r in self.reads), default=0.0)
+
+    def best_read(self):
+        """Lần đọc trùng kết quả vote có confidence cao nhất"""
+        voted = self.vote()
+        candidates = [r for r in self.reads if r['text'] == voted] or self.reads
+        return max(candidates, key=lambda r: r['confidence']) if candidates else None
+
+    def is_converged(self, expected_text=None, min_agreement=2):
+        """
+        Vote đã hội tụ?
+
+        - Có 1 lần đọc khớp đúng expected_text (biển số trên QR) → hội tụ ngay
+        - Hoặc có ít nhất min_agreement lần đọc trùng kết quả vote
+        """
+        if expected_text and any(r['text'] == expected_text for r in self.reads):
+            return True
+        voted = self.vote()
+        return voted is not None and sum(1 for r in self.reads if r['text'] == voted) >= min_agreement
+
+    def to_dict(self, expected_text=None):
+        return {
+            'text': self.vote(),
+            'confidence': self.confidence,
+            'detection_confidence': self.detection_confidence,
+            'reads': [r['text'] for r in self.reads],
+            'converged': self.is_converged(expected_text)
+        }
+
+
+class PlateTracker:
+    """
+    Ghép box biển số giữa các frame bằng IoU (greedy theo confidence)
+
+    Args:
+        iou_threshold: IoU tối thiểu để coi là cùng 1 biển số
+        max_tracks: Số track tối đa (biển số có detection confidence thấp bị bỏ)
+    """
+
+    def __init__(self, iou_threshold=0.3, max_tracks=3):
+        self.iou_threshold = iou_threshold
+        self.max_tracks = max_tracks
+        self.tracks = []
+        self._next_id = 1
+
+    def update(self, plates):
+        """
+        Gán detection của 1 frame vào track
+
+        Returns:
+            list: [(track, plate)] các track xuất hiện trong frame này
+        """
+        matched = []
+        used = set()
+
+        for plate in sorted(plates, key=lambda p: p['confidence'], reverse=True):
+            best_track, best_iou = None, self.iou_threshold
+            for track in self.tracks:
+                if track.track_id in used:
+                    continue
+                iou = bbox_iou(plate['bbox'], track.bbox)
+                if iou >= best_iou:
+                    best_track, best_iou = track, iou
+
+            if best_track is None:
+                if len(self.tracks) >= self.max_tracks:
+                    continue
+                best_track = PlateTrack(self._next_id, plate)
+                self._next_id += 1
+                self.tracks.append(best_track)
+            else:
+                best_track.update(plate)
+
+            used.add(best_track.track_id)
+            matched.append((best_track, plate))
+
+        return matched
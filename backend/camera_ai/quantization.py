@@ -0,0 +1,268 @@
+# camera_ai/quantization.py
+"""
+Quantization profiles cho detector (YOLO) và recognizer (EasyOCR) trên CPU
+
+- fp32: model gốc
+- int8_dynamic: detector ONNX quantize dynamic, recognizer quantize dynamic (LSTM/Linear)
+- int8_static: detector ONNX quantize static, calibrate bằng ảnh trong captured_images;
+  recognizer dùng dynamic int8 (CRNN của EasyOCR không hỗ trợ static quantization eager-mode)
+
+Một profile int8 chỉ được bật khi đã có báo cáo accuracy so với fp32 trên tập ảnh
+có nhãn, độ sụt accuracy nằm trong MAX_ACCURACY_DROP, và file model gốc + artifact int8
+vẫn đúng là các file đã được đánh giá (sha256 lưu trong báo cáo).
+"""
+import hashlib
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+
+QUANT_PROFILES = ('fp32', 'int8_dynamic', 'int8_static')
+
+# Độ sụt accuracy tối đa (tuyệt đối) cho phép so với fp32
+MAX_ACCURACY_DROP = 0.02
+
+REPORT_FILENAME = 'quantization_report.json'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def _list_images(image_dir):
+    image_dir = Path(image_dir)
+    if not image_dir.exists():
+        return []
+    return sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def quantized_artifact_path(model_path, profile):
+    """models/<tên>.<profile>.onnx, nằm cạnh file .pt"""
+    model_path = Path(model_path)
+    return model_path.parent / f'{model_path.stem}.{profile}.onnx'
+
+
+def report_path(model_path):
+    return Path(model_path).parent / REPORT_FILENAME
+
+
+def load_report(model_path):
+    """Đọc báo cáo accuracy của các profile (dict rỗng nếu chưa có)"""
+    path = report_path(model_path)
+    if not path.exists():
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def file_sha256(path):
+    """sha256 của file (None nếu không tồn tại)"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_profile_approved(model_path, profile):
+    """
+    Kiểm tra profile đã được đánh giá, đạt ngưỡng accuracy, và artifact hiện tại chính là
+    artifact đã được đánh giá (build lại / đổi model gốc → phải chạy lại báo cáo)
+
+    Returns:
+        tuple: (approved, lý do nếu không được bật)
+    """
+    if profile == 'fp32':
+        return True, None
+
+    entry = load_report(model_path).get(profile)
+    if not entry:
+        return False, 'chưa có báo cáo accuracy'
+    if not entry.get('approved'):
+        return False, f"độ sụt accuracy {entry.get('delta')} vượt ngưỡng {MAX_ACCURACY_DROP}"
+
+    artifact_sha256 = file_sha256(quantized_artifact_path(model_path, profile))
+    if artifact_sha256 is None:
+        return False, f'không tìm thấy artifact {quantized_artifact_path(model_path, profile)}'
+    if artifact_sha256 != entry.get('artifact_sha256'):
+        return False, 'artifact đã thay đổi sau khi đánh giá'
+    if file_sha256(model_path) != entry.get('model_sha256'):
+        return False, 'model gốc đã thay đổi sau khi đánh giá'
+    return True, None
+
+
+class ImageCalibrationReader:
+    """CalibrationDataReader cho onnxruntime.quantization, đọc ảnh từ captured_images"""
+
+    def __init__(self, detector, image_dir, max_images=100):
+        self.detector = detector
+        self.input_name = detector.input_name
+        self.images = _list_images(image_dir)[:max_images]
+        if not self.images:
+            raise ValueError(f"No calibration images in: {image_dir}")
+        self._iter = iter(self.images)
+
+    def get_next(self):
+        for image_path in self._iter:
+            frame = cv2.imread(str(image_path))
+            if frame is None:
+                continue
+            blob, _, _ = self.detector._letterbox(frame)
+            return {self.input_name: blob}
+        return None
+
+    def rewind(self):
+        self._iter = iter(self.images)
+
+
+def build_detector_artifact(model_path, profile, calibration_dir=None, max_images=100):
+    """
+    Tạo model ONNX int8 cho detector
+
+    Args:
+        model_path: File .pt gốc
+        profile: 'int8_dynamic' hoặc 'int8_static'
+        calibration_dir: Thư mục ảnh để calibrate (bắt buộc với int8_static)
+
+    Returns:
+        Path: Đường dẫn artifact đã quantize
+    """
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from camera_ai.detectors import OnnxRuntimeDetector
+
+    if profile not in ('int8_dynamic', 'int8_static'):
+        raise ValueError(f"Invalid int8 profile: {profile}")
+
+    # Model fp32 ONNX (export nếu chưa có)
+    fp32_detector = OnnxRuntimeDetector(model_path)
+    output_path = quantized_artifact_path(model_path, profile)
+
+    if profile == 'int8_dynamic':
+        quantize_dynamic(
+            str(fp32_detector.artifact_path),
+            str(output_path),
+            weight_type=QuantType.QInt8
+        )
+    else:
+        if not calibration_dir:
+            raise ValueError("int8_static requires calibration_dir")
+        quantize_static(
+            str(fp32_detector.artifact_path),
+            str(output_path),
+            ImageCalibrationReader(fp32_detector, calibration_dir, max_images),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8
+        )
+
+    print(f"[OK] Quantized detector ({profile}): {output_path}")
+    return output_path
+
+
+def quantize_recognizer(reader, profile):
+    """Quantize dynamic int8 recognizer của EasyOCR (in-place trên reader)"""
+    if profile == 'fp32':
+        return reader
+
+    import torch
+
+    reader.recognizer = torch.quantization.quantize_dynamic(
+        reader.recognizer,
+        {torch.nn.LSTM, torch.nn.Linear},
+        dtype=torch.qint8
+    )
+    return reader
+
+
+def load_labels(labeled_dir):
+    """
+    Đọc tập ảnh có nhãn: labeled_dir/labels.json dạng {"ten_anh.jpg": "29A12345", ...}
+    """
+    labels_file = Path(labeled_dir) / 'labels.json'
+    if not labels_file.exists():
+        raise FileNotFoundError(f"labels.json not found in: {labeled_dir}")
+    with open(labels_file, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def evaluate_profile(profile, labeled_dir, model_path=None):
+    """
+    Đo accuracy (biển số đọc đúng hoàn toàn) và latency của 1 profile
+
+    Returns:
+        dict: {'accuracy', 'correct', 'total', 'avg_latency_ms'}
+    """
+    from camera_ai.service import CameraAIService
+
+    # Luôn chạy model trong process: nếu đi qua inference server (CAMERA_AI_INFERENCE_SOCKET)
+    # thì mọi profile đều đo trên cùng 1 model đã load của server
+    service = CameraAIService(
+        model_path=model_path, quant_profile=profile, require_approval=False,
+        inference_socket='', use_frame_bus=False
+    )
+    labels = load_labels(labeled_dir)
+
+    correct = 0
+    total = 0
+    latencies = []
+
+    for filename, expected in labels.items():
+        frame = cv2.imread(str(Path(labeled_dir) / filename))
+        if frame is None:
+            continue
+        total += 1
+
+        start = time.perf_counter()
+        plates = sorted(service.detect_license_plate(frame), key=lambda x: x['confidence'], reverse=True)
+        ocr_results = service.extract_text_from_plates(frame, [p['bbox'] for p in plates[:3]])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        texts = [r for r in ocr_results if r]
+        if texts:
+            best = max(texts, key=lambda r: r['confidence'])
+            if best['text'] == service._normalize_plate_text(expected):
+                correct += 1
+
+    return {
+        'accuracy': correct / total if total else 0.0,
+        'correct': correct,
+        'total': total,
+        'avg_latency_ms': round(sum(latencies) / len(latencies), 2) if latencies else None
+    }
+
+
+def run_report(profiles, labeled_dir, model_path):
+    """
+    Đánh giá fp32 + các profile int8, ghi báo cáo accuracy delta vào models/quantization_report.json
+
+    Returns:
+        dict: Báo cáo đầy đủ theo profile
+    """
+    report = load_report(model_path)
+    model_sha256 = file_sha256(model_path)
+    baseline = evaluate_profile('fp32', labeled_dir, model_path)
+    report['fp32'] = dict(baseline, delta=0.0, approved=True, model_sha256=model_sha256,
+                          evaluated_at=datetime.now().isoformat())
+
+    for profile in profiles:
+        if profile == 'fp32':
+            continue
+        result = evaluate_profile(profile, labeled_dir, model_path)
+        delta = result['accuracy'] - baseline['accuracy']
+        report[profile] = dict(
+            result,
+            delta=round(delta, 4),
+            approved=delta >= -MAX_ACCURACY_DROP,
+            # Phê duyệt gắn với đúng cặp file đã đánh giá
+            model_sha256=model_sha256,
+            artifact_sha256=file_sha256(quantized_artifact_path(model_path, profile)),
+            evaluated_at=datetime.now().isoformat()
+        )
+
+    with open(report_path(model_path), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    return report
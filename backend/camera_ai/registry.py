@@ -0,0 +1,156 @@
+# camera_ai/registry.py
+"""
+Camera registry - danh sách camera của hệ thống (cổng, vai trò, nguồn, ROI, nhịp detect)
+
+Đọc từ file JSON (mặc định camera_ai/cameras.json, đổi bằng env CAMERA_AI_REGISTRY):
+
+    {
+      "default_camera": "live",
+      "cameras": [
+        {"id": "gate_1_in", "name": "Cổng 1 - Vào", "gate": "gate_1", "role": "checkin",
+         "source": {"type": "capture", "uri": "rtsp://10.0.0.11/stream"},
+         "roi": [0, 0.4, 1, 1], "detection_hz": 3},
+        {"id": "camera_1", "name": "Camera 1 (mô phỏng)", "gate": "main", "role": "checkin",
+         "source": {"type": "simulated"}}
+      ]
+    }
+
+- source.type = 'simulated': video mô phỏng (SimulatedCameraService)
+- source.type = 'capture': webcam index / RTSP URL (CameraAIService mở bằng FrameGrabber)
+Mọi camera dùng chung 1 bộ model (camera_service / inference server).
+"""
+import json
+import os
+from pathlib import Path
+
+DEFAULT_REGISTRY_PATH = Path(__file__).parent / 'cameras.json'
+
+CAMERA_ROLES = ('checkin', 'checkout', 'both')
+SOURCE_TYPES = ('simulated', 'capture')
+
+
+class CameraConfig:
+    """Cấu hình 1 camera"""
+
+    def __init__(self, camera_id, name=None, gate=None, role='both', source=None, roi=None,
+                 detection_hz=None):
+        source = source or {'type': 'simulated'}
+
+        if role not in CAMERA_ROLES:
+            raise ValueError(f"Invalid role for {camera_id}. Must be one of: {CAMERA_ROLES}")
+        if source.get('type') not in SOURCE_TYPES:
+            raise ValueError(f"Invalid source type for {camera_id}. Must be one of: {SOURCE_TYPES}")
+        if roi is not None and len(roi) != 4:
+            raise ValueError(f"Invalid ROI for {camera_id}: {roi}")
+
+        self.id = camera_id
+        self.name = name or camera_id
+        self.gate = gate
+        self.role = role
+        self.source_type = source['type']
+        self.uri = source.get('uri')
+        self.roi = tuple(roi) if roi else None
+        self.detection_hz = detection_hz
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            camera_id=data['id'],
+            name=data.get('name'),
+            gate=data.get('gate'),
+            role=data.get('role', 'both'),
+            source=data.get('source'),
+            roi=data.get('roi'),
+            detection_hz=data.get('detection_hz')
+        )
+
+    @property
+    def is_simulated(self):
+        return self.source_type == 'simulated'
+
+    @property
+    def capture_source(self):
+        """Nguồn cho cv2.VideoCapture (index webcam hoặc URL)"""
+        uri = self.uri
+        if isinstance(uri, str) and uri.isdigit():
+            return int(uri)
+        return uri
+
+    @property
+    def video_type(self):
+        """Thư mục video mô phỏng (checkin / checkout)"""
+        return 'checkout' if self.role == 'checkout' else 'checkin'
+
+    def handles(self, entry_type):
+        return self.role == 'both' or self.role == entry_type
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'gate': self.gate,
+            'role': self.role,
+            'source': {'type': self.source_type, 'uri': self.uri},
+            'roi': list(self.roi) if self.roi else None,
+            'detection_hz': self.detection_hz
+        }
+
+
+class CameraRegistry:
+    """Danh sách camera, tra cứu theo id hoặc theo cổng"""
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv('CAMERA_AI_REGISTRY') or DEFAULT_REGISTRY_PATH)
+        self.cameras = {}
+        self.default_camera = None
+        self.load()
+
+    def load(self):
+        """Đọc lại file cấu hình"""
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        cameras = {}
+        for item in data.get('cameras', []):
+            config = CameraConfig.from_dict(item)
+            if config.id in cameras:
+                raise ValueError(f"Duplicate camera id: {config.id}")
+            cameras[config.id] = config
+
+        self.cameras = cameras
+        self.default_camera = data.get('default_camera') or next(iter(cameras), None)
+
+    def get(self, camera_id=None):
+        """Lấy cấu hình camera (None → camera mặc định)"""
+        camera_id = camera_id or self.default_camera
+        config = self.cameras.get(camera_id)
+        if config is None:
+            raise ValueError(f"Invalid camera_id: {camera_id}")
+        return config
+
+    def all(self):
+        return list(self.cameras.values())
+
+    def simulated(self):
+        return [c for c in self.cameras.values() if c.is_simulated]
+
+    def captures(self):
+        return [c for c in self.cameras.values() if not c.is_simulated]
+
+    def for_gate(self, gate, entry_type=None):
+        """Camera của 1 cổng, ưu tiên camera đúng chiều vào/ra"""
+        candidates = [c for c in self.cameras.values() if c.gate == gate]
+        if not candidates:
+            raise ValueError(f"Invalid gate: {gate}")
+        if entry_type:
+            for config in candidates:
+                if config.role == entry_type:
+                    return config
+            for config in candidates:
+                if config.handles(entry_type):
+                    return config
+        return candidates[0]
+
+
+# Singleton instance
+camera_registry = CameraRegistry()
@@ -1,90 +1,314 @@
 # camera_ai/service.py
 """
 Camera AI Service - Nhận diện biển số xe bằng YOLO + OCR
+
+Model (YOLO, EasyOCR) được load lazy ở lần dùng đầu tiên hoặc qua warm_up(),
+nên import module này không kéo theo torch / ultralytics / easyocr.
 """
 import cv2
 import numpy as np
-from ultralytics import YOLO
-import easyocr
 from datetime import datetime
 import os
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from pathlib import Path
 
+from camera_ai.detectors import create_detector
+from camera_ai.frame_bus import FrameBusReaders
+from camera_ai.frame_grabber import FrameGrabber
+from camera_ai.inference_scheduler import inference_priority, inference_scheduler
+from camera_ai.inference_server import InferenceClient
+from camera_ai.plate_tracker import PlateTracker
+from camera_ai.registry import camera_registry
+from camera_ai.quantization import (
+    QUANT_PROFILES, is_profile_approved, quantize_recognizer, quantized_artifact_path
+)
+
+# Ký tự hợp lệ trên biển số Việt Nam (dùng cho recognizer-only mode)
+PLATE_ALLOWLIST = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ-.'
+
+# Chế độ OCR: 'recognizer' (chỉ chạy recognizer trên crop YOLO) hoặc 'full' (readtext với CRAFT)
+OCR_MODES = ('recognizer', 'full')
+
 class CameraAIService:
     """Service xử lý nhận diện biển số xe"""
     
-    def __init__(self, model_path=None, camera_id=0):
+    def __init__(self, model_path=None, camera_id=None, ocr_mode='recognizer', detector_backend=None,
+                 quant_profile=None, require_approval=True, gpu=None, inference_socket=None,
+                 use_frame_bus=None, burst_frames=None, burst_interval_ms=None):
         """
-        Khởi tạo service
+        Khởi tạo service (chưa load model, xem warm_up)
         
         Args:
             model_path: Đường dẫn đến model YOLO (tự động tìm nếu None)
-            camera_id: ID của camera (0 cho webcam, hoặc RTSP URL)
+            camera_id: Camera mặc định trong camera registry (None → default_camera của registry)
+            ocr_mode: 'recognizer' (mặc định, bỏ qua text detector) hoặc 'full'
+            detector_backend: 'torch', 'onnx' hoặc 'openvino'
+                (mặc định lấy từ env CAMERA_AI_DETECTOR_BACKEND, fallback 'onnx')
+            quant_profile: 'fp32', 'int8_dynamic' hoặc 'int8_static'
+                (mặc định lấy từ env CAMERA_AI_QUANT_PROFILE, fallback 'fp32')
+            require_approval: Chỉ bật profile int8 khi báo cáo accuracy đã đạt ngưỡng
+            gpu: Dùng GPU cho OCR (None → tự kiểm tra torch.cuda.is_available())
+            inference_socket: Unix socket của inference server (mặc định lấy từ env
+                CAMERA_AI_INFERENCE_SOCKET). Nếu có, service chỉ là thin client, không load model.
+            use_frame_bus: Đọc camera thật từ frame bus (mặc định bật khi có env CAMERA_AI_FRAME_BUS).
+                Khi bật, capture_frame đọc shared memory thay vì mở camera trực tiếp.
+            burst_frames: Số frame tối đa chụp liên tiếp khi quét (mặc định env
+                CAMERA_AI_BURST_FRAMES, fallback 5; 1 = chỉ 1 frame như cũ)
+            burst_interval_ms: Khoảng cách giữa 2 frame trong burst (env CAMERA_AI_BURST_INTERVAL_MS)
         """
+        if ocr_mode not in OCR_MODES:
+            raise ValueError(f"Invalid ocr_mode. Must be one of: {OCR_MODES}")
+        
+        quant_profile = quant_profile or os.getenv('CAMERA_AI_QUANT_PROFILE', 'fp32')
+        if quant_profile not in QUANT_PROFILES:
+            raise ValueError(f"Invalid quant_profile. Must be one of: {QUANT_PROFILES}")
+
         # Nếu không chỉ định, tìm model trong thư mục camera_ai/models
         if model_path is None:
             current_dir = Path(__file__).parent
             model_path = current_dir / 'models' / 'license-plate-finetune-v1m.pt'
             model_path = str(model_path)
         
-        # Khởi tạo YOLO model
+        self.model_path = model_path
+        self.detector_backend = detector_backend or os.getenv('CAMERA_AI_DETECTOR_BACKEND', 'onnx')
+        self.quant_profile = quant_profile
+        self.require_approval = require_approval
+        self.gpu = gpu
+        
+        # Inference server: worker gửi frame qua socket thay vì giữ model riêng
+        if inference_socket is None:
+            inference_socket = os.getenv('CAMERA_AI_INFERENCE_SOCKET')
+        self.inference_client = InferenceClient(inference_socket) if inference_socket else None
+        
+        # Model được load lazy (xem warm_up)
+        self._model = None
+        self._reader = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        
+        # Camera: mọi camera trong registry dùng chung model của service này
+        self.camera_id = camera_id or camera_registry.default_camera
+        self.grabbers = {}  # camera_id → FrameGrabber (thread đọc camera, chỉ giữ frame mới nhất)
+        self._grabbers_lock = threading.Lock()
+        
+        # Frame bus: đọc camera từ camera owner daemon thay vì tự mở cv2.VideoCapture
+        if use_frame_bus is None:
+            use_frame_bus = bool(os.getenv('CAMERA_AI_FRAME_BUS'))
+        self.bus_readers = FrameBusReaders() if use_frame_bus else None
+        
+        # Thư mục lưu ảnh
+        self.save_dir = Path('camera_ai/captured_images')
+        self.save_dir.mkdir(parents=True, exist_ok=True)
+        # Ghi ảnh nền (quét QR không chờ imwrite)
+        self._image_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-writer')
+        
+        # Confidence threshold
+        self.conf_threshold = 0.5
+        
+        # OCR recognizer-only: chiều cao cố định của crop và ngưỡng tỉ lệ biển 1 dòng
+        self.ocr_mode = ocr_mode
+        self.ocr_input_height = 128
+        self.one_line_aspect_ratio = 2.5
+        
+        # Burst mode: chụp nhiều frame, track biển số và vote từng ký tự
+        self.burst_frames = max(1, int(burst_frames or os.getenv('CAMERA_AI_BURST_FRAMES', '5')))
+        self.burst_interval = int(burst_interval_ms or os.getenv('CAMERA_AI_BURST_INTERVAL_MS', '60')) / 1000.0
+    
+    @property
+    def model(self):
+        """YOLO detector (load ở lần dùng đầu tiên)"""
+        self.warm_up()
+        return self._model
+    
+    @property
+    def reader(self):
+        """EasyOCR reader (load ở lần dùng đầu tiên)"""
+        self.warm_up()
+        return self._reader
+    
+    @property
+    def is_loaded(self):
+        return self._loaded
+    
+    def warm_up(self):
+        """
+        Load YOLO + OCR (chỉ 1 lần, thread-safe)
+        
+        Gọi sớm (VD: CAMERA_AI_WARMUP=True) để request quét đầu tiên không phải chờ load model.
+        """
+        if self._loaded or self.inference_client:
+            return self
+        
+        with self._load_lock:
+            if self._loaded:
+                return self
+            
+            start = time.perf_counter()
+            self._load_detector()
+            self._load_reader()
+            self._loaded = True
+            print(f"[OK] Camera AI models loaded in {time.perf_counter() - start:.1f}s")
+        
+        return self
+    
+    def _load_detector(self):
+        """Khởi tạo YOLO model theo backend + quantization profile"""
+        model_path = self.model_path
+        
+        # Profile int8 chỉ được bật khi báo cáo accuracy so với fp32 đã đạt ngưỡng
+        # trên đúng artifact hiện tại
+        if self.quant_profile != 'fp32' and self.require_approval:
+            approved, reason = is_profile_approved(model_path, self.quant_profile)
+            if not approved:
+                print(f"[WARNING] Không bật profile {self.quant_profile}: {reason}")
+                print(f"[INFO] Dùng profile fp32 (chạy lại: python manage.py camera_quantize)")
+                self.quant_profile = 'fp32'
+        
         try:
             # Kiểm tra model có tồn tại không
             model_path_obj = Path(model_path)
             if not model_path_obj.exists():
                 print(f"[WARNING] Model file not found: {model_path}")
                 print(f"[INFO] Camera AI sẽ hoạt động ở chế độ disabled")
-                self.model = None
+                self._model = None
             else:
-                self.model = YOLO(model_path)
-                print(f"[OK] Model loaded: {model_path}")
+                # Số thread nội bộ theo thread budget của inference scheduler
+                num_threads = inference_scheduler.threads_per_inference
+                if self.quant_profile == 'fp32':
+                    self._model = create_detector(model_path, self.detector_backend, num_threads)
+                else:
+                    # Profile int8 luôn chạy model ONNX đã quantize
+                    self._model = create_detector(
+                        quantized_artifact_path(model_path, self.quant_profile), 'onnx', num_threads
+                    )
+                print(f"[OK] Model loaded: {model_path} (backend: {self._model.name}, profile: {self.quant_profile})")
         except Exception as e:
             print(f"[ERROR] Không thể load model: {e}")
             print(f"[INFO] Camera AI sẽ hoạt động ở chế độ disabled")
-            self.model = None
-        
-        # Khởi tạo EasyOCR reader (hỗ trợ tiếng Việt)
-        try:
-            self.reader = easyocr.Reader(['en', 'vi'], gpu=True)
-            print("[OK] OCR reader initialized")
-        except Exception as e:
-            print(f"[WARNING] GPU OCR failed, using CPU: {e}")
-            self.reader = easyocr.Reader(['en', 'vi'], gpu=False)
+            self._model = None
+    
+    def _load_reader(self):
+        """Khởi tạo EasyOCR reader (hỗ trợ tiếng Việt)"""
+        import easyocr
         
-        # Camera
-        self.camera_id = camera_id
-        self.cap = None
+        import torch
+        gpu = self.gpu
+        if gpu is None:
+            gpu = torch.cuda.is_available()
+        torch.set_num_threads(inference_scheduler.threads_per_inference)
         
-        # Thư mục lưu ảnh
-        self.save_dir = Path('camera_ai/captured_images')
-        self.save_dir.mkdir(parents=True, exist_ok=True)
+        self._reader = easyocr.Reader(['en', 'vi'], gpu=gpu)
+        print(f"[OK] OCR reader initialized (device: {self._reader.device})")
         
-        # Confidence threshold
-        self.conf_threshold = 0.5
+        # Quantize recognizer (chỉ áp dụng trên CPU)
+        if self.quant_profile != 'fp32' and self._reader.device == 'cpu':
+            quantize_recognizer(self._reader, self.quant_profile)
         
-    def start_camera(self):
+    def _camera_config(self, camera_id=None):
+        """Cấu hình camera trong registry (None → camera mặc định của service)"""
+        return camera_registry.get(camera_id or self.camera_id)
+    
+    def start_camera(self, camera_id=None):
         """Khởi động camera"""
-        self.cap = cv2.VideoCapture(self.camera_id)
-        if not self.cap.isOpened():
-            raise Exception(f"Không thể mở camera: {self.camera_id}")
+        config = self._camera_config(camera_id)
+        
+        if config.is_simulated:
+            from camera_ai.simulation import simulated_camera_service
+            simulated_camera_service.start_camera(config.id)
+            return True
+        
+        if self.bus_readers:
+            # Camera do camera owner daemon mở, worker chỉ đọc frame bus
+            if not self.is_camera_active(config.id):
+                raise Exception(f"Camera {config.id} chưa được publish lên frame bus")
+            return True
+        
+        with self._grabbers_lock:
+            grabber = self.grabbers.get(config.id)
+            if grabber and grabber.is_active:
+                return True
+            
+            grabber = FrameGrabber(config.capture_source)
+            grabber.start()
+            self.grabbers[config.id] = grabber
         return True
     
-    def stop_camera(self):
+    def stop_camera(self, camera_id=None):
         """Dừng camera"""
-        if self.cap:
-            self.cap.release()
-        cv2.destroyAllWindows()
+        config = self._camera_config(camera_id)
+        
+        if config.is_simulated:
+            from camera_ai.simulation import simulated_camera_service
+            simulated_camera_service.stop_camera(config.id)
+            return
+        
+        if self.bus_readers:
+            return
+        
+        with self._grabbers_lock:
+            grabber = self.grabbers.pop(config.id, None)
+        if grabber:
+            grabber.stop()
     
-    def capture_frame(self):
+    def is_camera_active(self, camera_id=None):
+        """Camera đang mở (hoặc đang được publish lên frame bus)"""
+        config = self._camera_config(camera_id)
+        
+        if config.is_simulated:
+            from camera_ai.simulation import simulated_camera_service
+            return simulated_camera_service.is_camera_active(config.id)
+        
+        if self.bus_readers:
+            return self.bus_readers.read_latest(config.id) is not None
+        
+        grabber = self.grabbers.get(config.id)
+        return bool(grabber and grabber.is_active)
+    
+    def capture_frame(self, camera_id=None):
         """Chụp 1 frame từ camera"""
-        if not self.cap or not self.cap.isOpened():
+        return self.capture_frame_info(camera_id)[0]
+    
+    def capture_frame_info(self, camera_id=None):
+        """
+        Frame mới nhất kèm thời điểm chụp (không block chờ camera)
+        
+        timestamp: camera thật / frame bus là lúc frame được đọc từ camera. Camera mô phỏng
+        (không qua frame bus) không lưu thời điểm tạo frame nên timestamp là lúc gọi hàm này
+        → frame_age_ms của camera mô phỏng luôn ≈ 0.
+        
+        Returns:
+            tuple: (frame, timestamp, seq)
+        """
+        config = self._camera_config(camera_id)
+        
+        if config.is_simulated:
+            from camera_ai.simulation import simulated_camera_service
+            version, frame = simulated_camera_service.get_frame_versioned(config.id)
+            if frame is None:
+                raise Exception(f"Camera {config.id} chưa được khởi động")
+            return frame, time.time(), version
+        
+        if self.bus_readers:
+            # Copy 1 lần: frame được vẽ / lưu ảnh / dùng qua nhiều thread ở web worker.
+            # Frame vẫn mang bus_ref → inference server đọc zero-copy từ shared memory.
+            result = self.bus_readers.read_latest(config.id, copy=True)
+            if result is None:
+                raise Exception(f"Camera {config.id} chưa được publish lên frame bus")
+            seq, timestamp, frame = result
+            return frame, timestamp, seq
+        
+        grabber = self.grabbers.get(config.id)
+        if not grabber or not grabber.is_active:
             raise Exception("Camera chưa được khởi động")
         
-        ret, frame = self.cap.read()
-        if not ret:
+        # Vừa start camera → chờ frame đầu tiên
+        result = grabber.latest() or grabber.wait_for_frame()
+        if result is None:
             raise Exception("Không thể đọc frame từ camera")
         
-        return frame
+        return result
     
     def detect_license_plate(self, frame):
         """
@@ -96,50 +320,38 @@ class CameraAIService:
         Returns:
             list: Danh sách các bounding box của biển số
         """
+        if self.inference_client:
+            return self.inference_client.detect_license_plate(frame)
+        
         if not self.model:
             return []
         
-        # Chạy YOLO detection
-        results = self.model(frame, conf=self.conf_threshold)
-        
-        plates = []
-        for result in results:
-            boxes = result.boxes
-            for box in boxes:
-                # Lọc chỉ lấy class "license plate" (class 0 trong custom model)
-                # Hoặc dùng class "car" nếu chưa có custom model
-                cls = int(box.cls[0])
-                conf = float(box.conf[0])
-                
-                if conf > self.conf_threshold:
-                    # Lấy tọa độ bounding box
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    plates.append({
-                        'bbox': [int(x1), int(y1), int(x2), int(y2)],
-                        'confidence': conf,
-                        'class': cls
-                    })
-        
-        return plates
-    
-    def extract_text_from_plate(self, frame, bbox):
+        # Chạy YOLO detection qua backend đã chọn (torch / onnx / openvino),
+        # theo lớp ưu tiên của luồng gọi (xem inference_scheduler)
+        return inference_scheduler.run(self.model.predict, frame, self.conf_threshold)
+    
+    def extract_text_from_plate(self, frame, bbox, mode=None):
         """
         Trích xuất text từ vùng biển số (hỗ trợ cả 1 dòng và 2 dòng)
         
         Args:
             frame: Ảnh gốc
             bbox: Bounding box [x1, y1, x2, y2]
+            mode: 'recognizer' hoặc 'full' (mặc định dùng self.ocr_mode)
             
         Returns:
-            str: Text nhận diện được
+            dict: {'text', 'confidence', 'ocr_mode', 'latency_ms'} hoặc None
         """
-        x1, y1, x2, y2 = bbox
+        mode = mode or self.ocr_mode
         
-        # Crop vùng biển số
-        plate_img = frame[y1:y2, x1:x2]
+        if self.inference_client:
+            return self.inference_client.extract_text_from_plate(frame, bbox, mode)
         
-        # Tiền xử lý ảnh
-        plate_img = self._preprocess_plate(plate_img)
+        return self.extract_text_from_plates(frame, [bbox], mode=mode)[0]
+    
+    def _readtext_full(self, plate_img):
+        """OCR 'full': readtext với CRAFT text detector trên 1 crop đã tiền xử lý"""
+        start = time.perf_counter()
         
         # OCR với paragraph mode để đọc nhiều dòng
         results = self.reader.readtext(
@@ -153,11 +365,219 @@ class CameraAIService:
             mag_ratio=1.5
         )
         
+        latency_ms = (time.perf_counter() - start) * 1000
+        
+        return self._build_ocr_result(results, plate_img.shape, 'full', latency_ms)
+    
+    def extract_text_from_plates(self, frame, bboxes, expected_text=None, mode=None):
+        """
+        Trích xuất text từ nhiều vùng biển số trong 1 lần gọi (batch)
+        
+        Args:
+            frame: Ảnh gốc
+            bboxes: Danh sách bounding box, ưu tiên theo thứ tự (confidence giảm dần)
+            expected_text: Nếu có (biển số QR đã chuẩn hóa) → early-exit:
+                OCR riêng ứng viên đầu tiên, khớp thì dừng, không khớp mới batch phần còn lại
+            mode: 'recognizer' hoặc 'full' (mặc định dùng self.ocr_mode)
+            
+        Returns:
+            list: Kết quả OCR tương ứng từng bbox đã xử lý (None nếu không đọc được).
+                Khi early-exit, danh sách chỉ dài đến ứng viên khớp.
+        """
+        if self.inference_client:
+            return self.inference_client.extract_text_from_plates(frame, bboxes, expected_text, mode)
+        
+        if not bboxes:
+            return []
+        
+        return inference_scheduler.run(
+            self.extract_text_from_plates_many, [(frame, bboxes, expected_text, mode)]
+        )[0]
+    
+    def extract_text_from_plates_many(self, requests):
+        """
+        OCR cho nhiều request cùng lúc: crop của mọi request cùng chế độ được gộp chung 1 batch
+        (inference server dùng hàm này để batch các request đồng thời)
+        
+        Args:
+            requests: [(frame, bboxes, expected_text, mode), ...] (mode None → self.ocr_mode)
+            
+        Returns:
+            list: Với mỗi request, kết quả giống extract_text_from_plates
+        """
+        modes = [request[3] or self.ocr_mode for request in requests]
+        outputs = [None] * len(requests)
+        for mode in dict.fromkeys(modes):
+            indices = [i for i, m in enumerate(modes) if m == mode]
+            results = self._extract_text_batched([requests[i][:3] for i in indices], mode)
+            for i, result in zip(indices, results):
+                outputs[i] = result
+        return outputs
+    
+    def _extract_text_batched(self, requests, mode):
+        """
+        OCR 2 lượt cho các request cùng chế độ: lượt 1 chỉ ứng viên đầu tiên của request có
+        expected_text, lượt 2 phần còn lại của các request chưa khớp
+        
+        Args:
+            requests: [(frame, bboxes, expected_text), ...]
+            mode: 'recognizer' hoặc 'full'
+        """
+        # Tiền xử lý toàn bộ crop 1 lần
+        prepared = [self._prepare_plate_crops(frame, bboxes, mode) for frame, bboxes, _ in requests]
+        
+        # Lượt 1: chỉ ứng viên đầu tiên nếu có expected_text (early-exit), ngược lại toàn bộ crop
+        first_counts = [
+            1 if expected_text and len(plate_imgs) > 1 else len(plate_imgs)
+            for plate_imgs, (_, _, expected_text) in zip(prepared, requests)
+        ]
+        outputs = self._recognize_groups([imgs[:n] for imgs, n in zip(prepared, first_counts)], mode)
+        
+        # Lượt 2: phần còn lại của các request mà ứng viên đầu tiên chưa khớp
+        pending = [
+            i for i, (_, _, expected_text) in enumerate(requests)
+            if first_counts[i] < len(prepared[i])
+            and not (outputs[i][0] and outputs[i][0]['text'] == expected_text)
+        ]
+        if pending:
+            rest = self._recognize_groups([prepared[i][first_counts[i]:] for i in pending], mode)
+            for i, extra in zip(pending, rest):
+                outputs[i] = outputs[i] + extra
+        
+        return outputs
+    
+    def _prepare_plate_crops(self, frame, bboxes, mode='recognizer'):
+        """
+        Crop + tiền xử lý các vùng biển số theo chế độ OCR, None nếu crop rỗng
+        
+        'recognizer': chiều cao cố định (ghép canvas), 'full': tiền xử lý cho CRAFT
+        """
+        preprocess = self._preprocess_plate_fixed_height if mode == 'recognizer' else self._preprocess_plate
+        plate_imgs = []
+        for x1, y1, x2, y2 in bboxes:
+            crop = frame[y1:y2, x1:x2]
+            plate_imgs.append(preprocess(crop) if crop.size else None)
+        return plate_imgs
+    
+    def _recognize_groups(self, groups, mode='recognizer'):
+        """
+        Chạy OCR cho nhiều nhóm crop, trả kết quả tách theo nhóm
+        
+        'recognizer': 1 lần gọi recognizer cho mọi crop; 'full': readtext lần lượt từng crop
+        (CRAFT cần kích thước ảnh gốc) trong cùng 1 lượt scheduler
+        """
+        flat = [img for group in groups for img in group]
+        if mode == 'recognizer':
+            results = self._recognize_batch(flat) if flat else []
+        else:
+            results = [self._readtext_full(img) if img is not None else None for img in flat]
+        
+        outputs = []
+        pos = 0
+        for group in groups:
+            outputs.append(results[pos:pos + len(group)])
+            pos += len(group)
+        return outputs
+    
+    def get_inference_stats(self):
+        """Trạng thái inference scheduler (của inference server nếu dùng client)"""
+        if self.inference_client:
+            return self.inference_client.stats().get('scheduler')
+        return inference_scheduler.status()
+    
+    def compare_ocr_latency(self, frame, bbox):
+        """
+        Đo latency của cả 2 chế độ OCR trên cùng 1 crop (before/after)
+        
+        Returns:
+            dict: Kết quả + latency của 'full' và 'recognizer', kèm speedup
+        """
+        full = self.extract_text_from_plate(frame, bbox, mode='full')
+        fast = self.extract_text_from_plate(frame, bbox, mode='recognizer')
+        
+        full_ms = full['latency_ms'] if full else None
+        fast_ms = fast['latency_ms'] if fast else None
+        
+        return {
+            'full': full,
+            'recognizer': fast,
+            'speedup': round(full_ms / fast_ms, 2) if full_ms and fast_ms else None
+        }
+    
+    def _recognize_batch(self, plate_imgs):
+        """
+        Ghép các crop đã tiền xử lý thành 1 canvas và chạy recognizer 1 lần
+        
+        Returns:
+            list: Kết quả OCR (dict hoặc None) theo thứ tự plate_imgs
+        """
+        valid = [i for i, img in enumerate(plate_imgs) if img is not None]
+        outputs = [None] * len(plate_imgs)
+        if not valid:
+            return outputs
+        
+        start = time.perf_counter()
+        per_crop = self._recognize_plate_lines([plate_imgs[i] for i in valid])
+        latency_ms = (time.perf_counter() - start) * 1000
+        
+        for i, results in zip(valid, per_crop):
+            outputs[i] = self._build_ocr_result(
+                results, plate_imgs[i].shape, 'recognizer', latency_ms,
+                batch_size=len(valid)
+            )
+        
+        return outputs
+    
+    def _recognize_plate_lines(self, plate_imgs):
+        """
+        Chỉ chạy recognizer của EasyOCR trên từng dòng của các biển số
+        (YOLO đã tìm ra vùng biển số nên không cần chạy lại CRAFT detector)
+        
+        Các crop (cùng chiều cao cố định) được xếp chồng theo chiều dọc trên 1 canvas,
+        mỗi dòng của mỗi crop là 1 box trong horizontal_list → recognizer chạy 1 batch.
+        
+        Returns:
+            list: Với mỗi crop, kết quả cùng format với readtext: [(box, text, conf), ...]
+                (tọa độ box theo hệ của crop)
+        """
+        crop_h = self.ocr_input_height
+        max_w = max(img.shape[1] for img in plate_imgs)
+        canvas = np.full((crop_h * len(plate_imgs), max_w), 255, dtype=np.uint8)
+        
+        # horizontal_list của EasyOCR: [x_min, x_max, y_min, y_max]
+        horizontal_list = []
+        for i, img in enumerate(plate_imgs):
+            offset = i * crop_h
+            canvas[offset:offset + crop_h, :img.shape[1]] = img
+            for y0, y1 in self._split_plate_lines(img):
+                horizontal_list.append([0, img.shape[1], offset + y0, offset + y1])
+        
+        results = self.reader.recognize(
+            canvas,
+            horizontal_list=horizontal_list,
+            free_list=[],
+            allowlist=PLATE_ALLOWLIST,
+            detail=1,
+            paragraph=False,
+            batch_size=len(horizontal_list)
+        )
+        
+        # Trả kết quả về đúng crop dựa vào tọa độ Y trên canvas
+        per_crop = [[] for _ in plate_imgs]
+        for box, text, conf in results:
+            i = min(int(box[0][1]) // crop_h, len(plate_imgs) - 1)
+            local_box = [[x, y - i * crop_h] for x, y in box]
+            per_crop[i].append((local_box, text, conf))
+        
+        return per_crop
+    
+    def _build_ocr_result(self, results, img_shape, mode, latency_ms, batch_size=1):
+        """Ghép dòng, chuẩn hóa text và đóng gói kết quả OCR"""
         if not results:
             return None
         
         # Xử lý biển số 2 dòng
-        plate_text, confidence = self._process_multiline_plate(results, plate_img.shape)
+        plate_text, confidence = self._process_multiline_plate(results, img_shape)
         
         if not plate_text:
             return None
@@ -167,9 +587,52 @@ class CameraAIService:
         
         return {
             'text': plate_text,
-            'confidence': confidence
+            'confidence': confidence,
+            'ocr_mode': mode,
+            'latency_ms': round(latency_ms, 2),
+            'batch_size': batch_size
         }
     
+    def _split_plate_lines(self, binary):
+        """
+        Chia ảnh biển số thành 1 hoặc 2 dải dòng
+        
+        - Biển dài (tỉ lệ w/h lớn) → 1 dòng
+        - Biển vuông (xe máy) → tìm hàng ít chuyển đổi đen/trắng nhất ở giữa ảnh để cắt
+        
+        Returns:
+            list: [(y_start, y_end), ...]
+        """
+        h, w = binary.shape[:2]
+        
+        if w / float(h) >= self.one_line_aspect_ratio:
+            return [(0, h)]
+        
+        # Projection profile theo hàng: số lần chuyển đen/trắng (không phụ thuộc màu nền)
+        transitions = np.count_nonzero(np.diff(binary.astype(np.int16), axis=1), axis=1)
+        
+        # Chỉ tìm khe hở trong khoảng 30% - 70% chiều cao
+        lo, hi = int(h * 0.3), int(h * 0.7)
+        split = lo + int(np.argmin(transitions[lo:hi])) if hi > lo else h // 2
+        
+        return [(0, split), (split, h)]
+    
+    def _preprocess_plate_fixed_height(self, plate_img):
+        """Tiền xử lý nhẹ cho recognizer: grayscale, resize về chiều cao cố định, Otsu"""
+        gray = cv2.cvtColor(plate_img, cv2.COLOR_BGR2GRAY)
+        
+        h, w = gray.shape[:2]
+        scale = self.ocr_input_height / float(h)
+        gray = cv2.resize(gray, (max(1, int(w * scale)), self.ocr_input_height),
+                          interpolation=cv2.INTER_CUBIC)
+        
+        # Blur nhẹ thay cho fastNlMeansDenoising (rẻ hơn nhiều trên CPU)
+        gray = cv2.GaussianBlur(gray, (3, 3), 0)
+        
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        
+        return binary
+    
     def _process_multiline_plate(self, ocr_results, img_shape):
         """
         Xử lý kết quả OCR cho biển số 1 hoặc 2 dòng
@@ -316,7 +779,7 @@ class CameraAIService:
         
         return text
     
-    def save_captured_image(self, frame, plate_text, entry_type='checkin'):
+    def save_captured_image(self, frame, plate_text, entry_type='checkin', background=False):
         """
         Lưu ảnh đã chụp
         
@@ -324,6 +787,7 @@ class CameraAIService:
             frame: Ảnh gốc
             plate_text: Biển số nhận diện được
             entry_type: 'checkin' hoặc 'checkout'
+            background: Ghi file trên thread nền, trả về đường dẫn ngay
             
         Returns:
             str: Đường dẫn file đã lưu
@@ -332,17 +796,99 @@ class CameraAIService:
         filename = f"{entry_type}_{plate_text}_{timestamp}.jpg"
         filepath = self.save_dir / filename
         
-        cv2.imwrite(str(filepath), frame)
+        if background:
+            self._image_writer.submit(self._write_image, str(filepath), frame)
+        else:
+            cv2.imwrite(str(filepath), frame)
         
         return str(filepath)
     
-    def process_vehicle_entry(self, qr_plate, entry_type='checkin'):
+    def _write_image(self, filepath, frame):
+        if not cv2.imwrite(filepath, frame):
+            print(f"[WARNING] Không ghi được ảnh: {filepath}")
+    
+    def capture_plate_burst(self, expected_text=None, camera_id=None):
+        """
+        Chụp tối đa burst_frames frame, track biển số và OCR cho đến khi vote hội tụ
+        
+        Mỗi frame: detect → ghép box vào track (IoU) → chỉ OCR các track chưa hội tụ.
+        Dừng sớm khi có track khớp expected_text hoặc mọi track đã hội tụ.
+        
+        Returns:
+            dict: {'tracks', 'frames' (frame theo index), 'frame_stamps' (thời điểm chụp,
+                thời điểm đọc), 'detected', 'stats'}
+        """
+        tracker = PlateTracker()
+        frames = {}
+        detected = False
+        ocr_reads = 0
+        frame_stamps = {}
+        last_seq = None
+        
+        for frame_index in range(self.burst_frames):
+            if frame_index:
+                time.sleep(self.burst_interval)
+            
+            frame, timestamp, seq = self.capture_frame_info(camera_id)
+            
+            # Camera chưa có frame mới → bỏ qua, không OCR lại frame cũ
+            if seq == last_seq:
+                continue
+            last_seq = seq
+            
+            frames[frame_index] = frame
+            frame_stamps[frame_index] = (timestamp, time.time())
+            
+            # TOP 3 biển số có confidence cao nhất
+            plates = sorted(self.detect_license_plate(frame), key=lambda x: x['confidence'], reverse=True)[:3]
+            if plates:
+                detected = True
+            
+            pending = [(track, plate) for track, plate in tracker.update(plates)
+                       if not track.is_converged(expected_text)]
+            if pending:
+                # OCR batch, dừng sớm nếu ứng viên đầu tiên đã khớp QR
+                ocr_results = self.extract_text_from_plates(
+                    frame,
+                    [plate['bbox'] for _, plate in pending],
+                    expected_text=expected_text
+                )
+                ocr_reads += len(ocr_results)
+                for (track, _), ocr_result in zip(pending, ocr_results):
+                    if ocr_result:
+                        track.add_read(ocr_result['text'], ocr_result['confidence'], frame_index)
+            
+            tracks = [track for track in tracker.tracks if track.reads]
+            if tracks and (
+                any(track.vote() == expected_text for track in tracks)
+                or all(track.is_converged(expected_text) for track in tracks)
+            ):
+                break
+        
+        return {
+            'tracks': tracker.tracks,
+            'frames': frames,
+            'frame_stamps': frame_stamps,
+            'detected': detected,
+            'stats': {
+                'frames': len(frames),
+                'max_frames': self.burst_frames,
+                'ocr_reads': ocr_reads,
+                'tracks': len(tracker.tracks)
+            }
+        }
+    
+    def process_vehicle_entry(self, qr_plate, entry_type='checkin', camera_id=None, background_save=False):
         """
         Xử lý luồng check-in/check-out với xác minh QR code
         
         Args:
             qr_plate: Biển số từ QR code (format: VEHICLE_ID|LICENSE_PLATE)
-            entry_type: 'checkin' hoặc 'checkout'
+            entry_type: 'checkin' hoặc 'checkout', hoặc Future trả về 1 trong 2 giá trị
+                (chiều vào/ra đang được xác định song song, chỉ cần khi lưu ảnh).
+                Future bị cancel (QR / xe không hợp lệ) → không lưu ảnh, error_code SCAN_CANCELLED
+            camera_id: Camera trong registry (None → camera mặc định)
+            background_save: Ghi ảnh trên thread nền (không tính vào thời gian xử lý)
             
         Returns:
             dict: Kết quả xử lý
@@ -356,13 +902,13 @@ class CameraAIService:
                 qr_normalized = self._normalize_plate_text(qr_plate)
                 vehicle_id = None
             
-            # Chụp ảnh
-            frame = self.capture_frame()
+            # Chụp burst, track biển số qua các frame và vote ký tự
+            # (quét ở cổng → lớp ưu tiên cao nhất của inference scheduler)
+            with inference_priority('interactive'):
+                burst = self.capture_plate_burst(expected_text=qr_normalized, camera_id=camera_id)
+            tracks = [track for track in burst['tracks'] if track.reads]
             
-            # Nhận diện biển số
-            plates = self.detect_license_plate(frame)
-            
-            if not plates:
+            if not burst['detected']:
                 # Nếu không detect được → chỉ cho phép nếu QR hợp lệ
                 return {
                     'success': True,
@@ -373,23 +919,11 @@ class CameraAIService:
                     'message': f'⚠️ Không detect được biển số, nhưng QR hợp lệ\nVehicle ID: {vehicle_id}',
                     'camera_failed': True,
                     'image_path': None,
+                    'burst': burst['stats'],
                     'timestamp': datetime.now().isoformat()
                 }
             
-            # Lấy TOP 3 biển số có confidence cao nhất (smoothing)
-            top_plates = sorted(plates, key=lambda x: x['confidence'], reverse=True)[:3]
-            detected_plates = []
-            
-            for plate in top_plates:
-                ocr_result = self.extract_text_from_plate(frame, plate['bbox'])
-                if ocr_result:
-                    detected_plates.append({
-                        'text': ocr_result['text'],
-                        'confidence': ocr_result['confidence'],
-                        'detection_confidence': plate['confidence']
-                    })
-            
-            if not detected_plates:
+            if not tracks:
                 return {
                     'success': True,
                     'detected_plate': 'UNDETECTED',
@@ -399,28 +933,45 @@ class CameraAIService:
                     'message': f'⚠️ Không đọc được biển số, nhưng QR hợp lệ\nVehicle ID: {vehicle_id}',
                     'camera_failed': True,
                     'image_path': None,
+                    'burst': burst['stats'],
                     'timestamp': datetime.now().isoformat()
                 }
             
-            # Lấy biển số có confidence cao nhất
-            best_detection = max(detected_plates, key=lambda x: x['confidence'])
-            detected_plate = best_detection['text']
+            detected_plates = [track.to_dict(qr_normalized) for track in tracks]
             
-            # So sánh với QR code
-            match = (detected_plate == qr_normalized)
+            # Ưu tiên track có kết quả vote khớp QR, sau đó track có confidence cao nhất
+            best_track = next((t for t in tracks if t.vote() == qr_normalized), None)
+            match = best_track is not None
+            if best_track is None:
+                best_track = max(tracks, key=lambda t: t.confidence)
+            
+            detected_plate = best_track.vote()
+            best_detection = {
+                'confidence': best_track.confidence,
+                'detection_confidence': best_track.detection_confidence
+            }
             
-            # Nếu không khớp, kiểm tra các biển số khác trong TOP 3
-            if not match and len(detected_plates) > 1:
-                for alt_plate in detected_plates[1:]:
-                    if alt_plate['text'] == qr_normalized:
-                        # Tìm thấy khớp ở biển số thứ 2, 3
-                        detected_plate = alt_plate['text']
-                        best_detection['confidence'] = alt_plate['confidence']
-                        match = True
-                        break
+            # Ảnh lưu lại: frame có lần đọc tốt nhất của track
+            frame_index = best_track.best_read()['frame_index']
+            frame = burst['frames'][frame_index]
+            captured_at, read_at = burst['frame_stamps'][frame_index]
             
-            # Lưu ảnh
-            image_path = self.save_captured_image(frame, detected_plate, entry_type)
+            # Lưu ảnh (tên file theo chiều vào/ra)
+            if isinstance(entry_type, Future):
+                try:
+                    entry_type = entry_type.result(timeout=5)
+                except FutureTimeoutError:
+                    entry_type = 'auto'
+                except CancelledError:
+                    return {
+                        'success': False,
+                        'message': 'Lượt quét đã bị hủy',
+                        'error_code': 'SCAN_CANCELLED',
+                        'detected_plate': detected_plate,
+                        'qr_plate': qr_normalized,
+                        'match': match
+                    }
+            image_path = self.save_captured_image(frame, detected_plate, entry_type, background=background_save)
             
             return {
                 'success': True,
@@ -431,7 +982,11 @@ class CameraAIService:
                 'detection_confidence': best_detection['detection_confidence'],
                 'image_path': image_path,
                 'vehicle_id': vehicle_id,
+                'camera_id': camera_id or self.camera_id,
                 'all_detections': detected_plates,  # Debug info
+                'ocr_candidates': burst['stats']['ocr_reads'],  # Số crop đã OCR (hội tụ sớm → 1)
+                'burst': burst['stats'],
+                'frame_age_ms': round((read_at - captured_at) * 1000, 1),  # Độ trễ frame lúc đọc (≈ 0 với camera mô phỏng)
                 'message': f'✅ Biển số khớp! {detected_plate}' if match else f'❌ Biển số không khớp!\nQR: {qr_normalized}\nCamera: {detected_plate}',
                 'timestamp': datetime.now().isoformat()
             }
@@ -477,5 +1032,5 @@ class CameraAIService:
         return frame
 
 
-# Singleton instance
+# Singleton instance (chưa load model cho đến khi dùng hoặc warm_up)
 camera_service = CameraAIService()
\ No newline at end of file
@@ -1,25 +1,30 @@
 # camera_ai/simulation.py
 """
-Simulated Camera Service - Mô phỏng 2 camera với khả năng inject ảnh
+Simulated Camera Service - Mô phỏng các camera (khai báo trong camera registry) với khả năng inject ảnh
 """
 import cv2
 import numpy as np
 from pathlib import Path
 from datetime import datetime
+import os
 import threading
 import time
 from queue import Queue
 from typing import Optional, Dict, Any
 from django.conf import settings
 
+from camera_ai.detection_scheduler import DEFAULT_DETECTION_HZ, DetectionScheduler
+from camera_ai.frame_bus import FrameBusClient
+from camera_ai.registry import camera_registry
+
 class SimulatedCamera:
     """Class đại diện cho 1 camera ảo"""
     
     def __init__(self, camera_id: str, camera_type: str):
         """
         Args:
-            camera_id: "camera_1" hoặc "camera_2"
-            camera_type: "checkin" hoặc "checkout"
+            camera_id: ID camera trong registry (VD: "camera_1")
+            camera_type: "checkin" hoặc "checkout" (thư mục video)
         """
         self.camera_id = camera_id
         self.camera_type = camera_type
@@ -39,7 +44,11 @@ class SimulatedCamera:
         self.frame_thread = None
         self.running = False
         self.latest_frame = None
+        self.frame_version = 0  # Tăng mỗi khi latest_frame đổi (ảnh inject giữ nguyên version)
         self.frame_lock = threading.Lock()
+        
+        # Callback nhận mỗi frame mới (camera owner daemon dùng để publish lên frame bus)
+        self.on_frame = None
     
     def start(self, video_path: Optional[str] = None):
         """Khởi động camera"""
@@ -124,6 +133,10 @@ class SimulatedCamera:
                 
                 with self.frame_lock:
                     self.latest_frame = injection_data['frame'].copy()
+                    self.frame_version += 1
+                
+                if self.on_frame:
+                    self.on_frame(self.latest_frame)
             
             # If injection active, continue showing injected frame
             elif self.injection_active:
@@ -144,6 +157,10 @@ class SimulatedCamera:
                 if ret:
                     with self.frame_lock:
                         self.latest_frame = frame.copy()
+                        self.frame_version += 1
+                    
+                    if self.on_frame:
+                        self.on_frame(frame)
             
             # Maintain FPS
             elapsed = time.time() - start_time
@@ -152,14 +169,29 @@ class SimulatedCamera:
     
     def get_frame(self) -> Optional[np.ndarray]:
         """Lấy frame hiện tại"""
+        return self.get_frame_versioned()[1]
+    
+    def get_frame_versioned(self):
+        """Lấy frame hiện tại kèm version: (version, frame)"""
         with self.frame_lock:
             if self.latest_frame is not None:
-                return self.latest_frame.copy()
-        return None
+                return self.frame_version, self.latest_frame.copy()
+        return self.frame_version, None
+    
+    def status(self) -> Dict[str, Any]:
+        """Trạng thái camera"""
+        return {
+            'id': self.camera_id,
+            'type': self.camera_type,
+            'active': self.is_active,
+            'current_video': self.current_video,
+            'injection_active': self.injection_active,
+            'frame_version': self.frame_version
+        }
 
 
 class SimulatedCameraService:
-    """Service quản lý 2 camera mô phỏng"""
+    """Service quản lý các camera mô phỏng trong registry"""
     
     _instance = None
     
@@ -173,39 +205,73 @@ class SimulatedCameraService:
         if self._initialized:
             return
         
-        self.camera_1 = SimulatedCamera("camera_1", "checkin")
-        self.camera_2 = SimulatedCamera("camera_2", "checkout")
+        self.cameras = {
+            config.id: SimulatedCamera(config.id, config.video_type)
+            for config in camera_registry.simulated()
+        }
+        
+        # Frame bus: nếu có camera owner daemon, worker không tự decode video mà đọc shared memory
+        bus_socket = os.getenv('CAMERA_AI_FRAME_BUS')
+        self.bus = FrameBusClient(bus_socket) if bus_socket else None
         
         # Load AI service for detection
         from camera_ai.service import camera_service
         self.ai_service = camera_service
         
+        # Detection scheduler mỗi camera (YOLO theo nhịp, OCR khi có biển số mới).
+        # Mọi camera dùng chung model của camera_service.
+        self.schedulers = {
+            config.id: DetectionScheduler(self.ai_service, config.detection_hz or DEFAULT_DETECTION_HZ)
+            for config in camera_registry.simulated()
+        }
+        
         self._initialized = True
         print("[SimulatedCameraService] Initialized")
     
     def start_camera(self, camera_id: str, video_filename: Optional[str] = None):
         """Khởi động camera"""
         camera = self._get_camera(camera_id)
+        if self.bus:
+            self.bus.call({'op': 'start', 'camera_id': camera_id, 'video_filename': video_filename})
+            return
         camera.start(video_filename)
     
     def stop_camera(self, camera_id: str):
         """Dừng camera"""
         camera = self._get_camera(camera_id)
+        if self.bus:
+            self.bus.call({'op': 'stop', 'camera_id': camera_id})
+            return
         camera.stop()
     
     def inject_image(self, camera_id: str, image_filename: str, duration: float = 5.0):
         """Chèn ảnh vào camera"""
         camera = self._get_camera(camera_id)
+        if self.bus:
+            self.bus.call({'op': 'inject', 'camera_id': camera_id,
+                           'image_filename': image_filename, 'duration': duration})
+            return
         camera.inject_image(image_filename, duration)
     
     def get_frame(self, camera_id: str) -> Optional[np.ndarray]:
         """Lấy frame từ camera"""
         camera = self._get_camera(camera_id)
+        if self.bus:
+            return self.bus.get_frame(camera_id)
         return camera.get_frame()
     
+    def get_frame_versioned(self, camera_id: str):
+        """Lấy frame kèm version (frame bus: version = sequence number của ring)"""
+        camera = self._get_camera(camera_id)
+        if self.bus:
+            frame = self.bus.get_frame(camera_id)
+            bus_ref = getattr(frame, 'bus_ref', None)
+            return (bus_ref[1] if bus_ref else None), frame
+        return camera.get_frame_versioned()
+    
     def get_frame_with_detection(self, camera_id: str) -> Dict[str, Any]:
         """Lấy frame và chạy detection"""
-        frame = self.get_frame(camera_id)
+        version, frame = self.get_frame_versioned(camera_id)
         
         if frame is None:
             return {
@@ -214,72 +280,60 @@ class SimulatedCameraService:
                 'frame': None
             }
         
-        # Run YOLO detection
-        plates = self.ai_service.detect_license_plate(frame)
-        
-        detected_plate = None
-        confidence = 0.0
-        
-        if plates:
-            best_plate = max(plates, key=lambda x: x['confidence'])
-            ocr_result = self.ai_service.extract_text_from_plate(frame, best_plate['bbox'])
-            
-            if ocr_result:
-                detected_plate = ocr_result['text']
-                confidence = ocr_result['confidence']
-                
-                # Draw visualization
-                frame = self.ai_service.visualize_detection(
-                    frame, 
-                    [best_plate], 
-                    detected_plate
-                )
+        # Detection chạy theo nhịp của scheduler, các frame giữa chỉ vẽ lại overlay cũ.
+        # Frame cùng version (ảnh inject đứng yên) chỉ được phân tích 1 lần.
+        result = self.schedulers[camera_id].process(frame, version)
+        frame = result['frame']
+        detected_plate = result['detected_plate']
+        confidence = result['confidence']
         
         return {
             'success': True,
             'frame': frame,
             'detected_plate': detected_plate,
             'confidence': confidence,
-            'camera_id': camera_id
+            'camera_id': camera_id,
+            'frame_version': version
         }
     
+    def get_detection_stats(self) -> Dict[str, Any]:
+        """Thống kê detection scheduler từng camera"""
+        return {camera_id: scheduler.get_stats() for camera_id, scheduler in self.schedulers.items()}
+    
     def is_camera_active(self, camera_id: str) -> bool:
         """Kiểm tra camera có đang chạy không"""
         camera = self._get_camera(camera_id)
+        if self.bus:
+            return self.bus.is_active(camera_id)
         return camera.is_active
     
     def get_status(self) -> Dict[str, Any]:
         """Lấy trạng thái toàn bộ hệ thống"""
-        return {
-            'camera_1': {
-                'id': 'camera_1',
-                'type': 'checkin',
-                'active': self.camera_1.is_active,
-                'current_video': self.camera_1.current_video,
-                'injection_active': self.camera_1.injection_active
-            },
-            'camera_2': {
-                'id': 'camera_2',
-                'type': 'checkout',
-                'active': self.camera_2.is_active,
-                'current_video': self.camera_2.current_video,
-                'injection_active': self.camera_2.injection_active
-            }
-        }
+        if self.bus:
+            status = self.bus.call({'op': 'status'})['status']
+        else:
+            status = {camera_id: camera.status() for camera_id, camera in self.cameras.items()}
+        
+        for camera_id, camera_status in status.items():
+            if camera_id in camera_registry.cameras:
+                config = camera_registry.get(camera_id)
+                camera_status.update({'name': config.name, 'gate': config.gate, 'role': config.role})
+        return status
     
     def _get_camera(self, camera_id: str) -> SimulatedCamera:
         """Helper để lấy camera object"""
-        if camera_id == "camera_1":
-            return self.camera_1
-        elif camera_id == "camera_2":
-            return self.camera_2
-        else:
+        camera = self.cameras.get(camera_id)
+        if camera is None:
             raise ValueError(f"Invalid camera_id: {camera_id}")
+        return camera
     
     def cleanup(self):
         """Cleanup khi shutdown"""
-        self.camera_1.stop()
-        self.camera_2.stop()
+        if self.bus:
+            # Camera thuộc về daemon, worker không dừng
+            return
+        for camera in self.cameras.values():
+            camera.stop()
 
 
 # Singleton instance
@@ -4,11 +4,15 @@ Views cho Simulated Camera System
 """
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.http import JsonResponse, StreamingHttpResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.core.files.storage import default_storage
 from users.decorators import login_required, admin_required, security_required
 from camera_ai.simulation import simulated_camera_service
+from camera_ai.broadcaster import broadcasters, mjpeg_response
+from camera_ai.registry import camera_registry
+from camera_ai.service import camera_service
+from camera_ai.single_flight import scan_single_flight
 import cv2
 import numpy as np
 import json
@@ -203,65 +207,72 @@ def api_inject_image(request):
 def api_camera_status(request):
     """API: Lấy trạng thái cameras"""
     status = simulated_camera_service.get_status()
+    
+    # Camera thật trong registry
+    for config in camera_registry.captures():
+        status[config.id] = {
+            'id': config.id,
+            'type': 'capture',
+            'active': camera_service.is_camera_active(config.id),
+            'name': config.name,
+            'gate': config.gate,
+            'role': config.role
+        }
+    
     return JsonResponse({
         'success': True,
-        'status': status
+        'status': status,
+        'cameras': [config.to_dict() for config in camera_registry.all()],
+        'streams': broadcasters.status(),
+        'detection': simulated_camera_service.get_detection_stats(),
+        'inference': _inference_stats(),
+        'scan_dedup': scan_single_flight.status()
     })
 
 
+def _inference_stats():
+    """Hàng đợi / thời gian chờ theo lớp ưu tiên (None nếu inference server không phản hồi)"""
+    try:
+        return camera_service.get_inference_stats()
+    except Exception as e:
+        print(f"[WARNING] Inference stats unavailable: {e}")
+        return None
+
+
 # ============================================
 # STREAMING ENDPOINTS
 # ============================================
 
-def generate_camera_stream(camera_id):
-    """Generator để stream video từ camera"""
-    while True:
-        try:
-            if not simulated_camera_service.is_camera_active(camera_id):
-                # Return placeholder frame
-                placeholder = cv2.imread(str(Path(__file__).parent / 'static' / 'camera_offline.png'))
-                if placeholder is None:
-                    # Create black frame with text
-                    placeholder = 255 * np.ones((480, 640, 3), dtype=np.uint8)
-                    cv2.putText(placeholder, 'Camera Offline', (200, 240),
-                               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-                
-                ret, buffer = cv2.imencode('.jpg', placeholder)
-            else:
-                # Get frame with detection
-                result = simulated_camera_service.get_frame_with_detection(camera_id)
-                
-                if result['success'] and result['frame'] is not None:
-                    ret, buffer = cv2.imencode('.jpg', result['frame'])
-                else:
-                    continue
-            
-            if ret:
-                frame_bytes = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            
-        except Exception as e:
-            print(f"Stream error [{camera_id}]: {e}")
-            break
+def _camera_frame_producer(camera_id):
+    """Hàm tạo frame (đã detect + vẽ overlay) cho broadcaster của camera"""
+    def produce():
+        if not simulated_camera_service.is_camera_active(camera_id):
+            return None
+        
+        # Get frame with detection
+        result = simulated_camera_service.get_frame_with_detection(camera_id)
+        if result['success'] and result['frame'] is not None:
+            return result['frame']
+        return None
+    return produce
 
 
-@login_required
-def stream_camera_1(request):
-    """Stream camera 1 (Check-in)"""
-    return StreamingHttpResponse(
-        generate_camera_stream('camera_1'),
-        content_type='multipart/x-mixed-replace; boundary=frame'
-    )
+def get_camera_broadcaster(camera_id):
+    """Broadcaster dùng chung cho mọi người xem của 1 camera"""
+    return broadcasters.get(camera_id, _camera_frame_producer(camera_id))
+
+
+def generate_camera_stream(camera_id):
+    """Generator để stream video từ camera (1 lần detect + encode cho mọi người xem)"""
+    return get_camera_broadcaster(camera_id).subscribe()
 
 
 @login_required
-def stream_camera_2(request):
-    """Stream camera 2 (Check-out)"""
-    return StreamingHttpResponse(
-        generate_camera_stream('camera_2'),
-        content_type='multipart/x-mixed-replace; boundary=frame'
-    )
+async def stream_camera(request, camera_id):
+    """Stream camera mô phỏng theo ID trong registry"""
+    if camera_id not in simulated_camera_service.cameras:
+        return JsonResponse({'error': f'Invalid camera_id: {camera_id}'}, status=404)
+    return mjpeg_response(request, get_camera_broadcaster(camera_id))
 
 
 # ============================================
@@ -272,6 +283,11 @@ def stream_camera_2(request):
 def capture_camera_frame(request, camera_id):
     """Capture a single JPEG frame from camera for preview"""
     try:
+        # Nếu đang có người xem stream → dùng lại JPEG mới nhất của broadcaster
+        broadcaster = broadcasters.find(camera_id)
+        if broadcaster and broadcaster.subscribers and broadcaster.latest_jpeg():
+            return HttpResponse(broadcaster.latest_jpeg(), content_type='image/jpeg')
+        
         result = simulated_camera_service.get_frame_with_detection(camera_id)
         
         if result['success'] and result['frame'] is not None:
@@ -304,10 +320,14 @@ def capture_camera_frame(request, camera_id):
 @login_required
 @security_required
 def security_live_view(request):
-    """Security Dashboard - Xem live 2 camera"""
+    """Security Dashboard - Xem live các camera mô phỏng"""
     status = simulated_camera_service.get_status()
     
     context = {
-        'status': status
+        'status': status,
+        'cameras': [
+            dict(config.to_dict(), active=status.get(config.id, {}).get('active', False))
+            for config in camera_registry.simulated()
+        ]
     }
     return render(request, 'camera_ai/security_live_view.html', context)
\ No newline at end of file
@@ -0,0 +1,117 @@
+# camera_ai/single_flight.py
+"""
+Single-flight + TTL cache cho các request trùng nhau
+
+Scanner QR (Html5Qrcode) decode liên tục nên 1 mã QR đưa trước camera có thể gửi nhiều
+POST trong 1 giây. Các request cùng key:
+- Đến khi request đầu tiên đang chạy → chờ và dùng chung kết quả
+- Đến trong vòng ttl giây sau khi request đầu tiên xong → trả lại kết quả đã cache
+Chỉ request đầu tiên thực sự chạy (chụp camera, YOLO, OCR, check-in).
+Kết quả lỗi / không qua cache_if không được dùng chung: request đang chờ tự chạy lại.
+
+Cache nằm trong bộ nhớ của process (mỗi worker có cache riêng).
+"""
+import os
+import threading
+import time
+
+
+class _Call:
+    """1 lần chạy đang diễn ra hoặc đã xong"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.shared = False  # Kết quả được dùng chung (request chờ / cache)
+        self.finished_at = None
+
+
+class SingleFlight:
+    """
+    Args:
+        ttl: Thời gian giữ kết quả sau khi chạy xong (giây)
+        wait_timeout: Thời gian tối đa request trùng chờ request đầu tiên (giây)
+    """
+
+    def __init__(self, ttl=None, wait_timeout=10.0):
+        self.ttl = ttl if ttl is not None else float(os.getenv('CAMERA_AI_SCAN_DEDUP_TTL', '3'))
+        self.wait_timeout = wait_timeout
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.stats = {'executed': 0, 'joined': 0, 'cached': 0}
+
+    def _purge(self, now):
+        expired = [key for key, call in self.calls.items()
+                   if call.finished_at is not None and now - call.finished_at > self.ttl]
+        for key in expired:
+            del self.calls[key]
+
+    def do(self, key, fn, cache_if=None):
+        """
+        Chạy fn() 1 lần cho mỗi key
+
+        Args:
+            key: Khóa gộp request (hashable)
+            fn: Hàm thực thi
+            cache_if: Hàm kiểm tra kết quả có được dùng chung không (None → luôn dùng chung).
+                Kết quả không qua: không cache, request đang chờ chạy lại fn của mình.
+
+        Returns:
+            tuple: (result, shared) - shared=True nếu dùng lại kết quả của request khác
+
+        Raises:
+            TimeoutError: Chờ request khác quá wait_timeout
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._purge(now)
+                call = self.calls.get(key)
+                if call is None:
+                    call = _Call()
+                    self.calls[key] = call
+                    leader = True
+                else:
+                    leader = False
+                    self.stats['cached' if call.done.is_set() else 'joined'] += 1
+
+            if leader:
+                break
+            if not call.done.wait(max(0.0, deadline - time.monotonic())):
+                raise TimeoutError(f"Request trùng chờ quá {self.wait_timeout}s")
+            if call.shared:
+                return call.result, True
+            # Lỗi / kết quả không dùng chung → chạy lại (1 request làm leader mới, còn lại chờ)
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.stats['executed'] += 1
+                call.finished_at = time.monotonic()
+                call.shared = call.error is None and (cache_if is None or cache_if(call.result))
+                if not call.shared and self.calls.get(key) is call:
+                    del self.calls[key]
+            call.done.set()
+
+        return call.result, False
+
+    def status(self):
+        with self.lock:
+            self._purge(time.monotonic())
+            return {
+                'ttl': self.ttl,
+                'in_flight': sum(1 for call in self.calls.values() if not call.done.is_set()),
+                'cached_keys': sum(1 for call in self.calls.values() if call.done.is_set()),
+                **self.stats,
+                'deduplicated': self.stats['joined'] + self.stats['cached']
+            }
+
+
+# Singleton: gộp các lượt quét QR trùng (cùng QR + cổng) trong CAMERA_AI_SCAN_DEDUP_TTL giây
+scan_single_flight = SingleFlight()
@@ -0,0 +1,835 @@
+import threading
+import time
+
+import numpy as np
+from django.test import SimpleTestCase
+from django.urls import path
+
+from camera_ai.service import CameraAIService
+
+
+def _bare_service(ocr_input_height=32):
+    """CameraAIService không load model / mở camera (chỉ dùng các hàm xử lý thuần)"""
+    service = CameraAIService.__new__(CameraAIService)
+    service.ocr_input_height = ocr_input_height
+    service.one_line_aspect_ratio = 2.5
+    service.inference_client = None
+    service._loaded = True
+    service._reader = None
+    return service
+
+
+def _two_line_plate(h=40, w=60, gap=(18, 22)):
+    """Ảnh nhị phân 2 dòng: sọc dọc (nhiều chuyển đen/trắng), khe trắng ở giữa"""
+    img = np.full((h, w), 255, dtype=np.uint8)
+    img[:, ::4] = 0
+    img[gap[0]:gap[1], :] = 255
+    return img
+
+
+class SplitPlateLinesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.service = _bare_service()
+
+    def test_wide_plate_is_one_line(self):
+        img = np.zeros((20, 100), dtype=np.uint8)
+        self.assertEqual(self.service._split_plate_lines(img), [(0, 20)])
+
+    def test_square_plate_splits_at_gap(self):
+        split_lines = self.service._split_plate_lines(_two_line_plate(gap=(18, 22)))
+        self.assertEqual(len(split_lines), 2)
+        (top_start, split), (bottom_start, bottom_end) = split_lines
+        self.assertEqual(top_start, 0)
+        self.assertEqual(split, bottom_start)
+        self.assertEqual(bottom_end, 40)
+        self.assertTrue(18 <= split < 22)
+
+    def test_split_stays_in_middle_band(self):
+        # Khe trắng sát mép trên (ngoài dải 30% - 70%) → không cắt ở đó
+        (_, split), _ = self.service._split_plate_lines(_two_line_plate(gap=(0, 6)))
+        self.assertTrue(int(40 * 0.3) <= split < int(40 * 0.7))
+
+
+class _FakeReader:
+    """Giả lập easyocr.Reader.recognize: trả 1 kết quả / box theo tọa độ canvas"""
+
+    def __init__(self):
+        self.calls = []
+
+    def recognize(self, canvas, horizontal_list, free_list, **kwargs):
+        self.calls.append({'canvas_shape': canvas.shape, 'horizontal_list': horizontal_list, **kwargs})
+        results = []
+        for n, (x0, x1, y0, y1) in enumerate(horizontal_list):
+            box = [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+            results.append((box, f'L{n}', 0.9))
+        return results
+
+
+class RecognizePlateLinesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.service = _bare_service(ocr_input_height=40)
+        self.reader = _FakeReader()
+        self.service._reader = self.reader
+
+    def test_batches_all_lines_in_one_call(self):
+        one_line = np.zeros((40, 120), dtype=np.uint8)
+        two_line = _two_line_plate()
+        per_crop = self.service._recognize_plate_lines([one_line, two_line])
+
+        self.assertEqual(len(self.reader.calls), 1)
+        self.assertEqual(self.reader.calls[0]['batch_size'], 3)
+        self.assertEqual(self.reader.calls[0]['canvas_shape'], (80, 120))
+        self.assertEqual([len(lines) for lines in per_crop], [1, 2])
+
+    def test_boxes_mapped_back_to_crop_coordinates(self):
+        per_crop = self.service._recognize_plate_lines([np.zeros((40, 120), dtype=np.uint8), _two_line_plate()])
+
+        for lines in per_crop:
+            for box, _, _ in lines:
+                ys = [y for _, y in box]
+                self.assertTrue(all(0 <= y <= 40 for y in ys))
+        # Dòng dưới của crop thứ 2 kết thúc ở đáy crop (không phải đáy canvas)
+        self.assertEqual(per_crop[1][-1][0][2][1], 40)
+
+
+class _FakeOCR:
+    """Thay _recognize_batch / _readtext_full: đọc mọi crop ra texts theo thứ tự, ghi lại từng lần gọi"""
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+        self.batches = []
+        self.full_calls = 0
+
+    def _result(self, mode):
+        text = self.texts.pop(0) if self.texts else None
+        return {'text': text, 'confidence': 0.9, 'ocr_mode': mode, 'latency_ms': 1.0, 'batch_size': 1} if text else None
+
+    def recognize_batch(self, plate_imgs):
+        self.batches.append(len(plate_imgs))
+        return [self._result('recognizer') for _ in plate_imgs]
+
+    def readtext_full(self, plate_img):
+        self.full_calls += 1
+        return self._result('full')
+
+
+class OCRModeTests(SimpleTestCase):
+    BBOXES = [[0, 0, 20, 10], [20, 0, 40, 10], [40, 0, 60, 10]]
+
+    def setUp(self):
+        self.frame = np.zeros((10, 60, 3), dtype=np.uint8)
+
+    def _service(self, ocr_mode, texts):
+        service = _bare_service()
+        service.ocr_mode = ocr_mode
+        service._preprocess_plate = lambda crop: crop
+        service._preprocess_plate_fixed_height = lambda crop: crop
+        self.ocr = _FakeOCR(texts)
+        service._recognize_batch = self.ocr.recognize_batch
+        service._readtext_full = self.ocr.readtext_full
+        return service
+
+    def test_requested_mode_overrides_default(self):
+        service = self._service('full', ['29A12345'])
+
+        result = service.extract_text_from_plate(self.frame, self.BBOXES[0], mode='recognizer')
+
+        self.assertEqual(result['ocr_mode'], 'recognizer')
+        self.assertEqual(self.ocr.batches, [1])
+        self.assertEqual(self.ocr.full_calls, 0)
+
+    def test_compare_ocr_latency_runs_both_modes(self):
+        for ocr_mode in ('full', 'recognizer'):
+            service = self._service(ocr_mode, ['29A12345', '29A12345'])
+
+            comparison = service.compare_ocr_latency(self.frame, self.BBOXES[0])
+
+            self.assertEqual(comparison['full']['ocr_mode'], 'full')
+            self.assertEqual(comparison['recognizer']['ocr_mode'], 'recognizer')
+            self.assertEqual((self.ocr.full_calls, self.ocr.batches), (1, [1]))
+
+    def test_matching_first_candidate_skips_remaining_crops(self):
+        for mode in ('recognizer', 'full'):
+            service = self._service('recognizer', ['29A12345', 'X', 'Y'])
+
+            results = service.extract_text_from_plates(self.frame, self.BBOXES, '29A12345', mode=mode)
+
+            self.assertEqual([r['text'] for r in results], ['29A12345'])
+            self.assertEqual(self.ocr.batches if mode == 'recognizer' else self.ocr.full_calls,
+                             [1] if mode == 'recognizer' else 1)
+
+    def test_mismatch_batches_remaining_crops(self):
+        service = self._service('full', ['51F99999', '29A12345', 'Y'])
+
+        results = service.extract_text_from_plates(self.frame, self.BBOXES, '29A12345', mode='recognizer')
+
+        self.assertEqual([r['text'] for r in results], ['51F99999', '29A12345', 'Y'])
+        self.assertEqual(self.ocr.batches, [1, 2])
+
+    def test_many_groups_requests_by_mode(self):
+        service = self._service('recognizer', ['A1', 'B1', 'C1'])
+
+        outputs = service.extract_text_from_plates_many([
+            (self.frame, self.BBOXES[:1], None, None),
+            (self.frame, self.BBOXES[:1], None, 'full'),
+            (self.frame, self.BBOXES[:1], None, 'recognizer'),
+        ])
+
+        self.assertEqual([out[0]['ocr_mode'] for out in outputs], ['recognizer', 'full', 'recognizer'])
+        # 2 request 'recognizer' gộp chung 1 batch
+        self.assertEqual(self.ocr.batches, [2])
+        self.assertEqual(self.ocr.full_calls, 1)
+
+
+class _FakeAIService:
+    """detect_license_plate / extract_text_from_plate trả kết quả cố định, đếm số lần gọi"""
+
+    def __init__(self, plates, ocr_results):
+        self.plates = plates
+        self.ocr_results = list(ocr_results)
+        self.detect_calls = 0
+        self.ocr_calls = 0
+
+    def detect_license_plate(self, frame):
+        self.detect_calls += 1
+        return self.plates
+
+    def extract_text_from_plate(self, frame, bbox):
+        self.ocr_calls += 1
+        return self.ocr_results.pop(0) if self.ocr_results else None
+
+    def visualize_detection(self, frame, plates, detected_text=None):
+        return frame
+
+
+class DetectionSchedulerTests(SimpleTestCase):
+    PLATE = {'bbox': [10, 10, 60, 40], 'confidence': 0.9}
+
+    def _scheduler(self, ocr_results, detection_hz=10):
+        from camera_ai.detection_scheduler import DetectionScheduler
+
+        ai = _FakeAIService([self.PLATE], ocr_results)
+        return DetectionScheduler(ai, detection_hz=detection_hz), ai
+
+    def test_same_version_analysed_once(self):
+        scheduler, ai = self._scheduler([{'text': '29A12345', 'confidence': 0.8}])
+        frame = np.zeros((10, 10, 3), dtype=np.uint8)
+
+        first = scheduler.process(frame, version=1, now=100.0)
+        second = scheduler.process(frame, version=1, now=101.0)
+
+        self.assertTrue(first['detection_ran'])
+        self.assertFalse(second['detection_ran'])
+        self.assertEqual(second['detected_plate'], '29A12345')
+        self.assertEqual(ai.detect_calls, 1)
+        self.assertEqual(scheduler.get_stats()['cache_hits'], 1)
+
+    def test_detection_follows_cadence(self):
+        scheduler, ai = self._scheduler([{'text': '29A12345', 'confidence': 0.8}], detection_hz=2)
+        frame = np.zeros((10, 10, 3), dtype=np.uint8)
+
+        scheduler.process(frame, now=100.0)
+        result = scheduler.process(frame, now=100.2)  # < 0.5s → chỉ vẽ lại overlay
+
+        self.assertFalse(result['detection_ran'])
+        self.assertEqual(ai.detect_calls, 1)
+
+    def test_same_box_not_ocr_again(self):
+        scheduler, ai = self._scheduler([{'text': '29A12345', 'confidence': 0.8}])
+        frame = np.zeros((10, 10, 3), dtype=np.uint8)
+
+        scheduler.process(frame, version=1, now=100.0)
+        scheduler.process(frame, version=2, now=101.0)
+
+        self.assertEqual(ai.detect_calls, 2)
+        self.assertEqual(ai.ocr_calls, 1)
+
+    def test_failed_ocr_is_retried(self):
+        scheduler, ai = self._scheduler([None, {'text': '29A12345', 'confidence': 0.8}])
+        frame = np.zeros((10, 10, 3), dtype=np.uint8)
+
+        first = scheduler.process(frame, version=1, now=100.0)
+        second = scheduler.process(frame, version=1, now=101.0)
+
+        self.assertIsNone(first['detected_plate'])
+        self.assertTrue(second['detection_ran'])
+        self.assertEqual(second['detected_plate'], '29A12345')
+        self.assertEqual(ai.ocr_calls, 2)
+
+
+class MotionGateTests(SimpleTestCase):
+
+    def setUp(self):
+        from camera_ai.motion_gate import MotionGate
+
+        self.gate = MotionGate(roi=(0, 0.5, 1, 1), min_area=0.05, hold_seconds=2.0)
+        self.empty = np.zeros((120, 160, 3), dtype=np.uint8)
+
+    def test_first_frame_passes(self):
+        self.assertTrue(self.gate.check(self.empty, now=100.0))
+
+    def test_static_lane_skipped_after_hold(self):
+        self.gate.check(self.empty, now=100.0)
+        self.assertTrue(self.gate.check(self.empty, now=101.0))   # Còn trong hold_seconds
+        self.assertFalse(self.gate.check(self.empty, now=103.0))
+        self.assertEqual(self.gate.status()['skipped'], 1)
+
+    def test_motion_in_roi_opens_gate(self):
+        self.gate.check(self.empty, now=100.0)
+        self.gate.check(self.empty, now=103.0)
+
+        vehicle = self.empty.copy()
+        vehicle[80:120, 40:120] = 255
+        self.assertTrue(self.gate.check(vehicle, now=104.0))
+        self.assertEqual(self.gate.status()['triggers'], 2)
+
+    def test_motion_outside_roi_ignored(self):
+        self.gate.check(self.empty, now=100.0)
+        self.gate.check(self.empty, now=103.0)
+
+        above_roi = self.empty.copy()
+        above_roi[0:50, :] = 255
+        self.assertFalse(self.gate.check(above_roi, now=104.0))
+
+    def test_parse_roi(self):
+        from camera_ai.motion_gate import _parse_roi
+
+        self.assertEqual(_parse_roi('0,0.4,1,1'), (0.0, 0.4, 1.0, 1.0))
+        self.assertIsNone(_parse_roi(''))
+        with self.assertRaises(ValueError):
+            _parse_roi('0,1')
+
+
+class PlateTrackerTests(SimpleTestCase):
+
+    def _plate(self, bbox, confidence=0.9):
+        return {'bbox': bbox, 'confidence': confidence}
+
+    def test_vote_per_character(self):
+        from camera_ai.plate_tracker import PlateTrack
+
+        track = PlateTrack(1, self._plate([0, 0, 50, 20]))
+        track.add_read('29A12345', 0.6, 0)
+        track.add_read('29A12845', 0.5, 1)
+        track.add_read('Z9A12345', 0.4, 2)
+
+        self.assertEqual(track.vote(), '29A12345')
+        self.assertEqual(track.best_read()['frame_index'], 0)
+
+    def test_vote_picks_length_by_total_confidence(self):
+        from camera_ai.plate_tracker import PlateTrack
+
+        track = PlateTrack(1, self._plate([0, 0, 50, 20]))
+        track.add_read('29A1234', 0.9, 0)
+        track.add_read('29A12345', 0.6, 1)
+        track.add_read('29A12345', 0.5, 2)
+
+        self.assertEqual(track.vote(), '29A12345')
+
+    def test_empty_reads_ignored(self):
+        from camera_ai.plate_tracker import PlateTrack
+
+        track = PlateTrack(1, self._plate([0, 0, 50, 20]))
+        track.add_read('', 0.9, 0)
+        self.assertIsNone(track.vote())
+        self.assertFalse(track.is_converged())
+
+    def test_converged(self):
+        from camera_ai.plate_tracker import PlateTrack
+
+        track = PlateTrack(1, self._plate([0, 0, 50, 20]))
+        track.add_read('29A12345', 0.6, 0)
+        self.assertFalse(track.is_converged())
+        self.assertTrue(track.is_converged(expected_text='29A12345'))
+
+        track.add_read('29A12345', 0.7, 1)
+        self.assertTrue(track.is_converged())
+
+    def test_tracker_matches_by_iou(self):
+        from camera_ai.plate_tracker import PlateTracker
+
+        tracker = PlateTracker(iou_threshold=0.3, max_tracks=2)
+        tracker.update([self._plate([0, 0, 50, 20]), self._plate([200, 0, 250, 20], 0.8)])
+        matched = tracker.update([self._plate([2, 1, 52, 21])])
+
+        self.assertEqual(len(tracker.tracks), 2)
+        self.assertEqual(matched[0][0].track_id, 1)
+        self.assertEqual(matched[0][0].hits, 2)
+
+    def test_tracker_max_tracks(self):
+        from camera_ai.plate_tracker import PlateTracker
+
+        tracker = PlateTracker(max_tracks=1)
+        matched = tracker.update([self._plate([0, 0, 50, 20], 0.5), self._plate([200, 0, 250, 20], 0.9)])
+
+        self.assertEqual(len(tracker.tracks), 1)
+        self.assertEqual(len(matched), 1)
+        # Greedy theo confidence: box confidence cao được giữ
+        self.assertEqual(tracker.tracks[0].bbox, [200, 0, 250, 20])
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def _single_flight(self, ttl=60):
+        from camera_ai.single_flight import SingleFlight
+
+        return SingleFlight(ttl=ttl, wait_timeout=5)
+
+    def test_cached_within_ttl(self):
+        single_flight = self._single_flight()
+        calls = []
+
+        first = single_flight.do('qr', lambda: calls.append(1) or 'result')
+        second = single_flight.do('qr', lambda: calls.append(1) or 'other')
+
+        self.assertEqual(first, ('result', False))
+        self.assertEqual(second, ('result', True))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(single_flight.status()['cached'], 1)
+
+    def test_expired_after_ttl(self):
+        single_flight = self._single_flight(ttl=0)
+        single_flight.do('qr', lambda: 'first')
+        time.sleep(0.01)
+
+        self.assertEqual(single_flight.do('qr', lambda: 'second'), ('second', False))
+
+    def test_different_keys_not_shared(self):
+        single_flight = self._single_flight()
+        single_flight.do('a', lambda: 1)
+        self.assertEqual(single_flight.do('b', lambda: 2), (2, False))
+
+    def test_concurrent_callers_join(self):
+        single_flight = self._single_flight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'result'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(single_flight.do('qr', slow)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(single_flight.do('qr', slow)))
+        follower.start()
+        # Chờ follower vào hàng đợi trước khi cho leader chạy xong
+        deadline = time.time() + 5
+        while single_flight.stats['joined'] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results, key=lambda r: r[1]), [('result', False), ('result', True)])
+
+    def test_not_cached_when_cache_if_false(self):
+        single_flight = self._single_flight()
+        single_flight.do('qr', lambda: {'success': False}, cache_if=lambda r: r['success'])
+
+        result, shared = single_flight.do('qr', lambda: {'success': True}, cache_if=lambda r: r['success'])
+        self.assertFalse(shared)
+        self.assertTrue(result['success'])
+
+    def test_unshared_result_not_given_to_waiting_callers(self):
+        single_flight = self._single_flight()
+        started = threading.Event()
+        release = threading.Event()
+        outcomes = iter([({'success': False}, 400), ({'success': True}, 200)])
+
+        def scan():
+            started.set()
+            release.wait(5)
+            return next(outcomes)
+
+        results = []
+        ok = lambda outcome: outcome[1] == 200
+        leader = threading.Thread(target=lambda: results.append(single_flight.do('qr', scan, cache_if=ok)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(single_flight.do('qr', scan, cache_if=ok)))
+        follower.start()
+        deadline = time.time() + 5
+        while single_flight.stats['joined'] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        # Follower không nhận 400 của leader mà tự chạy lại
+        self.assertEqual(sorted(results, key=lambda r: r[0][1]),
+                         [(({'success': True}, 200), False), (({'success': False}, 400), False)])
+        self.assertEqual(single_flight.stats['executed'], 2)
+
+    def test_error_not_cached(self):
+        single_flight = self._single_flight()
+
+        def fail():
+            raise RuntimeError('camera')
+
+        with self.assertRaises(RuntimeError):
+            single_flight.do('qr', fail)
+        self.assertEqual(single_flight.do('qr', lambda: 'ok'), ('ok', False))
+
+
+# ============ MJPEG broadcaster (ASGI disconnect) ============
+
+def _stream_view(request):
+    from camera_ai.broadcaster import mjpeg_response
+
+    return mjpeg_response(request, _stream_view.broadcaster)
+
+
+# URLconf cho test ASGI (override_settings(ROOT_URLCONF='camera_ai.tests'))
+urlpatterns = [
+    path('stream/', _stream_view),
+]
+
+
+class BroadcasterDisconnectTests(SimpleTestCase):
+
+    def setUp(self):
+        from unittest import mock
+
+        from camera_ai import broadcaster as broadcaster_module
+
+        patcher = mock.patch.object(broadcaster_module, 'IDLE_TIMEOUT', 0.2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.broadcaster = broadcaster_module.FrameBroadcaster(
+            'test', lambda: np.zeros((16, 16, 3), dtype=np.uint8), max_fps=50
+        )
+        _stream_view.broadcaster = self.broadcaster
+
+    def _wait_producer_stopped(self, timeout=3.0):
+        deadline = time.time() + timeout
+        while self.broadcaster._thread is not None and time.time() < deadline:
+            time.sleep(0.05)
+        return self.broadcaster._thread is None
+
+    def test_cancelled_async_subscriber_unsubscribes(self):
+        import asyncio
+
+        async def watch():
+            stream = self.broadcaster.asubscribe()
+            await stream.__anext__()
+            # Django hủy task đang stream khi nhận http.disconnect
+            pending = asyncio.ensure_future(stream.__anext__())
+            await asyncio.sleep(0.05)
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+
+        asyncio.run(watch())
+
+        self.assertEqual(self.broadcaster.subscribers, 0)
+        self.assertEqual(len(self.broadcaster.async_waiters), 0)
+        self.assertTrue(self._wait_producer_stopped())
+
+    def test_asgi_disconnect_stops_producer(self):
+        import asyncio
+
+        from django.core.handlers.asgi import ASGIHandler
+        from django.test import override_settings
+
+        async def run():
+            first_chunk = asyncio.Event()
+            calls = {'receive': 0}
+
+            async def receive():
+                calls['receive'] += 1
+                if calls['receive'] == 1:
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # Client đóng tab sau khi nhận frame đầu tiên
+                await first_chunk.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.body' and message.get('body'):
+                    first_chunk.set()
+
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': '/stream/', 'raw_path': b'/stream/', 'query_string': b'',
+                'root_path': '', 'headers': [(b'host', b'localhost')],
+                'client': ('127.0.0.1', 1234), 'server': ('localhost', 80),
+            }
+            await asyncio.wait_for(ASGIHandler()(scope, receive, send), timeout=5)
+
+        with override_settings(ROOT_URLCONF='camera_ai.tests', ALLOWED_HOSTS=['localhost']):
+            asyncio.run(run())
+
+        self.assertEqual(self.broadcaster.subscribers, 0)
+        self.assertTrue(self._wait_producer_stopped())
+
+
+class _FrameRefService:
+    """Service giả cho InferenceServer: ocr_single gọi during(frame) rồi trả về giá trị pixel đầu"""
+
+    is_loaded = True
+    model = None
+    conf_threshold = 0.5
+
+    def __init__(self):
+        self.during = lambda frame: None
+
+    def extract_text_from_plates_many(self, items):
+        return [[] for _ in items]
+
+    def extract_text_from_plate(self, frame, bbox, mode=None):
+        self.during(frame)
+        return int(frame[0, 0, 0])
+
+
+class InferenceServerFrameRefTests(SimpleTestCase):
+
+    def setUp(self):
+        from unittest import mock
+
+        from camera_ai import frame_bus
+        from camera_ai.frame_bus import FrameRingWriter
+        from camera_ai.inference_server import InferenceServer
+
+        # Writer và reader cùng process: chỉ writer (unlink) gỡ shm khỏi resource_tracker
+        patcher = mock.patch.object(frame_bus, 'resource_tracker', mock.Mock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.camera_id = f'test_{id(self)}'
+        self.writer = FrameRingWriter(self.camera_id, (8, 8, 3), slots=4)
+        self.addCleanup(self.writer.close)
+        self.service = _FrameRefService()
+        self.server = InferenceServer('', service=self.service)
+
+    def _publish(self, value):
+        return self.writer.publish(np.full((8, 8, 3), value, dtype=np.uint8))
+
+    def _ocr(self, seq):
+        header = {'op': 'ocr_single', 'bbox': [0, 0, 8, 8], 'frame_ref': {'camera_id': self.camera_id, 'seq': seq}}
+        return self.server.handle(header, b'')
+
+    def test_reads_zero_copy_view(self):
+        seq = self._publish(7)
+        seen = {}
+        self.service.during = lambda frame: seen.update(writeable=frame.flags.writeable, base=frame.base is not None)
+
+        response = self._ocr(seq)
+
+        self.assertEqual(response, {'ok': True, 'result': 7})
+        self.assertFalse(seen['writeable'])
+        self.assertTrue(seen['base'])
+
+    def test_ring_wrapped_during_inference(self):
+        seq = self._publish(7)
+        # Writer quay vòng cả ring trong lúc model đang đọc view
+        self.service.during = lambda frame: [self._publish(9) for _ in range(4)]
+
+        response = self._ocr(seq)
+
+        self.assertFalse(response['ok'])
+        self.assertEqual(response['error_code'], 'FRAME_EXPIRED')
+
+    def test_expired_before_inference(self):
+        seq = self._publish(7)
+        for _ in range(4):
+            self._publish(9)
+        self.assertEqual(self._ocr(seq)['error_code'], 'FRAME_EXPIRED')
+
+
+class QRScanCameraJobTests(SimpleTestCase):
+    VEHICLE = {'_id': 'v1', 'license_plate': '29A12345', 'vehicle_type': 'car'}
+
+    def setUp(self):
+        from unittest import mock
+
+        from camera_ai import views
+
+        self.views = views
+        self.camera_calls = []
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        patches = [
+            mock.patch.object(views.camera_service, 'process_vehicle_entry', self._fake_entry),
+            mock.patch.object(views.Presence, 'is_inside', lambda vehicle_id: False),
+            mock.patch.object(views.ParkingHistory, 'checkin', lambda **kwargs: None),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _fake_entry(self, qr_data, entry_type, camera_id, background_save=False):
+        """Chờ chiều vào/ra như process_vehicle_entry thật (trước khi lưu ảnh)"""
+        from concurrent.futures import CancelledError
+
+        call = {'entry_type': None}
+        self.camera_calls.append(call)
+        self.release.wait(timeout=5)
+        try:
+            call['entry_type'] = entry_type.result(timeout=5)
+        except CancelledError:
+            call['entry_type'] = 'cancelled'
+        return {'success': True, 'detected_plate': '29A12345', 'match': True}
+
+    def _scan(self, vehicle):
+        from unittest import mock
+
+        with mock.patch.object(self.views.Vehicle, 'get_by_id', lambda vehicle_id: vehicle):
+            return self.views._run_qr_scan({'qr_data': 'v1|29A12345'}, security_id=None)
+
+    def _wait_camera_call(self):
+        deadline = time.time() + 3
+        while (not self.camera_calls or self.camera_calls[0]['entry_type'] is None) and time.time() < deadline:
+            time.sleep(0.01)
+        return self.camera_calls[0]['entry_type'] if self.camera_calls else None
+
+    def test_invalid_vehicle_cancels_camera_job(self):
+        result, status = self._scan(None)
+        self.release.set()
+
+        self.assertEqual((status, result['error_code']), (400, 'VEHICLE_NOT_FOUND'))
+        # Job đã chạy thì thấy Future bị hủy (không lưu ảnh), chưa chạy thì không chạy nữa
+        self.assertIn(self._wait_camera_call(), ('cancelled', None))
+
+    def test_camera_timeout_trusts_qr(self):
+        from unittest import mock
+
+        with mock.patch.object(self.views, 'SCAN_CAMERA_TIMEOUT', 0.1):
+            result, status = self._scan(dict(self.VEHICLE))
+        self.release.set()
+
+        self.assertEqual(status, 200)
+        self.assertTrue(result['camera_failed'])
+        self.assertEqual(result['detected_plate'], 'UNDETECTED')
+        self.assertEqual(self._wait_camera_call(), 'checkin')
+
+    def test_valid_scan_resolves_direction(self):
+        self.release.set()
+        result, status = self._scan(dict(self.VEHICLE))
+
+        self.assertEqual(status, 200)
+        self.assertEqual(result['detected_plate'], '29A12345')
+        self.assertEqual(self._wait_camera_call(), 'checkin')
+
+
+class QuantizationApprovalTests(SimpleTestCase):
+
+    def setUp(self):
+        import json
+        import tempfile
+        from pathlib import Path
+
+        from camera_ai import quantization
+
+        self.quantization = quantization
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.model_path = Path(tmp.name) / 'plate.pt'
+        self.model_path.write_bytes(b'fp32 weights')
+        self.artifact = quantization.quantized_artifact_path(self.model_path, 'int8_dynamic')
+        self.artifact.write_bytes(b'int8 weights')
+
+        report = {'int8_dynamic': {
+            'approved': True, 'delta': -0.01,
+            'model_sha256': quantization.file_sha256(self.model_path),
+            'artifact_sha256': quantization.file_sha256(self.artifact),
+        }}
+        quantization.report_path(self.model_path).write_text(json.dumps(report), encoding='utf-8')
+
+    def _approved(self):
+        return self.quantization.is_profile_approved(self.model_path, 'int8_dynamic')
+
+    def test_approved_for_evaluated_artifact(self):
+        self.assertEqual(self._approved(), (True, None))
+        self.assertEqual(self.quantization.is_profile_approved(self.model_path, 'fp32'), (True, None))
+
+    def test_rejected_when_artifact_rebuilt(self):
+        self.artifact.write_bytes(b'int8 weights v2')
+        self.assertFalse(self._approved()[0])
+
+    def test_rejected_when_artifact_missing(self):
+        self.artifact.unlink()
+        self.assertFalse(self._approved()[0])
+
+    def test_rejected_when_base_model_changed(self):
+        self.model_path.write_bytes(b'fine-tuned weights')
+        self.assertFalse(self._approved()[0])
+
+    def test_rejected_without_report_entry(self):
+        self.assertFalse(self.quantization.is_profile_approved(self.model_path, 'int8_static')[0])
+
+
+class InferenceSchedulerHoldingTests(SimpleTestCase):
+
+    def test_holding_slot_is_per_scheduler(self):
+        from camera_ai.inference_scheduler import InferenceScheduler
+
+        outer = InferenceScheduler(thread_budget=2, max_concurrent=1)
+        inner = InferenceScheduler(thread_budget=2, max_concurrent=1)
+        seen = {}
+
+        def nested():
+            # Lồng cùng scheduler → chạy luôn; scheduler khác → vẫn qua admission của nó
+            seen['outer_nested'] = outer.run(lambda: outer.running['interactive'])
+            seen['inner'] = inner.run(lambda: inner.running['interactive'], priority='interactive')
+
+        outer.run(nested, priority='interactive')
+
+        self.assertEqual(seen, {'outer_nested': 1, 'inner': 1})
+        self.assertEqual(inner.stats['interactive']['completed'], 1)
+        self.assertEqual(outer.stats['interactive']['completed'], 1)
+
+
+class _RecordingScheduler:
+    """scheduler.run giả: ghi lại lớp ưu tiên của từng batch"""
+
+    def __init__(self):
+        self.priorities = []
+
+    def run(self, fn, *args, priority=None, **kwargs):
+        self.priorities.append(priority)
+        return fn(*args, **kwargs)
+
+
+class RequestBatcherTests(SimpleTestCase):
+
+    def _batcher(self, batch_fn, **kwargs):
+        from camera_ai.inference_server import RequestBatcher
+
+        return RequestBatcher(batch_fn, max_batch_size=4, max_wait_ms=50, **kwargs)
+
+    def test_short_result_list_fails_unresolved_futures(self):
+        batcher = self._batcher(lambda items: items[:1])
+        futures = [batcher.submit(i) for i in range(3)]
+
+        self.assertEqual(futures[0].result(timeout=2), 0)
+        for future in futures[1:]:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=2)
+
+    def test_batch_fn_error_fails_all(self):
+        def fail(items):
+            raise ValueError('model')
+
+        batcher = self._batcher(fail)
+        futures = [batcher.submit(i) for i in range(2)]
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result(timeout=2)
+
+    def test_runs_through_scheduler_with_highest_priority(self):
+        scheduler = _RecordingScheduler()
+        batcher = self._batcher(lambda items: [i * 2 for i in items], scheduler=scheduler)
+
+        futures = [batcher.submit(1, 'live'), batcher.submit(2, 'interactive'), batcher.submit(3, 'batch')]
+
+        self.assertEqual([f.result(timeout=2) for f in futures], [2, 4, 6])
+        self.assertEqual(scheduler.priorities, ['interactive'])
@@ -7,8 +7,10 @@ urlpatterns = [
     path('camera/start/', views.start_camera, name='camera_start'),
     path('camera/stop/', views.stop_camera, name='camera_stop'),
     path('camera/feed/', views.video_feed, name='camera_feed'),
+    path('camera/feed/<str:camera_id>/', views.video_feed, name='camera_feed_by_id'),
     path('camera/api/scan/', views.process_qr_scan, name='camera_api_scan'),
     path('camera/api/test/', views.test_detection, name='camera_api_test'),
+    path('camera/api/motion/', views.api_motion_gate_status, name='camera_api_motion'),
     
     # ============================================
     # SIMULATED CAMERA SYSTEM - NEW ROUTES
@@ -26,8 +28,9 @@ urlpatterns = [
     path('simulation/api/status/', simulation_views.api_camera_status, name='api_camera_status'),
     
     # Streaming
-    path('simulation/stream/camera1/', simulation_views.stream_camera_1, name='stream_camera_1'),
-    path('simulation/stream/camera2/', simulation_views.stream_camera_2, name='stream_camera_2'),
+    path('simulation/stream/camera1/', simulation_views.stream_camera, {'camera_id': 'camera_1'}, name='stream_camera_1'),
+    path('simulation/stream/camera2/', simulation_views.stream_camera, {'camera_id': 'camera_2'}, name='stream_camera_2'),
+    path('simulation/stream/<str:camera_id>/', simulation_views.stream_camera, name='stream_camera'),
     
     # Frame capture for preview
     path('simulation/frame/<str:camera_id>/', simulation_views.capture_camera_frame, name='capture_camera_frame'),
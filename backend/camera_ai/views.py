@@ -3,141 +3,267 @@
 Views cho Camera AI
 """
 from django.shortcuts import render, redirect
+from django.urls import reverse
 from django.contrib import messages
-from django.http import JsonResponse, StreamingHttpResponse
+from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from users.decorators import login_required, security_required
 from camera_ai.service import camera_service
-from parking.models import ParkingHistory
+from camera_ai.broadcaster import broadcasters, mjpeg_response
+from camera_ai.detection_scheduler import DEFAULT_DETECTION_HZ
+from camera_ai.inference_scheduler import InferenceRejected, inference_priority
+from camera_ai.motion_gate import MotionGate
+from camera_ai.registry import camera_registry
+from camera_ai.single_flight import scan_single_flight
+from parking.models import ParkingHistory, Presence
 from vehicles.models import Vehicle, QRCode
 from bson import ObjectId
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import cv2
 import json
+import os
+import time
+
+# Motion gate trước YOLO của từng camera (làn trống → không detect)
+motion_gates = {}
+# Kết quả detect gần nhất của từng camera (vẽ lại giữa 2 lần detect)
+_live_detections = {}
+
+def get_motion_gate(camera_id):
+    """Motion gate của camera (ROI lấy từ registry, mặc định từ env)"""
+    gate = motion_gates.get(camera_id)
+    if gate is None:
+        gate = MotionGate.from_env()
+        roi = camera_registry.get(camera_id).roi
+        if roi:
+            gate.roi = roi
+        gate = motion_gates.setdefault(camera_id, gate)
+    return gate
+
+def _request_camera_id(request):
+    """Camera được chọn qua ?camera=<id> (mặc định camera của camera_service)"""
+    return camera_registry.get(request.GET.get('camera') or camera_service.camera_id).id
 
 @login_required
 @security_required
 def camera_dashboard(request):
     """Dashboard quản lý camera"""
+    try:
+        camera_id = _request_camera_id(request)
+    except ValueError as e:
+        messages.error(request, str(e))
+        camera_id = camera_service.camera_id
+    
     context = {
-        'camera_status': 'active' if camera_service.cap and camera_service.cap.isOpened() else 'inactive'
+        'camera_id': camera_id,
+        'cameras': camera_registry.all(),
+        'camera_status': 'active' if camera_service.is_camera_active(camera_id) else 'inactive',
+        'motion_gate': get_motion_gate(camera_id).status()
     }
     return render(request, 'camera_ai/dashboard.html', context)
 
+def _redirect_dashboard(camera_id):
+    return redirect(f"{reverse('camera_dashboard')}?camera={camera_id}")
+
 @login_required
 @security_required
 def start_camera(request):
     """Khởi động camera"""
+    camera_id = camera_service.camera_id
     try:
-        camera_service.start_camera()
+        camera_id = _request_camera_id(request)
+        camera_service.start_camera(camera_id)
+        get_motion_gate(camera_id).reset()
         messages.success(request, 'Camera đã được khởi động')
     except Exception as e:
         messages.error(request, f'Lỗi khởi động camera: {str(e)}')
     
-    return redirect('camera_dashboard')
+    return _redirect_dashboard(camera_id)
 
 @login_required
 @security_required
 def stop_camera(request):
     """Dừng camera"""
+    camera_id = camera_service.camera_id
     try:
-        camera_service.stop_camera()
+        camera_id = _request_camera_id(request)
+        camera_service.stop_camera(camera_id)
         messages.success(request, 'Camera đã được dừng')
     except Exception as e:
         messages.error(request, f'Lỗi dừng camera: {str(e)}')
     
-    return redirect('camera_dashboard')
+    return _redirect_dashboard(camera_id)
 
-def generate_frames():
-    """Generator để stream video"""
-    while True:
-        try:
-            if not camera_service.cap or not camera_service.cap.isOpened():
-                break
-            
-            frame = camera_service.capture_frame()
-            
-            # Detect plates
-            plates = camera_service.detect_license_plate(frame)
-            
-            # Visualize
-            if plates:
-                frame = camera_service.visualize_detection(frame, plates)
-            
-            # Encode frame
-            ret, buffer = cv2.imencode('.jpg', frame)
-            frame_bytes = buffer.tobytes()
-            
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        except Exception as e:
-            print(f"Error in frame generation: {e}")
-            break
+def _produce_live_frame(camera_id):
+    """Chụp 1 frame, detect và vẽ overlay (None nếu camera đã tắt)"""
+    if not camera_service.is_camera_active(camera_id):
+        return None
+    
+    frame = camera_service.capture_frame(camera_id)
+    
+    # Detect plates: chỉ khi có chuyển động trong ROI, theo nhịp detection_hz của camera
+    state = _live_detections.setdefault(camera_id, {'detected_at': 0.0, 'plates': []})
+    if get_motion_gate(camera_id).check(frame):
+        detection_hz = camera_registry.get(camera_id).detection_hz or DEFAULT_DETECTION_HZ
+        now = time.time()
+        if now - state['detected_at'] >= 1.0 / detection_hz:
+            state['detected_at'] = now
+            try:
+                # Live view: lớp ưu tiên thấp hơn quét cổng, bị bỏ khi CPU bận
+                with inference_priority('live'):
+                    state['plates'] = camera_service.detect_license_plate(frame)
+            except InferenceRejected:
+                pass  # Giữ overlay cũ
+    else:
+        state['plates'] = []
+    
+    # Visualize
+    if state['plates']:
+        frame = camera_service.visualize_detection(frame, state['plates'])
+    
+    return frame
+
+def get_stream_broadcaster(camera_id=None):
+    """Broadcaster dùng chung cho mọi người xem của 1 camera trong registry"""
+    config = camera_registry.get(camera_id or camera_service.camera_id)
+    if config.is_simulated:
+        from camera_ai.simulation_views import get_camera_broadcaster
+        return get_camera_broadcaster(config.id)
+    return broadcasters.get(config.id, lambda: _produce_live_frame(config.id), offline='close')
+
+def generate_frames(camera_id=None):
+    """Generator để stream video (mọi người xem dùng chung 1 broadcaster)"""
+    return get_stream_broadcaster(camera_id).subscribe()
 
 @login_required
 @security_required
-def video_feed(request):
-    """Stream video từ camera"""
-    return StreamingHttpResponse(
-        generate_frames(),
-        content_type='multipart/x-mixed-replace; boundary=frame'
-    )
+async def video_feed(request, camera_id=None):
+    """Stream video từ camera (async view: người xem không giữ worker thread)"""
+    try:
+        broadcaster = get_stream_broadcaster(camera_id)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=404)
+    return mjpeg_response(request, broadcaster)
 
-@csrf_exempt
-def process_qr_scan(request):
-    """
-    API xử lý quét QR code và so sánh với camera
-    
-    Request body:
-    {
-        "qr_data": "VEHICLE_ID|LICENSE_PLATE",
-        "entry_type": "checkin" hoặc "checkout"
+# Pipeline quét QR: chụp + detect chạy song song với kiểm tra QR / MongoDB
+_scan_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('CAMERA_AI_SCAN_WORKERS', '4')),
+    thread_name_prefix='scan'
+)
+# Mục tiêu độ trễ từ lúc nhận QR đến lúc quyết định mở barrier (p95)
+SCAN_LATENCY_TARGET_MS = float(os.getenv('CAMERA_AI_SCAN_TARGET_MS', '500'))
+# Thời gian tối đa chờ job camera (quá hạn → xử lý như camera lỗi, tin QR)
+SCAN_CAMERA_TIMEOUT = float(os.getenv('CAMERA_AI_SCAN_CAMERA_TIMEOUT', '5'))
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+def _timed_vehicle_entry(qr_data, entry_type, camera_id):
+    started = time.perf_counter()
+    try:
+        result = camera_service.process_vehicle_entry(qr_data, entry_type, camera_id, background_save=True)
+    except Exception as e:
+        result = {
+            'success': False,
+            'message': f'Lỗi xử lý: {str(e)}',
+            'detected_plate': None,
+            'match': False
+        }
+    return result, _elapsed_ms(started)
+
+def _start_camera_job(qr_data, entry_type, camera_id):
+    """Chạy process_vehicle_entry trên thread nền, trả về Future (result, camera_ms)"""
+    return _scan_executor.submit(_timed_vehicle_entry, qr_data, entry_type, camera_id)
+
+def _camera_timeout_result(qr_license_plate):
+    """Job camera quá SCAN_CAMERA_TIMEOUT → giống camera không detect được (tin QR)"""
+    return {
+        'success': True,
+        'detected_plate': 'UNDETECTED',
+        'qr_plate': qr_license_plate.strip().upper(),
+        'match': True,  # Trust QR code
+        'confidence': 0.0,
+        'message': f'⚠️ Camera không phản hồi sau {SCAN_CAMERA_TIMEOUT:g}s, nhưng QR hợp lệ',
+        'camera_failed': True,
+        'image_path': None
     }
+
+def _finish_timings(timings, decision_started, scan_started):
+    timings['decision_ms'] = _elapsed_ms(decision_started)
+    timings['total_ms'] = _elapsed_ms(scan_started)
+    if timings['total_ms'] > SCAN_LATENCY_TARGET_MS:
+        print(f"[WARNING] Quét QR chậm: {timings['total_ms']}ms > {SCAN_LATENCY_TARGET_MS:.0f}ms {timings}")
+    return timings
+
+def _run_qr_scan(data, security_id):
     """
-    # Check authentication
-    if 'user_id' not in request.session:
-        return JsonResponse({
-            'success': False,
-            'error': 'Unauthorized - please login'
-        }, status=401)
-    
-    # Check authorization - only security staff
-    user_role = request.session.get('role')
-    if user_role != 'security':
-        return JsonResponse({
-            'success': False,
-            'error': 'Forbidden - security staff only'
-        }, status=403)
-    
-    if request.method != 'POST':
-        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    Xử lý 1 lượt quét QR (đã qua kiểm tra quyền và single-flight)
     
+    Returns:
+        tuple: (payload, http_status)
+    """
+    direction = None
+    camera_future = None
     try:
-        data = json.loads(request.body)
+        scan_started = time.perf_counter()
+        timings = {}
+        
         qr_data = data.get('qr_data')
         entry_type = data.get('entry_type', 'auto')  # Default to 'auto' for smart detection
+        camera_id = data.get('camera_id')
+        gate = data.get('gate')
         
-        if not qr_data:
-            return JsonResponse({'error': 'QR data is required'}, status=400)
+        if camera_id:
+            try:
+                camera_registry.get(camera_id)
+            except ValueError as e:
+                return {'success': False, 'message': str(e)}, 400
         
         # Parse QR data để lấy vehicle_id và license_plate
         try:
             vehicle_id, qr_license_plate = qr_data.split('|')
         except ValueError:
-            return JsonResponse({
+            return {
                 'success': False,
                 'message': 'QR code format sai. Format: VEHICLE_ID|LICENSE_PLATE'
-            }, status=400)
+            }, 400
+        
+        # Chọn camera ngay nếu không phụ thuộc entry_type
+        # (chỉ phải chờ khi entry_type='auto' và cổng có nhiều camera)
+        if not camera_id and gate:
+            try:
+                if entry_type != 'auto':
+                    camera_id = camera_registry.for_gate(gate, entry_type).id
+                else:
+                    gate_cameras = {c.id for c in camera_registry.all() if c.gate == gate}
+                    if not gate_cameras:
+                        raise ValueError(f"Invalid gate: {gate}")
+                    if len(gate_cameras) == 1:
+                        camera_id = gate_cameras.pop()
+            except ValueError as e:
+                return {'success': False, 'message': str(e)}, 400
+        timings['parse_ms'] = _elapsed_ms(scan_started)
+        
+        # ✅ Bắt đầu chụp + detect biển số song song với kiểm tra xe trên MongoDB
+        # Job camera nhận Future chiều vào/ra, chỉ điền sau khi xe hợp lệ (dùng để đặt tên ảnh
+        # checkin_ / checkout_, không chặn chụp / detect). Xe không hợp lệ → Future bị cancel,
+        # job chưa chạy thì bị hủy, đang chạy thì không lưu ảnh.
+        direction = Future()
+        if camera_id or not gate:
+            camera_future = _start_camera_job(qr_data, direction, camera_id)
         
         # Verify QR code - kiểm tra xem vehicle có tồn tại và QR hợp lệ không
-        from vehicles.models import Vehicle
+        stage_started = time.perf_counter()
         vehicle = Vehicle.get_by_id(vehicle_id)
+        timings['vehicle_lookup_ms'] = _elapsed_ms(stage_started)
         
         if not vehicle:
-            return JsonResponse({
+            return {
                 'success': False,
                 'message': f'❌ Xe không tồn tại: {vehicle_id}',
-                'error_code': 'VEHICLE_NOT_FOUND'
-            }, status=400)
+                'error_code': 'VEHICLE_NOT_FOUND',
+                'timings': timings
+            }, 400
         
         # Kiểm tra license plate khớp với vehicle trong DB không
         db_plate = vehicle.get('license_plate', '').strip().upper()
@@ -152,27 +278,38 @@ def process_qr_scan(request):
         # Auto-detect entry type if 'auto'
         if entry_type == 'auto':
             # Check if vehicle currently in parking
-            from parking.models import ParkingHistory
-            existing_history = ParkingHistory.objects.find_one({
-                'vehicle_id': ObjectId(vehicle_id),
-                'status': 'inside'
-            })
+            stage_started = time.perf_counter()
+            is_inside = Presence.is_inside(vehicle_id)
+            timings['entry_type_lookup_ms'] = _elapsed_ms(stage_started)
             # If vehicle in parking → checkout; otherwise → checkin
-            entry_type = 'checkout' if existing_history else 'checkin'
-            print(f"📊 Auto-detected entry_type: {entry_type} (vehicle {'inside' if existing_history else 'outside'})")
+            entry_type = 'checkout' if is_inside else 'checkin'
+            print(f"📊 Auto-detected entry_type: {entry_type} (vehicle {'inside' if is_inside else 'outside'})")
+        direction.set_result(entry_type)
         
-        # ✅ QR code hợp lệ, tiến hành detect biển số
-        result = camera_service.process_vehicle_entry(qr_data, entry_type)
+        # Cổng có nhiều camera → chọn camera theo chiều vào/ra vừa xác định
+        if camera_future is None:
+            camera_id = camera_registry.for_gate(gate, entry_type).id
+            camera_future = _start_camera_job(qr_data, entry_type, camera_id)
+        
+        # Điểm hợp: chờ kết quả camera (tối đa SCAN_CAMERA_TIMEOUT)
+        stage_started = time.perf_counter()
+        try:
+            result, timings['camera_ms'] = camera_future.result(timeout=SCAN_CAMERA_TIMEOUT)
+        except FutureTimeoutError:
+            print(f"[WARNING] Job camera quá {SCAN_CAMERA_TIMEOUT:g}s ({camera_id}), tin QR")
+            result, timings['camera_ms'] = _camera_timeout_result(qr_license_plate), None
+        timings['camera_wait_ms'] = _elapsed_ms(stage_started)
         
         # Xử lý camera detection failures
         if not result['success']:
             # Chỉ reject nếu QR/Vehicle không hợp lệ
             if result.get('error_code') in ['VEHICLE_NOT_FOUND', 'INVALID_QR']:
-                return JsonResponse(result, status=400)
+                result['timings'] = timings
+                return result, 400
             # Nếu camera fail nhưng QR hợp lệ → tiếp tục (trust QR)
         
         # Xử lý check-in / check-out
-        security_id = request.session.get('user_id')
+        stage_started = time.perf_counter()
         
         try:
             if entry_type == 'checkin':
@@ -180,7 +317,8 @@ def process_qr_scan(request):
                     vehicle_id=vehicle_id,
                     detected_plate=result['detected_plate'],
                     security_id=security_id,
-                    qr_license_plate=qr_license_plate
+                    qr_license_plate=qr_license_plate,
+                    vehicle=vehicle
                 )
                 result['message'] = f"✅ Check-in thành công!\nXe: {result['detected_plate']}\nQR: Hợp lệ"
                 
@@ -202,38 +340,151 @@ def process_qr_scan(request):
         except ValueError as e:
             result['success'] = False
             result['message'] = f"❌ Lỗi: {str(e)}"
-            return JsonResponse(result, status=400)
+            result['timings'] = _finish_timings(timings, stage_started, scan_started)
+            return result, 400
         
-        return JsonResponse(result)
+        result['timings'] = _finish_timings(timings, stage_started, scan_started)
+        return result, 200
         
+    except Exception as e:
+        return {'error': f'Server error: {str(e)}'}, 500
+    finally:
+        # Dừng sớm (xe không hợp lệ, lỗi) → hủy job camera (không chờ chiều vào/ra, không lưu ảnh)
+        if direction is not None and direction.cancel() and camera_future is not None:
+            camera_future.cancel()
+
+@csrf_exempt
+def process_qr_scan(request):
+    """
+    API xử lý quét QR code và so sánh với camera
+    
+    Request body:
+    {
+        "qr_data": "VEHICLE_ID|LICENSE_PLATE",
+        "entry_type": "checkin" hoặc "checkout",
+        "camera_id": "<id trong camera registry>" (tùy chọn),
+        "gate": "<cổng>" (tùy chọn, chọn camera của cổng theo entry_type)
+    }
+    """
+    # Check authentication
+    if 'user_id' not in request.session:
+        return JsonResponse({
+            'success': False,
+            'error': 'Unauthorized - please login'
+        }, status=401)
+    
+    # Check authorization - only security staff
+    user_role = request.session.get('role')
+    if user_role != 'security':
+        return JsonResponse({
+            'success': False,
+            'error': 'Forbidden - security staff only'
+        }, status=403)
+    
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
-    except Exception as e:
-        return JsonResponse({'error': f'Server error: {str(e)}'}, status=500)
+    
+    qr_data = data.get('qr_data')
+    if not qr_data:
+        return JsonResponse({'error': 'QR data is required'}, status=400)
+    
+    # Scanner decode liên tục → cùng 1 QR, cùng chiều vào/ra ở cùng cổng chỉ xử lý 1 lần,
+    # request trùng chờ / dùng lại kết quả thành công (không tốn thêm inference).
+    # Kết quả lỗi (4xx / 5xx) không dùng chung: request sau tự chạy lại
+    key = (
+        qr_data,
+        data.get('entry_type', 'auto'),
+        data.get('gate') or data.get('camera_id') or camera_registry.default_camera
+    )
+    security_id = request.session.get('user_id')
+    try:
+        (result, status), shared = scan_single_flight.do(
+            key,
+            lambda: _run_qr_scan(data, security_id),
+            cache_if=lambda outcome: outcome[1] == 200
+        )
+    except TimeoutError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=503)
+    
+    if shared:
+        result = dict(result, deduplicated=True)
+    return JsonResponse(result, status=status)
 
 @login_required
 @security_required
 def test_detection(request):
-    """Test nhận diện biển số"""
+    """
+    Test nhận diện biển số
+    
+    Query params:
+        compare=1: Chạy cả OCR 'full' và 'recognizer' trên mỗi crop để so sánh latency
+        camera: ID camera trong registry (mặc định camera của camera_service)
+    """
     try:
-        frame = camera_service.capture_frame()
-        plates = camera_service.detect_license_plate(frame)
-        
-        results = []
-        for plate in plates:
-            ocr_result = camera_service.extract_text_from_plate(frame, plate['bbox'])
-            if ocr_result:
-                results.append({
-                    'text': ocr_result['text'],
-                    'confidence': ocr_result['confidence'],
-                    'bbox': plate['bbox']
-                })
+        compare = request.GET.get('compare') == '1'
+        camera_id = _request_camera_id(request)
+        frame, captured_at, _ = camera_service.capture_frame_info(camera_id)
+        frame_age_ms = round((time.time() - captured_at) * 1000, 1)
+        # Người bảo vệ đang chờ kết quả trên màn hình → cùng lớp với quét cổng
+        with inference_priority('interactive'):
+            plates = camera_service.detect_license_plate(frame)
+        
+            results = []
+            if not compare:
+                # OCR tất cả crop trong 1 batch
+                batch_results = camera_service.extract_text_from_plates(
+                    frame, [plate['bbox'] for plate in plates]
+                )
+        
+            for index, plate in enumerate(plates):
+                if compare:
+                    comparison = camera_service.compare_ocr_latency(frame, plate['bbox'])
+                    ocr_result = comparison['recognizer'] or comparison['full']
+                else:
+                    ocr_result = batch_results[index]
+            
+                if ocr_result:
+                    item = {
+                        'text': ocr_result['text'],
+                        'confidence': ocr_result['confidence'],
+                        'bbox': plate['bbox'],
+                        'ocr_mode': ocr_result['ocr_mode'],
+                        'latency_ms': ocr_result['latency_ms']
+                    }
+                    if compare:
+                        item['latency_comparison'] = {
+                            'full_ms': comparison['full']['latency_ms'] if comparison['full'] else None,
+                            'recognizer_ms': comparison['recognizer']['latency_ms'] if comparison['recognizer'] else None,
+                            'speedup': comparison['speedup']
+                        }
+                    results.append(item)
         
         return JsonResponse({
             'success': True,
             'plates': results,
-            'total': len(results)
+            'total': len(results),
+            'camera_id': camera_id,
+            'frame_age_ms': frame_age_ms
         })
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+@login_required
+@security_required
+def api_motion_gate_status(request):
+    """API: Trạng thái motion gate của camera (?camera=<id>)"""
+    try:
+        camera_id = _request_camera_id(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=404)
+    return JsonResponse({
+        'success': True,
+        'camera_id': camera_id,
+        'motion_gate': get_motion_gate(camera_id).status()
+    })
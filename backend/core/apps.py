@@ -0,0 +1,18 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        # Cảnh báo truy vấn nóng không có index (không tự tạo, xem manage.py mongo_indexes).
+        # Chỉ process server: manage.py makemigrations / shell không chờ round-trip MongoDB
+        if getattr(settings, 'MONGO_INDEX_CHECK', False):
+            from core.indexes import check_indexes
+
+            try:
+                check_indexes()
+            except Exception as e:
+                print(f"[WARNING] Không kiểm tra được MongoDB indexes: {e}")
@@ -0,0 +1,197 @@
+# core/indexes.py
+"""
+Quản lý index MongoDB theo khai báo
+
+Mỗi module model khai báo:
+- INDEXES: danh sách IndexSpec (index cần có)
+- HOT_QUERIES: danh sách QuerySpec (truy vấn chạy thường xuyên, phải có index hỗ trợ)
+
+    INDEXES = [
+        IndexSpec('vehicles', [('license_plate', ASCENDING)]),
+        IndexSpec('parking_history', [('vehicle_id', ASCENDING)], name='uniq_vehicle_inside',
+                  unique=True, partial={'status': 'inside'}),
+    ]
+    HOT_QUERIES = [
+        QuerySpec('vehicles', ['teacher_id', 'is_active'], 'Vehicle.get_by_teacher'),
+    ]
+
+Dùng qua: python manage.py mongo_indexes [--create] [--replace-changed]
+Khi khởi động (core app), truy vấn nóng không có index hỗ trợ sẽ được cảnh báo.
+"""
+from importlib import import_module
+
+from core.mongodb import db
+
+# Các module khai báo INDEXES / HOT_QUERIES
+INDEX_MODULES = (
+    'users.models',
+    'vehicles.models',
+    'parking.models',
+    'university.models',
+)
+
+
+def _normalize_keys(keys):
+    """[(field, direction)]; index tạo từ shell có thể lưu direction dạng float (1.0)"""
+    return [
+        (field, int(direction) if isinstance(direction, float) else direction)
+        for field, direction in keys
+    ]
+
+
+class IndexSpec:
+    """Khai báo 1 index"""
+
+    def __init__(self, collection, keys, name=None, unique=False, partial=None, sparse=False):
+        self.collection = collection
+        self.keys = _normalize_keys(keys)
+        # Tên mặc định giống pymongo (VD: vehicle_id_1_time_in_-1)
+        self.name = name or '_'.join(f'{field}_{direction}' for field, direction in self.keys)
+        self.unique = unique
+        self.partial = partial
+        self.sparse = sparse
+
+    def options(self):
+        """Tham số cho create_index"""
+        options = {'name': self.name}
+        if self.unique:
+            options['unique'] = True
+        if self.partial:
+            options['partialFilterExpression'] = self.partial
+        if self.sparse:
+            options['sparse'] = True
+        return options
+
+    def matches(self, info):
+        """So với 1 entry của collection.index_information()"""
+        return (
+            _normalize_keys(info.get('key', [])) == self.keys
+            and bool(info.get('unique', False)) == self.unique
+            and info.get('partialFilterExpression') == self.partial
+            and bool(info.get('sparse', False)) == self.sparse
+        )
+
+    def create(self):
+        return db[self.collection].create_index(self.keys, **self.options())
+
+    def __repr__(self):
+        flags = [flag for flag, on in (('unique', self.unique), ('sparse', self.sparse)) if on]
+        if self.partial:
+            flags.append(f'partial={self.partial}')
+        suffix = f" ({', '.join(flags)})" if flags else ''
+        return f'{self.collection}.{self.name}{suffix}'
+
+
+class QuerySpec:
+    """Khai báo 1 truy vấn nóng (các field lọc / sort)"""
+
+    def __init__(self, collection, fields, description):
+        self.collection = collection
+        self.fields = list(fields)
+        self.description = description
+
+    def is_supported_by(self, info):
+        """
+        Index hỗ trợ truy vấn nếu field đầu tiên của index nằm trong truy vấn
+        (partial index: truy vấn phải lọc theo các field của partialFilterExpression)
+        """
+        keys = info.get('key', [])
+        if not keys or keys[0][0] not in self.fields:
+            return False
+        return all(field in self.fields for field in info.get('partialFilterExpression', {}))
+
+
+def collect_specs():
+    """Gom INDEXES và HOT_QUERIES của các module"""
+    indexes, queries = [], []
+    for module_path in INDEX_MODULES:
+        module = import_module(module_path)
+        indexes.extend(getattr(module, 'INDEXES', []))
+        queries.extend(getattr(module, 'HOT_QUERIES', []))
+    return indexes, queries
+
+
+def _index_information(collections):
+    """collection → index_information() (collection chưa tồn tại → {})"""
+    existing = set(db.list_collection_names())
+    return {
+        name: db[name].index_information() if name in existing else {}
+        for name in collections
+    }
+
+
+def diff_indexes(specs=None):
+    """
+    So khai báo với index thực tế
+
+    Returns:
+        dict: {'missing': [IndexSpec], 'changed': [(IndexSpec, info)],
+            'ok': [IndexSpec], 'extra': [(collection, name, info)]}
+    """
+    if specs is None:
+        specs = collect_specs()[0]
+
+    info_by_collection = _index_information({spec.collection for spec in specs})
+    result = {'missing': [], 'changed': [], 'ok': [], 'extra': []}
+    declared = set()
+
+    for spec in specs:
+        declared.add((spec.collection, spec.name))
+        info = info_by_collection[spec.collection].get(spec.name)
+        if info is None:
+            result['missing'].append(spec)
+        elif spec.matches(info):
+            result['ok'].append(spec)
+        else:
+            result['changed'].append((spec, info))
+
+    for collection, indexes in info_by_collection.items():
+        for name, info in indexes.items():
+            if name != '_id_' and (collection, name) not in declared:
+                result['extra'].append((collection, name, info))
+
+    return result
+
+
+def create_indexes(specs=None, replace_changed=False):
+    """
+    Tạo index còn thiếu (create_index idempotent)
+
+    Args:
+        replace_changed: Xóa và tạo lại index cùng tên nhưng khác định nghĩa
+
+    Returns:
+        dict: Kết quả diff trước khi tạo
+    """
+    diff = diff_indexes(specs)
+    for spec in diff['missing']:
+        spec.create()
+    if replace_changed:
+        for spec, _ in diff['changed']:
+            db[spec.collection].drop_index(spec.name)
+            spec.create()
+    return diff
+
+
+def find_unsupported_queries(queries=None):
+    """Truy vấn nóng không có index hỗ trợ"""
+    if queries is None:
+        queries = collect_specs()[1]
+
+    info_by_collection = _index_information({query.collection for query in queries})
+    return [
+        query for query in queries
+        if not any(query.is_supported_by(info) for name, info in info_by_collection[query.collection].items()
+                   if name != '_id_')
+    ]
+
+
+def check_indexes():
+    """Cảnh báo khi khởi động (không tạo index)"""
+    unsupported = find_unsupported_queries()
+    for query in unsupported:
+        print(f"[WARNING] Không có index cho {query.collection} {query.fields} ({query.description}) "
+              f"→ chạy: python manage.py mongo_indexes --create")
+    if not unsupported:
+        print("[OK] MongoDB indexes: mọi truy vấn nóng đều có index")
+    return unsupported
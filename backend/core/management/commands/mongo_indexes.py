@@ -0,0 +1,48 @@
+"""
+So sánh / tạo index MongoDB theo khai báo INDEXES trong các module model
+
+Ví dụ:
+    python manage.py mongo_indexes                      # Chỉ in diff
+    python manage.py mongo_indexes --create             # Tạo index còn thiếu
+    python manage.py mongo_indexes --create --replace-changed
+"""
+from django.core.management.base import BaseCommand
+
+from core.indexes import create_indexes, diff_indexes, find_unsupported_queries
+
+
+class Command(BaseCommand):
+    help = 'Diff declared MongoDB indexes against the database and optionally create missing ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--create', action='store_true', help='Tạo index còn thiếu')
+        parser.add_argument('--replace-changed', action='store_true',
+                            help='Xóa và tạo lại index cùng tên nhưng khác định nghĩa (dùng với --create)')
+
+    def handle(self, *args, **options):
+        if options['create']:
+            diff = create_indexes(replace_changed=options['replace_changed'])
+        else:
+            diff = diff_indexes()
+
+        for spec in diff['ok']:
+            self.stdout.write(f'  ✅ {spec}')
+        for spec in diff['missing']:
+            action = 'created' if options['create'] else 'missing'
+            self.stdout.write(self.style.WARNING(f'  ➕ {spec} [{action}]'))
+        for spec, info in diff['changed']:
+            action = 'replaced' if options['create'] and options['replace_changed'] else 'changed'
+            self.stdout.write(self.style.WARNING(f"  ♻️  {spec} [{action}] hiện tại: {dict(info)}"))
+        for collection, name, info in diff['extra']:
+            self.stdout.write(f"  ❔ {collection}.{name} [không khai báo] key={info.get('key')}")
+
+        unsupported = find_unsupported_queries()
+        for query in unsupported:
+            self.stdout.write(self.style.WARNING(
+                f'  ⚠️  Truy vấn không có index: {query.collection} {query.fields} ({query.description})'
+            ))
+
+        if diff['missing'] and not options['create']:
+            self.stdout.write('Chạy lại với --create để tạo index còn thiếu.')
+        elif not unsupported:
+            self.stdout.write(self.style.SUCCESS('Done. Mọi truy vấn nóng đều có index.'))
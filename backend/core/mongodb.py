@@ -72,4 +72,5 @@ vehicles_collection = db['vehicles']
 qr_codes_collection = db['qr_codes']
 parking_history_collection = db['parking_history']
 parking_config_collection = db['parking_config']
-faculty_stats_collection = db['faculty_stats']
\ No newline at end of file
+faculty_stats_collection = db['faculty_stats']
+presence_collection = db['presence']
\ No newline at end of file
@@ -1,6 +1,29 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ParkingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'parking'
+
+    def ready(self):
+        # Unique partial index chặn check-in trùng (create_index bỏ qua nếu đã có).
+        # Cùng điều kiện với core: chỉ process server (các lệnh khác: manage.py mongo_indexes --create)
+        if not getattr(settings, 'MONGO_INDEX_CHECK', False):
+            return
+
+        from parking.models import INSIDE_INDEX, ParkingHistory, Presence
+
+        try:
+            ParkingHistory.ensure_indexes()
+        except Exception as e:
+            # VD: dữ liệu cũ có xe mang 2 lượt 'inside' → cần xử lý trùng trước
+            print(f"[WARNING] Không tạo được index {INSIDE_INDEX}: {e}")
+
+        # Dựng presence cho các lượt 'inside' chưa có (dữ liệu cũ, process bị kill giữa chừng)
+        try:
+            report = Presence.reconcile()
+            if report['added'] or report['removed'] or report['fixed']:
+                print(f"[OK] Reconciled presence: +{report['added']} -{report['removed']} ~{report['fixed']}")
+        except Exception as e:
+            print(f"[WARNING] Không đồng bộ được presence (chạy: python manage.py reconcile_presence): {e}")
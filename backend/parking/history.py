@@ -0,0 +1,219 @@
+# parking/history.py
+"""
+Truy vấn lịch sử ra vào có lọc + phân trang keyset
+
+Sắp xếp theo (time_in, _id) giảm dần; trang sau bắt đầu ngay sau bản ghi cuối của trang
+trước (cursor), nên thời gian tải trang không phụ thuộc kích thước lịch sử (không skip).
+Chỉ lấy các trường hiển thị; biển số / loại xe / khoa đã lưu sẵn trên parking_history.
+
+    page = HistoryQuery(faculty='Khoa Kiến trúc', status='inside').page(cursor)
+    page['items'], page['next_cursor']
+"""
+import base64
+import re
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from core.mongodb import parking_history_collection, teachers_collection, users_collection
+from core.utils import str_to_objectid
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+HISTORY_STATUSES = ('inside', 'completed')
+
+# Trường hiển thị trên các trang lịch sử
+HISTORY_FIELDS = (
+    'vehicle_id', 'teacher_id', 'faculty', 'vehicle_type', 'license_plate',
+    'time_in', 'time_out', 'status'
+)
+
+# Thứ tự keyset (index: *_time_in_-1__id_-1)
+SORT = [('time_in', -1), ('_id', -1)]
+
+
+def encode_cursor(record):
+    """Cursor của 1 bản ghi: time_in + _id (base64 url-safe)"""
+    raw = f"{record['time_in'].isoformat()}|{record['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        tuple: (time_in, _id)
+
+    Raises:
+        ValueError: Cursor không hợp lệ
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        time_in, record_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(time_in), ObjectId(record_id)
+    except (ValueError, TypeError, InvalidId, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def _parse_date(value, field):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Invalid {field}. Format: YYYY-MM-DD")
+
+
+class HistoryQuery:
+    """
+    Bộ lọc lịch sử ra vào
+
+    Args:
+        date_from, date_to: Ngày (datetime, tính theo time_in UTC), date_to tính cả ngày
+        plate: Biển số hoặc phần đầu biển số
+        faculty: Khoa của chủ xe lúc gửi
+        vehicle_type: 'motorcycle' / 'car' / 'bicycle'
+        status: 'inside' / 'completed'
+        vehicle_ids: Giới hạn trong các xe này (1 truy vấn $in cho mọi xe của giảng viên)
+    """
+
+    def __init__(self, date_from=None, date_to=None, plate=None, faculty=None, vehicle_type=None,
+                 status=None, vehicle_ids=None):
+        if status and status not in HISTORY_STATUSES:
+            raise ValueError(f"Invalid status. Must be one of: {HISTORY_STATUSES}")
+
+        self.date_from = date_from
+        self.date_to = date_to
+        self.plate = plate.upper().replace(' ', '') if plate else None
+        self.faculty = faculty or None
+        self.vehicle_type = vehicle_type or None
+        self.status = status or None
+        self.vehicle_ids = [str_to_objectid(v) for v in vehicle_ids] if vehicle_ids is not None else None
+
+    @classmethod
+    def from_params(cls, params, vehicle_ids=None):
+        """
+        Tạo từ query string (request.GET)
+
+        Params: date_from, date_to (YYYY-MM-DD), plate, faculty, vehicle_type, status
+
+        Raises:
+            ValueError: Tham số không hợp lệ
+        """
+        date_from = params.get('date_from', '').strip()
+        date_to = params.get('date_to', '').strip()
+        return cls(
+            date_from=_parse_date(date_from, 'date_from') if date_from else None,
+            date_to=_parse_date(date_to, 'date_to') if date_to else None,
+            plate=params.get('plate', '').strip(),
+            faculty=params.get('faculty', '').strip(),
+            vehicle_type=params.get('vehicle_type', '').strip(),
+            status=params.get('status', '').strip(),
+            vehicle_ids=vehicle_ids
+        )
+
+    def filter(self):
+        """Điều kiện $match (chưa gồm cursor)"""
+        query = {}
+        if self.vehicle_ids is not None:
+            query['vehicle_id'] = {'$in': self.vehicle_ids}
+        if self.date_from or self.date_to:
+            query['time_in'] = {}
+            if self.date_from:
+                query['time_in']['$gte'] = self.date_from
+            if self.date_to:
+                query['time_in']['$lt'] = self.date_to + timedelta(days=1)
+        if self.plate:
+            # Prefix regex (có ^) vẫn dùng được index license_plate
+            query['license_plate'] = {'$regex': f'^{re.escape(self.plate)}'}
+        if self.faculty:
+            query['faculty'] = self.faculty
+        if self.vehicle_type:
+            query['vehicle_type'] = self.vehicle_type
+        if self.status:
+            query['status'] = self.status
+        return query
+
+    def page(self, cursor=None, page_size=DEFAULT_PAGE_SIZE, fields=HISTORY_FIELDS):
+        """
+        1 trang lịch sử
+
+        Args:
+            cursor: next_cursor của trang trước (None → trang đầu)
+            page_size: Số bản ghi / trang (tối đa MAX_PAGE_SIZE)
+            fields: Trường cần lấy
+
+        Returns:
+            dict: {'items', 'next_cursor' (None nếu hết), 'has_more'}
+
+        Raises:
+            ValueError: Cursor không hợp lệ
+        """
+        page_size = max(1, min(int(page_size or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+        query = self.filter()
+        if cursor:
+            time_in, record_id = decode_cursor(cursor)
+            after = {'$or': [
+                {'time_in': {'$lt': time_in}},
+                {'time_in': time_in, '_id': {'$lt': record_id}}
+            ]}
+            query = {'$and': [query, after]} if query else after
+
+        projection = {field: 1 for field in fields}
+        # Lấy dư 1 bản ghi để biết còn trang sau không
+        items = list(parking_history_collection.find(query, projection).sort(SORT).limit(page_size + 1))
+
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        return {
+            'items': items,
+            'next_cursor': encode_cursor(items[-1]) if has_more else None,
+            'has_more': has_more
+        }
+
+
+def attach_owner_names(records):
+    """
+    Gắn tên giảng viên cho 1 trang lịch sử (2 truy vấn $in, giới hạn bởi kích thước trang)
+
+    record['owner_name'], record['employee_id']
+    """
+    teacher_ids = list({r['teacher_id'] for r in records if r.get('teacher_id')})
+    teachers = {
+        t['_id']: t for t in teachers_collection.find({'_id': {'$in': teacher_ids}}, {'user_id': 1, 'employee_id': 1})
+    }
+    user_ids = list({t['user_id'] for t in teachers.values() if t.get('user_id')})
+    users = {u['_id']: u for u in users_collection.find({'_id': {'$in': user_ids}}, {'full_name': 1})}
+
+    for record in records:
+        teacher = teachers.get(record.get('teacher_id')) or {}
+        user = users.get(teacher.get('user_id')) or {}
+        record['owner_name'] = user.get('full_name')
+        record['employee_id'] = teacher.get('employee_id')
+    return records
+
+
+def next_page_query(params, next_cursor):
+    """Query string trang sau (giữ nguyên bộ lọc hiện tại), None nếu hết"""
+    if not next_cursor:
+        return None
+    query = params.copy()
+    query['cursor'] = next_cursor
+    return query.urlencode()
+
+
+def first_page_query(params):
+    """Query string trang đầu (giữ bộ lọc, bỏ cursor)"""
+    query = params.copy()
+    query.pop('cursor', None)
+    return query.urlencode()
+
+
+def serialize_record(record):
+    """Bản ghi lịch sử → dict JSON (ObjectId → str, datetime → ISO)"""
+    return {
+        key: str(value) if key in ('_id', 'vehicle_id', 'teacher_id') and value is not None
+        else value.isoformat() if isinstance(value, datetime)
+        else value
+        for key, value in record.items()
+    }
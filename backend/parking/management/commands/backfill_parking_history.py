@@ -0,0 +1,77 @@
+"""
+Backfill teacher_id / faculty / vehicle_type / license_plate cho parking_history cũ
+
+Lượt gửi mới được ghi sẵn các trường này lúc check-in; lệnh này bổ sung cho dữ liệu cũ
+(lấy theo chủ xe / khoa hiện tại). Chạy lại nhiều lần không sao (chỉ cập nhật bản ghi còn thiếu).
+
+Ví dụ:
+    python manage.py backfill_parking_history
+    python manage.py backfill_parking_history --batch-size 200
+"""
+from django.core.management.base import BaseCommand
+from pymongo import UpdateMany
+
+from core.mongodb import parking_history_collection, teachers_collection, vehicles_collection
+
+DENORMALIZED_FIELDS = ('teacher_id', 'faculty', 'vehicle_type', 'license_plate')
+
+
+class Command(BaseCommand):
+    help = 'Stamp teacher_id, faculty, vehicle_type and license_plate onto existing parking_history records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Số xe mỗi lần bulk_write')
+
+    def handle(self, *args, **options):
+        # Thiếu bất kỳ trường nào → cần backfill
+        missing = {'$or': [{field: {'$exists': False}} for field in DENORMALIZED_FIELDS]}
+        pending = parking_history_collection.count_documents(missing)
+        if not pending:
+            self.stdout.write(self.style.SUCCESS('Done. Không có bản ghi nào cần backfill.'))
+            return
+        self.stdout.write(f'🔄 {pending} bản ghi cần backfill...')
+
+        faculties = {t['_id']: t.get('faculty') for t in teachers_collection.find({}, {'faculty': 1})}
+        vehicle_ids = parking_history_collection.distinct('vehicle_id', missing)
+
+        updated = 0
+        batch = []
+
+        def flush():
+            nonlocal updated
+            if batch:
+                updated += parking_history_collection.bulk_write(batch, ordered=False).modified_count
+                batch.clear()
+
+        for vehicle in vehicles_collection.find(
+            {'_id': {'$in': vehicle_ids}},
+            {'teacher_id': 1, 'vehicle_type': 1, 'license_plate': 1}
+        ):
+            teacher_id = vehicle.get('teacher_id')
+            values = {
+                'teacher_id': teacher_id,
+                'faculty': faculties.get(teacher_id),
+                'vehicle_type': vehicle.get('vehicle_type'),
+                'license_plate': vehicle.get('license_plate')
+            }
+            # Giữ giá trị đã có (VD: vehicle_type lưu lúc check-in), chỉ điền trường còn thiếu
+            for field, value in values.items():
+                batch.append(UpdateMany(
+                    {'vehicle_id': vehicle['_id'], field: {'$exists': False}},
+                    {'$set': {field: value}}
+                ))
+            if len(batch) >= options['batch_size'] * len(DENORMALIZED_FIELDS):
+                flush()
+        flush()
+
+        # Xe đã bị xóa khỏi vehicles → ghi None để không bị coi là chưa backfill
+        orphans = parking_history_collection.count_documents(missing)
+        for field in DENORMALIZED_FIELDS:
+            parking_history_collection.update_many({field: {'$exists': False}}, {'$set': {field: None}})
+
+        self.stdout.write(self.style.SUCCESS(f'Done. Đã cập nhật {updated} lượt ghi.'))
+        if orphans:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️  {orphans} bản ghi thuộc xe không còn trong vehicles → faculty = None.'
+            ))
+        self.stdout.write('Chạy tiếp: python manage.py rebuild_parking_rollups')
@@ -0,0 +1,34 @@
+"""
+Đồng bộ collection presence (xe đang trong bãi) với parking_history
+
+Sửa presence thiếu / thừa / trỏ sai lượt gửi và xóa bộ đếm current_occupied cũ trong parking_config
+(số xe đang đỗ nay đếm trực tiếp từ presence).
+
+Ví dụ:
+    python manage.py reconcile_presence --dry-run
+    python manage.py reconcile_presence
+"""
+from django.core.management.base import BaseCommand
+
+from parking.models import Presence
+
+
+class Command(BaseCommand):
+    help = "Rebuild presence documents from open parking_history stays"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ báo cáo, không ghi')
+
+    def handle(self, *args, **options):
+        report = Presence.reconcile(dry_run=options['dry_run'])
+
+        self.stdout.write(f"  ➕ Thiếu presence: {report['added']}")
+        self.stdout.write(f"  ➖ Presence thừa: {report['removed']}")
+        self.stdout.write(f"  ♻️  Presence sai lượt gửi: {report['fixed']}")
+        for vehicle_type, count in sorted(report['occupied'].items(), key=lambda item: str(item[0])):
+            self.stdout.write(f"  🅿️  {vehicle_type}: {count} xe đang trong bãi")
+
+        if options['dry_run']:
+            self.stdout.write('Dry run: chưa ghi gì. Chạy lại không có --dry-run để sửa.')
+        else:
+            self.stdout.write(self.style.SUCCESS('Done. presence đã khớp parking_history.'))
@@ -1,20 +1,66 @@
 from django.db import models
 
 # Create your models here.
-from core.mongodb import parking_history_collection, parking_config_collection
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from core.mongodb import parking_history_collection, parking_config_collection, presence_collection
 from core.utils import str_to_objectid, get_current_timestamp
+from core.indexes import IndexSpec, QuerySpec
+from university.models import ParkingRollup
 from datetime import datetime
+from collections import defaultdict
+
+# Mỗi xe chỉ có tối đa 1 lượt gửi đang mở → chặn check-in trùng ở mức database
+INSIDE_INDEX = IndexSpec(
+    'parking_history', [('vehicle_id', ASCENDING)],
+    name='uniq_vehicle_inside', unique=True, partial={'status': 'inside'}
+)
+
+INDEXES = [
+    INSIDE_INDEX,
+    # Keyset (time_in, _id): parking.history.HistoryQuery
+    IndexSpec('parking_history', [('vehicle_id', ASCENDING), ('time_in', DESCENDING), ('_id', DESCENDING)]),
+    IndexSpec('parking_history', [('time_in', DESCENDING), ('_id', DESCENDING)]),
+    IndexSpec('parking_history', [('faculty', ASCENDING), ('time_in', DESCENDING), ('_id', DESCENDING)]),
+    IndexSpec('parking_history', [('vehicle_type', ASCENDING), ('time_in', DESCENDING), ('_id', DESCENDING)]),
+    IndexSpec('parking_history', [('license_plate', ASCENDING), ('time_in', DESCENDING), ('_id', DESCENDING)]),
+    IndexSpec('parking_history', [('status', ASCENDING), ('time_in', DESCENDING)]),
+    IndexSpec('parking_history', [('faculty', ASCENDING), ('teacher_id', ASCENDING)]),
+    IndexSpec('parking_history', [('teacher_id', ASCENDING), ('time_in', DESCENDING)]),
+    IndexSpec('parking_config', [('vehicle_type', ASCENDING)], unique=True),
+    IndexSpec('presence', [('time_in', DESCENDING)]),
+]
+
+HOT_QUERIES = [
+    QuerySpec('parking_history', ['vehicle_id', 'status'], 'Presence.reconcile (unique lượt inside)'),
+    QuerySpec('parking_history', ['vehicle_id', 'time_in'], 'ParkingHistory.get_by_vehicle, thống kê theo khoa'),
+    QuerySpec('parking_history', ['time_in'], 'ParkingHistory.get_today, thống kê theo ngày'),
+    QuerySpec('parking_history', ['status'], 'Presence.reconcile'),
+    QuerySpec('parking_history', ['faculty', 'teacher_id'], 'FacultyStats.get_top_users'),
+    QuerySpec('parking_history', ['teacher_id', 'time_in'], 'Lịch sử theo giảng viên'),
+    QuerySpec('parking_history', ['time_in', '_id'], 'HistoryQuery.page'),
+    QuerySpec('parking_history', ['vehicle_id', 'time_in', '_id'], 'HistoryQuery.page (xe của giảng viên)'),
+    QuerySpec('parking_history', ['faculty', 'time_in', '_id'], 'HistoryQuery.page (lọc khoa)'),
+    QuerySpec('parking_history', ['license_plate', 'time_in', '_id'], 'HistoryQuery.page (lọc biển số)'),
+    QuerySpec('parking_config', ['vehicle_type'], 'ParkingConfig.get_by_type / update_capacity'),
+]
 
 class ParkingConfig:
-    """Cấu hình bãi xe"""
+    """
+    Cấu hình bãi xe (sức chứa theo loại xe)
+    
+    Số xe đang đỗ không lưu trong parking_config: get_all / get_by_type gắn
+    current_occupied đếm từ collection presence.
+    """
     
     @staticmethod
     def init_default():
         """Khởi tạo cấu hình mặc định"""
         configs = [
-            {'vehicle_type': 'motorcycle', 'total_capacity': 150, 'current_occupied': 0},
-            {'vehicle_type': 'car', 'total_capacity': 50, 'current_occupied': 0},
-            {'vehicle_type': 'bicycle', 'total_capacity': 100, 'current_occupied': 0}
+            {'vehicle_type': 'motorcycle', 'total_capacity': 150},
+            {'vehicle_type': 'car', 'total_capacity': 50},
+            {'vehicle_type': 'bicycle', 'total_capacity': 100}
         ]
         
         for config in configs:
@@ -24,21 +70,20 @@ class ParkingConfig:
     
     @staticmethod
     def get_by_type(vehicle_type):
-        """Lấy cấu hình theo loại xe"""
-        return parking_config_collection.find_one({'vehicle_type': vehicle_type})
+        """Lấy cấu hình theo loại xe (current_occupied đếm từ presence)"""
+        config = parking_config_collection.find_one({'vehicle_type': vehicle_type})
+        if config:
+            config['current_occupied'] = presence_collection.count_documents({'vehicle_type': vehicle_type})
+        return config
     
     @staticmethod
     def get_all():
-        """Lấy tất cả cấu hình"""
-        return list(parking_config_collection.find())
-    
-    @staticmethod
-    def update_occupied(vehicle_type, increment=1):
-        """Cập nhật số xe đang đỗ"""
-        return parking_config_collection.update_one(
-            {'vehicle_type': vehicle_type},
-            {'$inc': {'current_occupied': increment}}
-        )
+        """Lấy tất cả cấu hình (current_occupied đếm từ presence)"""
+        occupied = Presence.count_by_type()
+        configs = list(parking_config_collection.find())
+        for config in configs:
+            config['current_occupied'] = occupied.get(config['vehicle_type'], 0)
+        return configs
     
     @staticmethod
     def update_capacity(vehicle_type, new_capacity):
@@ -53,25 +98,39 @@ class ParkingHistory:
     """Lịch sử ra vào"""
     
     @staticmethod
-    def checkin(vehicle_id, detected_plate, security_id=None, qr_license_plate=None):
-        """Check-in xe"""
-        # Check if vehicle already inside
-        existing = parking_history_collection.find_one({
-            'vehicle_id': str_to_objectid(vehicle_id),
-            'status': 'inside'
-        })
+    def ensure_indexes():
+        """Tạo unique partial index (vehicle_id) với status='inside'"""
+        INSIDE_INDEX.create()
+    
+    @staticmethod
+    def checkin(vehicle_id, detected_plate, security_id=None, qr_license_plate=None, vehicle=None):
+        """
+        Check-in xe (1 insert lịch sử + 1 upsert presence + 1 bulk_write thống kê)
         
-        if existing:
-            raise ValueError("Xe đang trong bãi")
+        Unique partial index lượt 'inside' trên parking_history là chốt chặn duy nhất:
+        2 cổng check-in cùng lúc thì chỉ 1 insert thành công. presence chỉ là bản sao
+        ghi sau lượt gửi (process chết giữa 2 lần ghi → reconcile / repair dựng lại),
+        không bao giờ còn presence mồ côi không có lượt 'inside'.
+        Bản ghi lưu kèm chủ xe / khoa / loại xe / biển số tại thời điểm vào để thống kê
+        không cần $lookup.
         
-        from vehicles.models import Vehicle
-        vehicle = Vehicle.get_by_id(vehicle_id)
+        Args:
+            vehicle: Document xe đã tra trước đó (None → tra lại theo vehicle_id)
+        """
+        if vehicle is None:
+            from vehicles.models import Vehicle
+            vehicle = Vehicle.get_by_id(vehicle_id)
         if not vehicle:
             raise ValueError("Vehicle not found")
         
-        # Create history record
+        vehicle_oid = str_to_objectid(vehicle_id)
         history_data = {
-            'vehicle_id': str_to_objectid(vehicle_id),
+            '_id': ObjectId(),
+            'vehicle_id': vehicle_oid,
+            'teacher_id': vehicle.get('teacher_id'),
+            'faculty': ParkingRollup.faculty_of(vehicle_id, vehicle),
+            'vehicle_type': vehicle['vehicle_type'],
+            'license_plate': vehicle['license_plate'],
             'security_id': str_to_objectid(security_id) if security_id else None,
             'time_in': get_current_timestamp(),
             'time_out': None,
@@ -81,82 +140,84 @@ class ParkingHistory:
             'notes': None
         }
         
-        result = parking_history_collection.insert_one(history_data)
+        try:
+            parking_history_collection.insert_one(history_data)
+        except DuplicateKeyError:
+            # Xe đã có lượt 'inside' → presence trỏ lại đúng lượt đang mở (dữ liệu cũ / lệch),
+            # lần quét sau sẽ là check-out
+            Presence.repair(vehicle_oid)
+            raise ValueError("Xe đang trong bãi")
+        
+        presence_collection.replace_one({'_id': vehicle_oid}, Presence._from_history(history_data), upsert=True)
         
-        # Update parking config
-        ParkingConfig.update_occupied(vehicle['vehicle_type'], 1)
+        ParkingRollup.record('checkin', history_data['faculty'], history_data['vehicle_type'], history_data['time_in'])
         
-        return result.inserted_id
+        return history_data['_id']
     
     @staticmethod
     def checkout(vehicle_id, security_id=None, notes=None):
-        """Check-out xe"""
-        # Find current parking record
-        history = parking_history_collection.find_one({
-            'vehicle_id': str_to_objectid(vehicle_id),
-            'status': 'inside'
-        })
+        """
+        Check-out xe (1 find_one_and_update lịch sử + 1 delete presence + 1 bulk_write thống kê)
         
-        if not history:
-            raise ValueError("Xe không trong bãi")
-        
-        from vehicles.models import Vehicle
-        vehicle = Vehicle.get_by_id(vehicle_id)
-        
-        # Update history
+        Lượt 'inside' trên parking_history là nguồn chính: chỉ request đóng được lượt đó mới
+        check-out, checkout trùng → ValueError. Xe có lượt 'inside' mà chưa có presence
+        (dữ liệu trước khi có collection presence) vẫn check-out được.
+        """
+        vehicle_oid = str_to_objectid(vehicle_id)
         update_data = {
             'time_out': get_current_timestamp(),
             'status': 'completed'
         }
-        
         if notes:
             update_data['notes'] = notes
         
-        parking_history_collection.update_one(
-            {'_id': history['_id']},
-            {'$set': update_data}
+        history = parking_history_collection.find_one_and_update(
+            {'vehicle_id': vehicle_oid, 'status': 'inside'},
+            {'$set': update_data},
+            projection={'faculty': 1, 'vehicle_type': 1}
         )
         
-        # Update parking config
-        ParkingConfig.update_occupied(vehicle['vehicle_type'], -1)
+        if not history:
+            # Presence còn sót (lượt gửi đã đóng) → xóa để lần quét sau là check-in
+            Presence.repair(vehicle_oid)
+            raise ValueError("Xe không trong bãi")
+        
+        presence_collection.delete_one({'_id': vehicle_oid, 'history_id': history['_id']})
+        
+        ParkingRollup.record('checkout', history.get('faculty'), history.get('vehicle_type'), update_data['time_out'])
         
         return history['_id']
     
     @staticmethod
     def get_current_parking():
-        """Lấy xe đang trong bãi"""
-        pipeline = [
-            {'$match': {'status': 'inside'}},
-            {
-                '$lookup': {
-                    'from': 'vehicles',
-                    'localField': 'vehicle_id',
-                    'foreignField': '_id',
-                    'as': 'vehicle'
-                }
-            },
-            {'$unwind': '$vehicle'},
-            {
-                '$lookup': {
-                    'from': 'teachers',
-                    'localField': 'vehicle.teacher_id',
-                    'foreignField': '_id',
-                    'as': 'teacher'
-                }
-            },
-            {'$unwind': '$teacher'},
-            {
-                '$lookup': {
-                    'from': 'users',
-                    'localField': 'teacher.user_id',
-                    'foreignField': '_id',
-                    'as': 'user'
-                }
-            },
-            {'$unwind': '$user'}
-        ]
+        """
+        Lấy xe đang trong bãi
+        
+        Đọc collection presence (biển số / loại xe / khoa lưu sẵn); thông tin giảng viên và
+        user chỉ tra 1 lần cho các giảng viên đang có xe trong bãi.
+        """
+        from core.mongodb import teachers_collection, users_collection
+        
+        records = Presence.get_all()
+        
+        teacher_ids = {r['teacher_id'] for r in records if r.get('teacher_id')}
+        teachers = {t['_id']: t for t in teachers_collection.find({'_id': {'$in': list(teacher_ids)}})}
+        user_ids = {t['user_id'] for t in teachers.values() if t.get('user_id')}
+        users = {u['_id']: u for u in users_collection.find({'_id': {'$in': list(user_ids)}}, {'password_hash': 0})}
         
-        return list(parking_history_collection.aggregate(pipeline))
+        for record in records:
+            record['vehicle_id'] = record['_id']
+            record['vehicle'] = {
+                '_id': record['_id'],
+                'license_plate': record.get('license_plate'),
+                'vehicle_type': record.get('vehicle_type'),
+                'teacher_id': record.get('teacher_id')
+            }
+            teacher = teachers.get(record.get('teacher_id'))
+            record['teacher'] = teacher
+            record['user'] = users.get(teacher.get('user_id')) if teacher else None
+        
+        return records
     
     @staticmethod
     def get_by_vehicle(vehicle_id, limit=10):
@@ -177,10 +238,126 @@ class ParkingHistory:
     @staticmethod
     def get_statistics():
         """Thống kê tổng quan"""
-        total_today = len(ParkingHistory.get_today())
-        current_inside = parking_history_collection.count_documents({'status': 'inside'})
+        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        total_today = parking_history_collection.count_documents({'time_in': {'$gte': today_start}})
+        current_inside = Presence.count()
         
         return {
             'total_today': total_today,
             'current_inside': current_inside
-        }
\ No newline at end of file
+        }
+
+
+class Presence:
+    """
+    Xe đang trong bãi: collection presence, 1 document / xe (_id = vehicle_id)
+    
+    Check-in insert, check-out xóa. Trạng thái trong/ngoài bãi và số xe đang đỗ chỉ đọc
+    collection nhỏ này thay vì tìm status='inside' trên parking_history.
+    
+    parking_history vẫn là nguồn chính: presence được reconcile khi server khởi động
+    (parking app) và sửa lại từng xe (repair) khi check-in / check-out phát hiện lệch.
+    """
+    
+    OWNER_FIELDS = ('teacher_id', 'faculty', 'vehicle_type', 'license_plate')
+    
+    @staticmethod
+    def get(vehicle_id):
+        """Document presence của xe, None nếu xe không trong bãi"""
+        return presence_collection.find_one({'_id': str_to_objectid(vehicle_id)})
+    
+    @staticmethod
+    def is_inside(vehicle_id):
+        return presence_collection.count_documents({'_id': str_to_objectid(vehicle_id)}, limit=1) > 0
+    
+    @staticmethod
+    def get_all():
+        """Tất cả xe đang trong bãi (mới vào trước)"""
+        return list(presence_collection.find().sort('time_in', -1))
+    
+    @staticmethod
+    def count():
+        """Tổng số xe đang trong bãi (metadata, không quét collection)"""
+        return presence_collection.estimated_document_count()
+    
+    @staticmethod
+    def count_by_type():
+        """{loại xe: số xe đang trong bãi}"""
+        pipeline = [{'$group': {'_id': '$vehicle_type', 'count': {'$sum': 1}}}]
+        return {item['_id']: item['count'] for item in presence_collection.aggregate(pipeline)}
+    
+    @staticmethod
+    def _from_history(history):
+        document = {field: history.get(field) for field in Presence.OWNER_FIELDS}
+        document.update({
+            '_id': history['vehicle_id'],
+            'history_id': history['_id'],
+            'time_in': history.get('time_in')
+        })
+        return document
+    
+    @staticmethod
+    def repair(vehicle_id):
+        """
+        Đồng bộ presence của 1 xe với lượt 'inside' trên parking_history (reconcile cho 1 xe)
+        
+        Returns:
+            dict: Document presence sau khi sửa, None nếu xe không trong bãi
+        """
+        vehicle_oid = str_to_objectid(vehicle_id)
+        projection = {'vehicle_id': 1, 'time_in': 1, **{field: 1 for field in Presence.OWNER_FIELDS}}
+        history = parking_history_collection.find_one({'vehicle_id': vehicle_oid, 'status': 'inside'}, projection)
+        
+        if history is None:
+            presence_collection.delete_one({'_id': vehicle_oid})
+            return None
+        
+        document = Presence._from_history(history)
+        presence_collection.replace_one({'_id': vehicle_oid}, document, upsert=True)
+        return document
+    
+    @staticmethod
+    def reconcile(dry_run=False):
+        """
+        Đồng bộ presence với các lượt 'inside' trên parking_history
+        
+        - Lượt 'inside' chưa có presence → thêm
+        - Presence không còn lượt 'inside' tương ứng → xóa
+        - Presence trỏ sai lượt gửi → ghi lại
+        - Xóa bộ đếm current_occupied cũ còn lưu trong parking_config (nay đếm từ presence)
+        
+        Returns:
+            dict: {'added', 'removed', 'fixed', 'occupied'}
+        """
+        projection = {'vehicle_id': 1, 'time_in': 1, **{field: 1 for field in Presence.OWNER_FIELDS}}
+        open_stays = {
+            history['vehicle_id']: history
+            for history in parking_history_collection.find({'status': 'inside'}, projection)
+        }
+        presences = {doc['_id']: doc for doc in presence_collection.find({}, {'history_id': 1})}
+        
+        added = [vid for vid in open_stays if vid not in presences]
+        removed = [vid for vid in presences if vid not in open_stays]
+        fixed = [vid for vid in open_stays
+                 if vid in presences and presences[vid].get('history_id') != open_stays[vid]['_id']]
+        
+        occupied = defaultdict(int)
+        for history in open_stays.values():
+            occupied[history.get('vehicle_type')] += 1
+        
+        if not dry_run:
+            if removed:
+                presence_collection.delete_many({'_id': {'$in': removed}})
+            for vid in added + fixed:
+                presence_collection.replace_one({'_id': vid}, Presence._from_history(open_stays[vid]), upsert=True)
+            parking_config_collection.update_many(
+                {'current_occupied': {'$exists': True}},
+                {'$unset': {'current_occupied': ''}}
+            )
+        
+        return {
+            'added': len(added),
+            'removed': len(removed),
+            'fixed': len(fixed),
+            'occupied': dict(occupied)
+        }
@@ -1,3 +1,290 @@
-from django.test import TestCase
+from datetime import datetime
+from unittest import mock
 
-# Create your tests here.
+from bson import ObjectId
+from django.http import QueryDict
+from django.test import SimpleTestCase
+
+from parking import history
+from parking.history import HistoryQuery, decode_cursor, encode_cursor
+
+
+class CursorTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        record = {'_id': ObjectId(), 'time_in': datetime(2024, 5, 1, 7, 30, 15, 123000)}
+        self.assertEqual(decode_cursor(encode_cursor(record)), (record['time_in'], record['_id']))
+
+    def test_cursor_is_url_safe(self):
+        cursor = encode_cursor({'_id': ObjectId(), 'time_in': datetime(2024, 5, 1)})
+        self.assertRegex(cursor, r'^[A-Za-z0-9_-]+$')
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-a-cursor', '', 'MjAyNC0wNS0wMQ', encode_cursor({'_id': 'x', 'time_in': datetime(2024, 5, 1)})):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+class HistoryQueryFilterTests(SimpleTestCase):
+
+    def test_from_params(self):
+        query = HistoryQuery.from_params(QueryDict(
+            'date_from=2024-05-01&date_to=2024-05-02&plate=29a 12&faculty=Khoa+Kiến+trúc'
+            '&vehicle_type=car&status=inside'
+        ))
+        self.assertEqual(query.filter(), {
+            'time_in': {'$gte': datetime(2024, 5, 1), '$lt': datetime(2024, 5, 3)},
+            'license_plate': {'$regex': '^29A12'},
+            'faculty': 'Khoa Kiến trúc',
+            'vehicle_type': 'car',
+            'status': 'inside'
+        })
+
+    def test_empty_params(self):
+        self.assertEqual(HistoryQuery.from_params(QueryDict('')).filter(), {})
+
+    def test_plate_is_escaped(self):
+        query = HistoryQuery(plate='29A.1*')
+        self.assertEqual(query.filter()['license_plate'], {'$regex': r'^29A\.1\*'})
+
+    def test_vehicle_ids_single_in_query(self):
+        ids = [ObjectId(), ObjectId()]
+        query = HistoryQuery(vehicle_ids=[str(ids[0]), ids[1]])
+        self.assertEqual(query.filter(), {'vehicle_id': {'$in': ids}})
+
+    def test_invalid_params(self):
+        with self.assertRaises(ValueError):
+            HistoryQuery.from_params(QueryDict('date_from=01/05/2024'))
+        with self.assertRaises(ValueError):
+            HistoryQuery(status='parked')
+
+
+class _FakeCursor:
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, keys):
+        self.sort_keys = keys
+        return self
+
+    def limit(self, n):
+        self.limit_n = n
+        return self.documents[:n]
+
+
+class _FakeCollection:
+    """find() ghi lại truy vấn, trả về documents đã sắp xếp sẵn"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.calls = []
+
+    def find(self, query, projection):
+        self.calls.append({'query': query, 'projection': projection})
+        self.cursor = _FakeCursor(self.documents)
+        return self.cursor
+
+
+class HistoryQueryPageTests(SimpleTestCase):
+
+    def setUp(self):
+        base = datetime(2024, 5, 1, 8, 0)
+        self.documents = [
+            {'_id': ObjectId(), 'time_in': base.replace(minute=59 - i), 'status': 'completed'}
+            for i in range(5)
+        ]
+        self.collection = _FakeCollection(self.documents)
+        patcher = mock.patch.object(history, 'parking_history_collection', self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_page(self):
+        page = HistoryQuery().page(page_size=2)
+
+        self.assertEqual(page['items'], self.documents[:2])
+        self.assertTrue(page['has_more'])
+        self.assertEqual(decode_cursor(page['next_cursor']),
+                         (self.documents[1]['time_in'], self.documents[1]['_id']))
+        self.assertEqual(self.collection.cursor.limit_n, 3)
+        self.assertEqual(self.collection.cursor.sort_keys, history.SORT)
+        self.assertNotIn('_id', self.collection.calls[0]['projection'])
+        self.assertIn('license_plate', self.collection.calls[0]['projection'])
+
+    def test_last_page(self):
+        page = HistoryQuery().page(page_size=10)
+        self.assertFalse(page['has_more'])
+        self.assertIsNone(page['next_cursor'])
+
+    def test_cursor_condition(self):
+        last = self.documents[1]
+        HistoryQuery(status='completed').page(cursor=encode_cursor(last), page_size=2)
+
+        self.assertEqual(self.collection.calls[0]['query'], {'$and': [
+            {'status': 'completed'},
+            {'$or': [
+                {'time_in': {'$lt': last['time_in']}},
+                {'time_in': last['time_in'], '_id': {'$lt': last['_id']}}
+            ]}
+        ]})
+
+    def test_page_size_clamped(self):
+        HistoryQuery().page(page_size=10000)
+        self.assertEqual(self.collection.cursor.limit_n, history.MAX_PAGE_SIZE + 1)
+
+
+class PageQueryStringTests(SimpleTestCase):
+
+    def test_next_and_first_page(self):
+        params = QueryDict('plate=29A&cursor=old')
+
+        self.assertEqual(QueryDict(history.next_page_query(params, 'new')).dict(), {'plate': '29A', 'cursor': 'new'})
+        self.assertIsNone(history.next_page_query(params, None))
+        self.assertEqual(history.first_page_query(params), 'plate=29A')
+
+
+class _MongoTestCase(SimpleTestCase):
+    """parking_history / presence / faculty_stats trên mongomock (có unique partial index lượt 'inside')"""
+
+    def setUp(self):
+        import mongomock
+
+        from parking import models
+        from university import models as university_models
+
+        db = mongomock.MongoClient().db
+        self.history = db['parking_history']
+        self.presence = db['presence']
+        for module, name, collection in (
+            (models, 'parking_history_collection', self.history),
+            (models, 'presence_collection', self.presence),
+            (models, 'parking_config_collection', db['parking_config']),
+            (university_models, 'faculty_stats_collection', db['faculty_stats']),
+        ):
+            patcher = mock.patch.object(module, name, collection)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.history.create_index(models.INSIDE_INDEX.keys, **models.INSIDE_INDEX.options())
+
+        self.vehicle = {'_id': ObjectId(), 'vehicle_type': 'car', 'license_plate': '29A12345', 'teacher_id': None}
+
+    def _legacy_inside(self):
+        """Lượt 'inside' tạo trước khi có collection presence"""
+        record = {
+            '_id': ObjectId(), 'vehicle_id': self.vehicle['_id'], 'status': 'inside',
+            'time_in': datetime(2024, 5, 1, 7, 0), 'vehicle_type': 'car', 'license_plate': '29A12345',
+            'faculty': None, 'teacher_id': None
+        }
+        self.history.insert_one(record)
+        return record
+
+
+class CheckinCheckoutTests(_MongoTestCase):
+
+    def _checkin(self):
+        from parking.models import ParkingHistory
+        return ParkingHistory.checkin(self.vehicle['_id'], '29A12345', vehicle=self.vehicle)
+
+    def _checkout(self):
+        from parking.models import ParkingHistory
+        return ParkingHistory.checkout(self.vehicle['_id'])
+
+    def test_checkin_then_checkout(self):
+        from parking.models import Presence
+
+        history_id = self._checkin()
+        self.assertTrue(Presence.is_inside(self.vehicle['_id']))
+        self.assertEqual(self.presence.find_one()['history_id'], history_id)
+
+        self.assertEqual(self._checkout(), history_id)
+        self.assertFalse(Presence.is_inside(self.vehicle['_id']))
+        self.assertEqual(self.history.find_one({'_id': history_id})['status'], 'completed')
+
+    def test_duplicate_checkin_and_checkout(self):
+        self._checkin()
+        with self.assertRaisesMessage(ValueError, 'Xe đang trong bãi'):
+            self._checkin()
+        self._checkout()
+        with self.assertRaisesMessage(ValueError, 'Xe không trong bãi'):
+            self._checkout()
+        self.assertEqual(self.history.count_documents({}), 1)
+
+    def test_checkout_legacy_stay_without_presence(self):
+        record = self._legacy_inside()
+
+        self.assertEqual(self._checkout(), record['_id'])
+        self.assertEqual(self.history.find_one({'_id': record['_id']})['status'], 'completed')
+
+    def test_checkin_over_legacy_stay_repairs_presence(self):
+        from parking.models import Presence
+
+        record = self._legacy_inside()
+
+        with self.assertRaisesMessage(ValueError, 'Xe đang trong bãi'):
+            self._checkin()
+        # Lần quét sau nhận ra xe đang trong bãi → check-out
+        self.assertEqual(Presence.get(self.vehicle['_id'])['history_id'], record['_id'])
+        self.assertEqual(self.history.count_documents({'status': 'inside'}), 1)
+
+    def test_checkout_removes_stale_presence(self):
+        from parking.models import Presence
+
+        self.presence.insert_one({'_id': self.vehicle['_id'], 'history_id': ObjectId(), 'vehicle_type': 'car'})
+
+        with self.assertRaisesMessage(ValueError, 'Xe không trong bãi'):
+            self._checkout()
+        self.assertFalse(Presence.is_inside(self.vehicle['_id']))
+
+
+class ConcurrentCheckinTests(_MongoTestCase):
+
+    def test_simultaneous_checkins_create_one_stay(self):
+        import threading
+
+        from parking.models import ParkingHistory
+        from university.models import ParkingRollup
+
+        # 2 cổng cùng qua bước tra cứu rồi mới ghi
+        barrier = threading.Barrier(2)
+        outcomes = []
+
+        def faculty_of(vehicle_id, vehicle=None):
+            barrier.wait(timeout=5)
+            return None
+
+        def checkin():
+            try:
+                outcomes.append(ParkingHistory.checkin(self.vehicle['_id'], '29A12345', vehicle=self.vehicle))
+            except ValueError as e:
+                outcomes.append(str(e))
+
+        with mock.patch.object(ParkingRollup, 'faculty_of', faculty_of):
+            threads = [threading.Thread(target=checkin) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        history_ids = [o for o in outcomes if isinstance(o, ObjectId)]
+        self.assertEqual(len(history_ids), 1)
+        self.assertIn('Xe đang trong bãi', outcomes)
+        self.assertEqual(self.history.count_documents({'status': 'inside'}), 1)
+        self.assertEqual(self.presence.find_one({'_id': self.vehicle['_id']})['history_id'], history_ids[0])
+
+
+class ReconcileTests(_MongoTestCase):
+
+    def test_reconcile(self):
+        from parking.models import Presence
+
+        record = self._legacy_inside()
+        stale = ObjectId()
+        self.presence.insert_one({'_id': stale, 'history_id': ObjectId(), 'vehicle_type': 'car'})
+
+        self.assertEqual(Presence.reconcile(dry_run=True), {'added': 1, 'removed': 1, 'fixed': 0, 'occupied': {'car': 1}})
+        self.assertEqual(self.presence.count_documents({}), 1)
+
+        Presence.reconcile()
+        self.assertIsNone(Presence.get(stale))
+        self.assertEqual(Presence.get(self.vehicle['_id'])['history_id'], record['_id'])
+        self.assertEqual(Presence.reconcile()['added'], 0)
@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -57,6 +58,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'parking_project.wsgi.application'
+# Stream camera chạy async khi serve qua ASGI: uvicorn parking_project.asgi:application
+ASGI_APPLICATION = 'parking_project.asgi.application'
 
 # ============================================
 # QUAN TRỌNG: DÙNG SQLITE CHO DJANGO ADMIN/SESSION
@@ -96,6 +99,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # MongoDB Atlas Config (dùng PyMongo)
 MONGODB_URI = os.getenv('MONGODB_URI')
 MONGODB_DB = os.getenv('MONGODB_DB', 'parkingDBsql')
+# Process phục vụ request: runserver (process con của autoreloader hoặc --noreload),
+# ASGI / WSGI (asgi.py, wsgi.py đặt DJANGO_SERVER_PROCESS). Các lệnh khác (makemigrations,
+# shell, seed scripts) không phải.
+IS_SERVER_PROCESS = os.getenv('DJANGO_SERVER_PROCESS') == 'True' or (
+    sys.argv[1:2] == ['runserver'] and (os.getenv('RUN_MAIN') == 'true' or '--noreload' in sys.argv)
+)
+
+# Kiểm tra / tạo index MongoDB khi khởi động (xem manage.py mongo_indexes).
+# Mặc định chỉ process server; MONGO_INDEX_CHECK=True/False để ép bật / tắt.
+MONGO_INDEX_CHECK = os.getenv('MONGO_INDEX_CHECK', str(IS_SERVER_PROCESS)) == 'True'
+
+# Camera AI: load model YOLO/OCR ngay khi khởi động (chỉ bật cho process phục vụ camera)
+CAMERA_AI_WARMUP = os.getenv('CAMERA_AI_WARMUP', 'False') == 'True'
 
 # URL chuyển hướng khi chưa đăng nhập
 LOGIN_URL = '/login/'
@@ -3,5 +3,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'parking_project.settings')
+# Process phục vụ request: bật kiểm tra index khi khởi động (settings.MONGO_INDEX_CHECK)
+os.environ.setdefault('DJANGO_SERVER_PROCESS', 'True')
 
 application = get_wsgi_application()
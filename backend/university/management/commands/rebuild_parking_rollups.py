@@ -0,0 +1,36 @@
+"""
+Dựng lại thống kê cộng dồn (faculty_stats) từ parking_history
+
+Ví dụ:
+    python manage.py rebuild_parking_rollups
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.mongodb import parking_history_collection
+from university.models import ParkingRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-day / per-faculty parking rollups from parking_history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Chạy cả khi còn bản ghi chưa backfill (tính vào khoa None)')
+
+    def handle(self, *args, **options):
+        # Rollup đọc faculty / vehicle_type trên parking_history
+        pending = parking_history_collection.count_documents({'faculty': {'$exists': False}})
+        if pending and not options['force']:
+            raise CommandError(
+                f'{pending} bản ghi parking_history chưa có faculty. '
+                f'Chạy python manage.py backfill_parking_history trước (hoặc dùng --force).'
+            )
+
+        self.stdout.write('🔄 Rebuilding parking rollups from parking_history...')
+        started = time.time()
+        counts = ParkingRollup.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {time.time() - started:.1f}s: {counts['day']} daily + {counts['all']} total documents."
+        ))
@@ -1,7 +1,26 @@
-from core.mongodb import db, teachers_collection, vehicles_collection, parking_history_collection
-from core.utils import get_current_timestamp
+from core.mongodb import (
+    db, teachers_collection, vehicles_collection, parking_history_collection, faculty_stats_collection,
+    presence_collection
+)
+from core.utils import get_current_timestamp, str_to_objectid
+from core.indexes import IndexSpec, QuerySpec
 from datetime import datetime, timedelta
 from collections import defaultdict
+from pymongo import ASCENDING, UpdateOne
+import threading
+import time
+
+ROLLUP_INDEX = IndexSpec(
+    'faculty_stats',
+    [('period', ASCENDING), ('date', ASCENDING), ('faculty', ASCENDING), ('vehicle_type', ASCENDING)],
+    name='uniq_rollup', unique=True
+)
+
+INDEXES = [ROLLUP_INDEX]
+
+HOT_QUERIES = [
+    QuerySpec('faculty_stats', ['period', 'date', 'faculty'], 'ParkingRollup (dashboard thống kê)'),
+]
 
 class UniversityConfig:
     """Cấu hình trường đại học"""
@@ -35,137 +54,292 @@ class UniversityConfig:
         return config.get('faculties', [])
 
 
-class FacultyStats:
-    """Thống kê theo khoa"""
+class ParkingRollup:
+    """
+    Thống kê cộng dồn trong collection faculty_stats (cập nhật bằng $inc ở mỗi lượt ra/vào)
+    
+    - period='day': 1 document / (ngày, khoa, loại xe): entries, exits, hours.<giờ>
+    - period='all': 1 document / (khoa, loại xe): entries, exits, hours.<giờ>
+    (số xe đang trong bãi đọc từ collection presence)
+    
+    Ngày / giờ tính theo time_in (UTC) giống $dateToString trước đây.
+    Dashboard chỉ đọc các document này, không quét parking_history.
+    Dựng lại từ lịch sử: python manage.py rebuild_parking_rollups
+    """
+    
+    DAY = 'day'
+    ALL = 'all'
+    
+    # vehicle_id → (khoa, hết hạn): tránh tra teacher ở mỗi lượt ra/vào
+    FACULTY_CACHE_TTL = 600
+    _faculty_cache = {}
+    _faculty_lock = threading.Lock()
     
     @staticmethod
-    def get_all_stats():
-        """Lấy thống kê tất cả khoa"""
-        faculties = UniversityConfig.get_faculties()
-        stats = []
+    def day_key(moment):
+        return moment.strftime('%Y-%m-%d')
+    
+    @staticmethod
+    def faculty_of(vehicle_id, vehicle=None):
+        """Khoa của chủ xe (cache theo vehicle_id)"""
+        key = str(vehicle_id)
+        now = time.monotonic()
+        with ParkingRollup._faculty_lock:
+            cached = ParkingRollup._faculty_cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
         
-        for faculty in faculties:
-            stats.append(FacultyStats.get_faculty_stats(faculty))
+        if vehicle is None:
+            vehicle = vehicles_collection.find_one({'_id': str_to_objectid(vehicle_id)}, {'teacher_id': 1})
+        teacher = None
+        if vehicle and vehicle.get('teacher_id'):
+            teacher = teachers_collection.find_one({'_id': vehicle['teacher_id']}, {'faculty': 1})
+        faculty = teacher.get('faculty') if teacher else None
         
-        return stats
+        with ParkingRollup._faculty_lock:
+            ParkingRollup._faculty_cache[key] = (faculty, now + ParkingRollup.FACULTY_CACHE_TTL)
+        return faculty
     
     @staticmethod
-    def get_faculty_stats(faculty_name):
-        """Lấy thống kê chi tiết một khoa"""
-        # Đếm giảng viên
-        total_teachers = teachers_collection.count_documents({'faculty': faculty_name})
-        
-        # Lấy danh sách teacher_ids của khoa
-        teacher_ids = [t['_id'] for t in teachers_collection.find(
-            {'faculty': faculty_name}, 
-            {'_id': 1}
-        )]
-        
-        # Đếm xe
-        total_vehicles = vehicles_collection.count_documents({
-            'teacher_id': {'$in': teacher_ids}
-        })
+    def record(event, faculty, vehicle_type, moment):
+        """
+        Cộng dồn 1 lượt check-in / check-out (1 bulk_write, 2 upsert)
         
-        # Đếm xe theo loại
-        vehicle_pipeline = [
-            {'$match': {'teacher_id': {'$in': teacher_ids}}},
-            {'$group': {
-                '_id': '$vehicle_type',
-                'count': {'$sum': 1}
-            }}
-        ]
-        vehicle_by_type = list(vehicles_collection.aggregate(vehicle_pipeline))
-        vehicle_types = {item['_id']: item['count'] for item in vehicle_by_type}
+        Lỗi chỉ được log: số liệu lệch sẽ được sửa khi rebuild.
+        """
+        try:
+            hour_field = f'hours.{moment.hour}'
+            if event == 'checkin':
+                day_inc = {'entries': 1, hour_field: 1}
+                all_inc = {'entries': 1, hour_field: 1}
+            else:
+                day_inc = {'exits': 1}
+                all_inc = {'exits': 1}
+            
+            faculty_stats_collection.bulk_write([
+                UpdateOne(
+                    {'period': ParkingRollup.DAY, 'date': ParkingRollup.day_key(moment),
+                     'faculty': faculty, 'vehicle_type': vehicle_type},
+                    {'$inc': day_inc},
+                    upsert=True
+                ),
+                UpdateOne(
+                    {'period': ParkingRollup.ALL, 'date': None, 'faculty': faculty, 'vehicle_type': vehicle_type},
+                    {'$inc': all_inc},
+                    upsert=True
+                )
+            ], ordered=False)
+        except Exception as e:
+            print(f"[WARNING] Không cập nhật được thống kê ({event} {faculty} {vehicle_type}): {e}")
+    
+    @staticmethod
+    def rebuild():
+        """
+        Dựng lại toàn bộ rollup từ parking_history
         
-        # Đếm xe đang trong bãi
-        vehicles_in_parking = FacultyStats._count_vehicles_in_parking(teacher_ids)
+        Dùng faculty / vehicle_type đã lưu trên parking_history (chạy backfill_parking_history
+        trước với dữ liệu cũ). Ghi vào collection tạm rồi rename đè faculty_stats (dashboard
+        không thấy dữ liệu dở dang). Lượt ra vào xảy ra trong lúc rebuild có thể bị mất
+        → chạy lúc vắng xe.
         
-        # Thống kê lượt ra vào hôm nay
-        today_entries = FacultyStats._count_today_entries(teacher_ids)
+        Returns:
+            dict: Số document đã tạo theo period
+        """
+        def grouped(match, group_id):
+            pipeline = [{'$match': match}, {'$group': {'_id': group_id, 'count': {'$sum': 1}}}]
+            return parking_history_collection.aggregate(pipeline, allowDiskUse=True)
         
-        # Thống kê 7 ngày
-        weekly_stats = FacultyStats._get_weekly_stats(teacher_ids)
+        day_docs = {}
+        all_docs = {}
         
-        return {
-            'faculty_name': faculty_name,
-            'total_teachers': total_teachers,
-            'total_vehicles': total_vehicles,
-            'vehicle_types': {
-                'motorcycle': vehicle_types.get('motorcycle', 0),
-                'car': vehicle_types.get('car', 0),
-                'bicycle': vehicle_types.get('bicycle', 0)
-            },
-            'vehicles_in_parking': vehicles_in_parking,
-            'today_entries': today_entries,
-            'weekly_stats': weekly_stats
+        def day_doc(date, faculty, vehicle_type):
+            key = (date, faculty, vehicle_type)
+            if key not in day_docs:
+                day_docs[key] = {'period': ParkingRollup.DAY, 'date': date, 'faculty': faculty,
+                                 'vehicle_type': vehicle_type, 'entries': 0, 'exits': 0, 'hours': {}}
+            return day_docs[key]
+        
+        def all_doc(faculty, vehicle_type):
+            key = (faculty, vehicle_type)
+            if key not in all_docs:
+                all_docs[key] = {'period': ParkingRollup.ALL, 'date': None, 'faculty': faculty,
+                                 'vehicle_type': vehicle_type, 'entries': 0, 'exits': 0, 'hours': {}}
+            return all_docs[key]
+        
+        entries = grouped({'time_in': {'$ne': None}}, {
+            'date': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$time_in'}},
+            'hour': {'$hour': '$time_in'},
+            'faculty': '$faculty',
+            'vehicle_type': '$vehicle_type'
+        })
+        for item in entries:
+            key, count = item['_id'], item['count']
+            hour = str(key['hour'])
+            for doc in (day_doc(key['date'], key.get('faculty'), key.get('vehicle_type')),
+                        all_doc(key.get('faculty'), key.get('vehicle_type'))):
+                doc['entries'] += count
+                doc['hours'][hour] = doc['hours'].get(hour, 0) + count
+        
+        exits = grouped({'time_out': {'$ne': None}}, {
+            'date': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$time_out'}},
+            'faculty': '$faculty',
+            'vehicle_type': '$vehicle_type'
+        })
+        for item in exits:
+            key, count = item['_id'], item['count']
+            day_doc(key['date'], key.get('faculty'), key.get('vehicle_type'))['exits'] += count
+            all_doc(key.get('faculty'), key.get('vehicle_type'))['exits'] += count
+        
+        # Ghi collection tạm (kèm unique index) rồi rename đè
+        staging = db[f'{ROLLUP_INDEX.collection}_rebuild']
+        staging.drop()
+        staging.create_index(ROLLUP_INDEX.keys, **ROLLUP_INDEX.options())
+        documents = list(day_docs.values()) + list(all_docs.values())
+        if documents:
+            staging.insert_many(documents)
+            staging.rename(ROLLUP_INDEX.collection, dropTarget=True)
+        else:
+            staging.drop()
+            faculty_stats_collection.delete_many({})
+        
+        return {'day': len(day_docs), 'all': len(all_docs)}
+    
+    @staticmethod
+    def totals(faculty=None):
+        """Tổng entries / exits (tất cả thời gian)"""
+        match = {'period': ParkingRollup.ALL}
+        if faculty is not None:
+            match['faculty'] = faculty
+        totals = {'entries': 0, 'exits': 0}
+        for doc in faculty_stats_collection.find(match, {'entries': 1, 'exits': 1}):
+            for field in totals:
+                totals[field] += doc.get(field, 0)
+        return totals
+    
+    @staticmethod
+    def daily_entries(start, end, faculty=None):
+        """Số lượt vào theo ngày trong [start, end] → {'YYYY-MM-DD': count}"""
+        match = {
+            'period': ParkingRollup.DAY,
+            'date': {'$gte': ParkingRollup.day_key(start), '$lte': ParkingRollup.day_key(end)}
         }
+        if faculty is not None:
+            match['faculty'] = faculty
+        counts = defaultdict(int)
+        for doc in faculty_stats_collection.find(match, {'date': 1, 'entries': 1}):
+            counts[doc['date']] += doc.get('entries', 0)
+        return dict(counts)
     
     @staticmethod
-    def _count_vehicles_in_parking(teacher_ids):
-        """Đếm xe đang trong bãi của khoa"""
-        # Lấy vehicle_ids
-        vehicle_ids = [v['_id'] for v in vehicles_collection.find(
-            {'teacher_id': {'$in': teacher_ids}},
-            {'_id': 1}
-        )]
-        
-        return parking_history_collection.count_documents({
-            'vehicle_id': {'$in': vehicle_ids},
-            'status': 'inside'
-        })
+    def daily_entries_by_faculty(start, end, faculties):
+        """daily_entries() của nhiều khoa trong 1 truy vấn → {khoa: {'YYYY-MM-DD': count}}"""
+        result = {faculty: defaultdict(int) for faculty in faculties}
+        match = {
+            'period': ParkingRollup.DAY,
+            'date': {'$gte': ParkingRollup.day_key(start), '$lte': ParkingRollup.day_key(end)},
+            'faculty': {'$in': list(faculties)}
+        }
+        for doc in faculty_stats_collection.find(match, {'faculty': 1, 'date': 1, 'entries': 1}):
+            result[doc['faculty']][doc['date']] += doc.get('entries', 0)
+        return {faculty: dict(counts) for faculty, counts in result.items()}
     
     @staticmethod
-    def _count_today_entries(teacher_ids):
-        """Đếm lượt vào hôm nay"""
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        vehicle_ids = [v['_id'] for v in vehicles_collection.find(
-            {'teacher_id': {'$in': teacher_ids}},
-            {'_id': 1}
-        )]
-        
-        return parking_history_collection.count_documents({
-            'vehicle_id': {'$in': vehicle_ids},
-            'time_in': {'$gte': today_start}
-        })
+    def hourly_entries(faculty=None):
+        """Số lượt vào theo giờ (tất cả thời gian) → {giờ: count}"""
+        match = {'period': ParkingRollup.ALL}
+        if faculty is not None:
+            match['faculty'] = faculty
+        counts = defaultdict(int)
+        for doc in faculty_stats_collection.find(match, {'hours': 1}):
+            for hour, count in (doc.get('hours') or {}).items():
+                counts[int(hour)] += count
+        return dict(counts)
+
+
+class FacultyStats:
+    """Thống kê theo khoa"""
     
     @staticmethod
-    def _get_weekly_stats(teacher_ids):
-        """Thống kê 7 ngày gần nhất"""
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        week_ago = today - timedelta(days=6)
+    def get_all_stats(faculties=None):
+        """
+        Lấy thống kê tất cả khoa (hoặc các khoa chỉ định)
         
-        vehicle_ids = [v['_id'] for v in vehicles_collection.find(
-            {'teacher_id': {'$in': teacher_ids}},
-            {'_id': 1}
-        )]
+        Tổng cộng 3 truy vấn cho mọi khoa: 1 $facet trên teachers (giảng viên + xe theo loại),
+        1 lần đọc rollup (7 ngày gần nhất) và 1 $group trên presence (xe đang trong bãi).
+        """
+        if faculties is None:
+            faculties = UniversityConfig.get_faculties()
+        faculties = list(faculties)
         
-        # Aggregate by day
+        # Giảng viên và xe theo loại của từng khoa
         pipeline = [
-            {
-                '$match': {
-                    'vehicle_id': {'$in': vehicle_ids},
-                    'time_in': {'$gte': week_ago}
-                }
-            },
-            {
-                '$group': {
-                    '_id': {
-                        '$dateToString': {
-                            'format': '%Y-%m-%d',
-                            'date': '$time_in'
-                        }
-                    },
-                    'count': {'$sum': 1}
-                }
-            },
-            {'$sort': {'_id': 1}}
+            {'$match': {'faculty': {'$in': faculties}}},
+            {'$facet': {
+                'teachers': [
+                    {'$group': {'_id': '$faculty', 'count': {'$sum': 1}}}
+                ],
+                'vehicles': [
+                    {'$lookup': {
+                        'from': 'vehicles',
+                        'localField': '_id',
+                        'foreignField': 'teacher_id',
+                        'pipeline': [{'$project': {'vehicle_type': 1}}],
+                        'as': 'vehicles'
+                    }},
+                    {'$unwind': '$vehicles'},
+                    {'$group': {
+                        '_id': {'faculty': '$faculty', 'vehicle_type': '$vehicles.vehicle_type'},
+                        'count': {'$sum': 1}
+                    }}
+                ]
+            }}
         ]
+        facets = next(teachers_collection.aggregate(pipeline), {'teachers': [], 'vehicles': []})
+        
+        teacher_counts = {item['_id']: item['count'] for item in facets['teachers']}
+        vehicle_types = defaultdict(dict)
+        for item in facets['vehicles']:
+            vehicle_types[item['_id']['faculty']][item['_id'].get('vehicle_type')] = item['count']
+        
+        # Lượt ra vào: đọc từ rollup (không quét parking_history)
+        today = get_current_timestamp().replace(hour=0, minute=0, second=0, microsecond=0)
+        week_ago = today - timedelta(days=6)
+        daily = ParkingRollup.daily_entries_by_faculty(week_ago, today, faculties)
         
-        results = list(parking_history_collection.aggregate(pipeline))
+        # Xe đang trong bãi: đếm trên presence
+        inside = {item['_id']: item['count'] for item in presence_collection.aggregate([
+            {'$match': {'faculty': {'$in': faculties}}},
+            {'$group': {'_id': '$faculty', 'count': {'$sum': 1}}}
+        ])}
+        today_str = ParkingRollup.day_key(today)
         
-        # Fill missing days with 0
-        stats_dict = {item['_id']: item['count'] for item in results}
+        stats = []
+        for faculty in faculties:
+            types = vehicle_types.get(faculty, {})
+            stats.append({
+                'faculty_name': faculty,
+                'total_teachers': teacher_counts.get(faculty, 0),
+                'total_vehicles': sum(types.values()),
+                'vehicle_types': {
+                    'motorcycle': types.get('motorcycle', 0),
+                    'car': types.get('car', 0),
+                    'bicycle': types.get('bicycle', 0)
+                },
+                'vehicles_in_parking': inside.get(faculty, 0),
+                'today_entries': daily[faculty].get(today_str, 0),
+                'weekly_stats': FacultyStats._fill_week(today, daily[faculty])
+            })
+        
+        return stats
+    
+    @staticmethod
+    def get_faculty_stats(faculty_name):
+        """Lấy thống kê chi tiết một khoa"""
+        return FacultyStats.get_all_stats([faculty_name])[0]
+    
+    @staticmethod
+    def _fill_week(today, stats_dict):
+        """Thống kê 7 ngày gần nhất (ngày không có lượt vào → 0)"""
         weekly_data = []
         
         for i in range(7):
@@ -180,9 +354,10 @@ class FacultyStats:
         return weekly_data
     
     @staticmethod
-    def get_comparison_stats():
-        """So sánh giữa các khoa"""
-        all_stats = FacultyStats.get_all_stats()
+    def get_comparison_stats(all_stats=None):
+        """So sánh giữa các khoa (all_stats: kết quả get_all_stats đã có, tránh tính lại)"""
+        if all_stats is None:
+            all_stats = FacultyStats.get_all_stats()
         
         return {
             'by_teachers': sorted(all_stats, key=lambda x: x['total_teachers'], reverse=True),
@@ -193,33 +368,21 @@ class FacultyStats:
     
     @staticmethod
     def get_top_users(faculty_name=None, limit=10):
-        """Top giảng viên sử dụng bãi xe nhiều nhất"""
-        query = {}
-        if faculty_name:
-            query['faculty'] = faculty_name
+        """
+        Top giảng viên sử dụng bãi xe nhiều nhất
         
-        # Lấy teacher_ids
-        teacher_ids = [t['_id'] for t in teachers_collection.find(query, {'_id': 1})]
+        Đếm trực tiếp trên teacher_id / faculty đã lưu ở parking_history (index faculty + teacher_id),
+        chỉ $lookup thông tin giảng viên cho limit kết quả cuối.
+        """
+        match = {'teacher_id': {'$ne': None}}
+        if faculty_name:
+            match['faculty'] = faculty_name
         
-        # Aggregate parking history
         pipeline = [
-            {
-                '$lookup': {
-                    'from': 'vehicles',
-                    'localField': 'vehicle_id',
-                    'foreignField': '_id',
-                    'as': 'vehicle'
-                }
-            },
-            {'$unwind': '$vehicle'},
-            {
-                '$match': {
-                    'vehicle.teacher_id': {'$in': teacher_ids}
-                }
-            },
+            {'$match': match},
             {
                 '$group': {
-                    '_id': '$vehicle.teacher_id',
+                    '_id': '$teacher_id',
                     'total_entries': {'$sum': 1}
                 }
             },
@@ -267,17 +430,16 @@ class SystemStats:
         vehicle_stats = list(vehicles_collection.aggregate(vehicle_pipeline))
         vehicles_by_type = {item['_id']: item['count'] for item in vehicle_stats}
         
-        # Current parking
-        current_inside = parking_history_collection.count_documents({'status': 'inside'})
+        # Lượt ra vào: đọc từ rollup (không quét parking_history)
+        totals = ParkingRollup.totals()
+        current_inside = presence_collection.estimated_document_count()
         
         # Today entries
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_entries = parking_history_collection.count_documents({
-            'time_in': {'$gte': today_start}
-        })
+        today = get_current_timestamp()
+        today_entries = ParkingRollup.daily_entries(today, today).get(ParkingRollup.day_key(today), 0)
         
         # Total entries
-        total_entries = parking_history_collection.count_documents({})
+        total_entries = totals['entries']
         
         return {
             'total_teachers': total_teachers,
@@ -292,46 +454,17 @@ class SystemStats:
     def get_monthly_stats():
         """Thống kê theo tháng"""
         # Last 6 months
-        today = datetime.now()
+        today = get_current_timestamp()
         six_months_ago = today - timedelta(days=180)
         
-        pipeline = [
-            {
-                '$match': {
-                    'time_in': {'$gte': six_months_ago}
-                }
-            },
-            {
-                '$group': {
-                    '_id': {
-                        '$dateToString': {
-                            'format': '%Y-%m',
-                            'date': '$time_in'
-                        }
-                    },
-                    'count': {'$sum': 1}
-                }
-            },
-            {'$sort': {'_id': 1}}
-        ]
+        monthly = defaultdict(int)
+        for date_str, count in ParkingRollup.daily_entries(six_months_ago, today).items():
+            monthly[date_str[:7]] += count
         
-        results = list(parking_history_collection.aggregate(pipeline))
-        return results
+        return [{'_id': month, 'count': monthly[month]} for month in sorted(monthly) if monthly[month]]
     
     @staticmethod
     def get_peak_hours():
         """Giờ cao điểm"""
-        pipeline = [
-            {
-                '$group': {
-                    '_id': {
-                        '$hour': '$time_in'
-                    },
-                    'count': {'$sum': 1}
-                }
-            },
-            {'$sort': {'_id': 1}}
-        ]
-        
-        results = list(parking_history_collection.aggregate(pipeline))
-        return results
\ No newline at end of file
+        hourly = ParkingRollup.hourly_entries()
+        return [{'_id': hour, 'count': hourly[hour]} for hour in sorted(hourly)]
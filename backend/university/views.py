@@ -9,7 +9,7 @@ def faculty_stats_list(request):
     """Danh sách thống kê các khoa"""
     try:
         all_stats = FacultyStats.get_all_stats()
-        comparison = FacultyStats.get_comparison_stats()
+        comparison = FacultyStats.get_comparison_stats(all_stats)
         system_overview = SystemStats.get_overview()
         
         context = {
@@ -1,33 +1,57 @@
+import asyncio
 from functools import wraps
+from asgiref.sync import sync_to_async
 from django.shortcuts import redirect
 from django.contrib import messages
 
-def login_required(view_func):
-    """Decorator yêu cầu đăng nhập"""
+def _check_login(request):
+    """Trả về redirect nếu chưa đăng nhập, None nếu hợp lệ"""
+    if 'user_id' not in request.session:
+        messages.warning(request, 'Vui lòng đăng nhập để tiếp tục')
+        return redirect('login')
+    return None
+
+def _check_role(request, roles):
+    """Trả về redirect nếu không đúng role, None nếu hợp lệ"""
+    denied = _check_login(request)
+    if denied is not None:
+        return denied
+
+    user_role = request.session.get('role')
+    if user_role not in roles:
+        messages.error(request, 'Bạn không có quyền truy cập trang này')
+        return redirect('teacher_dashboard' if user_role == 'teacher' else 'login')
+
+    return None
+
+def _guard(view_func, check):
+    """Bọc view bằng hàm kiểm tra (hỗ trợ cả view sync và async)"""
+    if asyncio.iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            # Session lưu trong DB → kiểm tra ở thread sync
+            denied = await sync_to_async(check)(request)
+            if denied is not None:
+                return denied
+            return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        if 'user_id' not in request.session:
-            messages.warning(request, 'Vui lòng đăng nhập để tiếp tục')
-            return redirect('login')
+        denied = check(request)
+        if denied is not None:
+            return denied
         return view_func(request, *args, **kwargs)
     return wrapper
 
+def login_required(view_func):
+    """Decorator yêu cầu đăng nhập"""
+    return _guard(view_func, _check_login)
+
 def role_required(*roles):
     """Decorator yêu cầu role cụ thể"""
     def decorator(view_func):
-        @wraps(view_func)
-        def wrapper(request, *args, **kwargs):
-            if 'user_id' not in request.session:
-                messages.warning(request, 'Vui lòng đăng nhập để tiếp tục')
-                return redirect('login')
-            
-            user_role = request.session.get('role')
-            if user_role not in roles:
-                messages.error(request, 'Bạn không có quyền truy cập trang này')
-                return redirect('teacher_dashboard' if user_role == 'teacher' else 'login')
-            
-            return view_func(request, *args, **kwargs)
-        return wrapper
+        return _guard(view_func, lambda request: _check_role(request, roles))
     return decorator
 
 def admin_required(view_func):
@@ -40,4 +64,4 @@ def security_required(view_func):
 
 def teacher_required(view_func):
     """Decorator yêu cầu teacher"""
-    return role_required('teacher')(view_func)
\ No newline at end of file
+    return role_required('teacher')(view_func)
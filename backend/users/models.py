@@ -1,6 +1,23 @@
 from core.mongodb import users_collection, teachers_collection
 from core.utils import hash_password, verify_password, str_to_objectid, get_current_timestamp
+from core.indexes import IndexSpec, QuerySpec
 from bson import ObjectId
+from pymongo import ASCENDING
+
+INDEXES = [
+    IndexSpec('users', [('username', ASCENDING)], unique=True),
+    IndexSpec('users', [('email', ASCENDING)], unique=True),
+    IndexSpec('users', [('role', ASCENDING)]),
+    IndexSpec('teachers', [('user_id', ASCENDING)], unique=True),
+    IndexSpec('teachers', [('employee_id', ASCENDING)], unique=True),
+    IndexSpec('teachers', [('faculty', ASCENDING)]),
+]
+
+HOT_QUERIES = [
+    QuerySpec('users', ['username'], 'User.authenticate'),
+    QuerySpec('teachers', ['user_id'], 'Teacher.get_by_user_id'),
+    QuerySpec('teachers', ['faculty'], 'Teacher.get_all, thống kê theo khoa'),
+]
 
 class User:
     """User model"""
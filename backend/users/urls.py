@@ -18,6 +18,7 @@ urlpatterns = [
     
     # Admin Parking (custom)
     path('management/parking/history/', views.admin_parking_history, name='admin_parking_history'),
+    path('management/parking/history/api/', views.api_parking_history, name='api_parking_history'),
     path('management/parking/config/', views.admin_parking_config, name='admin_parking_config'),
     
     # Security Dashboard
@@ -28,4 +29,5 @@ urlpatterns = [
     
     # Teacher Dashboard
     path('teacher/dashboard/', views.teacher_dashboard, name='teacher_dashboard'),
+    path('teacher/history/', views.teacher_parking_history, name='teacher_parking_history_all'),
 ]
\ No newline at end of file
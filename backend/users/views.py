@@ -9,9 +9,9 @@ import base64
 from users.models import User, Teacher
 from users.decorators import login_required, role_required, admin_required, security_required, teacher_required
 from vehicles.models import Vehicle
-from parking.models import ParkingConfig, ParkingHistory
-from core.mongodb import parking_history_collection
-from core.utils import str_to_objectid
+from parking.models import ParkingConfig, ParkingHistory, Presence
+from parking.history import HistoryQuery, HISTORY_STATUSES, attach_owner_names, first_page_query, next_page_query, serialize_record
+from university.models import UniversityConfig
 
 # ============ AUTHENTICATION VIEWS ============
 
@@ -81,12 +81,13 @@ def admin_dashboard(request):
     # Thống kê
     total_teachers = len(Teacher.get_all())
     total_vehicles = len(Vehicle.get_all())
-    total_parkings = len(ParkingHistory.get_today())
+    total_parkings = ParkingHistory.get_statistics()['total_today']
     
     context = {
         'total_teachers': total_teachers,
         'total_vehicles': total_vehicles,
         'total_parkings': total_parkings,
+        'parking_configs': ParkingConfig.get_all(),
     }
     return render(request, 'admin/dashboard.html', context)
 
@@ -305,18 +306,23 @@ def teacher_my_qr(request):
 @login_required
 @teacher_required
 def teacher_parking_history(request):
-    """Lịch sử đỗ xe của giảng viên"""
+    """Lịch sử đỗ xe của giảng viên (mọi xe, 1 truy vấn $in, phân trang keyset)"""
     user_id = request.session.get('user_id')
     teacher = Teacher.get_by_user_id(user_id)
     
-    # Lấy lịch sử của tất cả xe của giảng viên
     vehicles = Vehicle.get_by_teacher(str(teacher['_id']))
-    histories = []
-    for vehicle in vehicles:
-        histories.extend(ParkingHistory.get_by_vehicle(str(vehicle['_id'])))
+    try:
+        history_query = HistoryQuery.from_params(request.GET, vehicle_ids=[v['_id'] for v in vehicles])
+        page = history_query.page(request.GET.get('cursor'), request.GET.get('page_size'))
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('teacher_parking_history_all')
     
     context = {
-        'histories': histories
+        'history': page['items'],
+        'next_query': next_page_query(request.GET, page['next_cursor']),
+        'first_query': first_page_query(request.GET),
+        'is_first_page': not request.GET.get('cursor')
     }
     return render(request, 'teacher/parking_history.html', context)
 
@@ -327,7 +333,8 @@ def teacher_parking_history(request):
 def security_dashboard(request):
     """Dashboard bảo vệ"""
     context = {
-        'now': datetime.now()
+        'now': datetime.now(),
+        'parking_configs': ParkingConfig.get_all()
     }
     return render(request, 'security/dashboard.html', context)
 
@@ -361,11 +368,7 @@ def security_manual_entry(request):
                 vehicle['id'] = str(vehicle['_id'])
                 
                 # Check if inside
-                history = parking_history_collection.find_one({
-                    'vehicle_id': vehicle_data['_id'],
-                    'status': 'inside'
-                })
-                is_inside = history is not None
+                is_inside = Presence.is_inside(vehicle_data['_id'])
     
     context = {
         'license_plate': license_plate,
@@ -382,20 +385,15 @@ def security_checkout(request, vehicle_id):
     vehicle = Vehicle.get_by_id(vehicle_id)
     
     if vehicle:
-        # Cập nhật lịch sử đỗ xe
-        parking_history_collection.update_one(
-            {
-                'vehicle_id': str_to_objectid(vehicle_id),
-                'status': 'inside'
-            },
-            {
-                '$set': {
-                    'status': 'outside',
-                    'checkout_time': datetime.now()
-                }
-            }
-        )
-        messages.success(request, f"Xe {vehicle.get('license_plate')} đã checkout")
+        # Đóng lượt gửi (xóa presence, cùng luồng với quét QR)
+        try:
+            ParkingHistory.checkout(
+                vehicle_id=vehicle_id,
+                security_id=request.session.get('user_id')
+            )
+            messages.success(request, f"Xe {vehicle.get('license_plate')} đã checkout")
+        except ValueError as e:
+            messages.error(request, str(e))
     else:
         messages.error(request, 'Không tìm thấy xe')
     
@@ -406,14 +404,49 @@ def security_checkout(request, vehicle_id):
 @login_required
 @admin_required
 def admin_parking_history(request):
-    """Lịch sử đỗ xe"""
-    histories = ParkingHistory.get_today()
+    """Lịch sử đỗ xe (lọc theo ngày / biển số / khoa / loại xe / trạng thái, phân trang keyset)"""
+    try:
+        history_query = HistoryQuery.from_params(request.GET)
+        page = history_query.page(request.GET.get('cursor'), request.GET.get('page_size'))
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('admin_parking_history')
     
     context = {
-        'histories': histories
+        'history': attach_owner_names(page['items']),
+        'total': ParkingHistory.get_statistics()['total_today'],
+        'next_query': next_page_query(request.GET, page['next_cursor']),
+        'first_query': first_page_query(request.GET),
+        'is_first_page': not request.GET.get('cursor'),
+        'filters': request.GET,
+        'faculties': UniversityConfig.get_faculties(),
+        'vehicle_types': Vehicle.VEHICLE_TYPES,
+        'statuses': HISTORY_STATUSES
     }
     return render(request, 'admin/parking_history.html', context)
 
+@login_required
+@admin_required
+def api_parking_history(request):
+    """
+    API: Lịch sử đỗ xe (JSON)
+    
+    GET params: date_from, date_to, plate, faculty, vehicle_type, status, cursor, page_size
+    Trang sau: gửi lại cursor = next_cursor
+    """
+    try:
+        history_query = HistoryQuery.from_params(request.GET)
+        page = history_query.page(request.GET.get('cursor'), request.GET.get('page_size'))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'items': [serialize_record(record) for record in attach_owner_names(page['items'])],
+        'next_cursor': page['next_cursor'],
+        'has_more': page['has_more']
+    })
+
 @login_required
 @admin_required
 def admin_parking_config(request):
@@ -3,12 +3,28 @@ from django.db import models
 # Create your models here.
 from core.mongodb import vehicles_collection, qr_codes_collection
 from core.utils import str_to_objectid, get_current_timestamp
+from core.indexes import IndexSpec, QuerySpec
 from bson import ObjectId
+from pymongo import ASCENDING
 import qrcode
 from io import BytesIO
 import os
 from django.conf import settings
 
+INDEXES = [
+    IndexSpec('vehicles', [('license_plate', ASCENDING)]),
+    IndexSpec('vehicles', [('teacher_id', ASCENDING), ('is_active', ASCENDING)]),
+    IndexSpec('qr_codes', [('vehicle_id', ASCENDING)]),
+    IndexSpec('qr_codes', [('qr_data', ASCENDING)]),
+]
+
+HOT_QUERIES = [
+    QuerySpec('vehicles', ['license_plate', 'is_active'], 'Vehicle.get_by_license_plate / create'),
+    QuerySpec('vehicles', ['teacher_id', 'is_active'], 'Vehicle.get_by_teacher, thống kê theo khoa'),
+    QuerySpec('qr_codes', ['vehicle_id'], 'QRCode.get_by_vehicle'),
+    QuerySpec('qr_codes', ['qr_data'], 'QRCode.verify'),
+]
+
 class Vehicle:
     """Vehicle model"""
     
@@ -6,7 +6,7 @@ from django.contrib import messages
 from users.decorators import login_required, admin_required, teacher_required
 from vehicles.models import Vehicle, QRCode
 from users.models import Teacher
-from parking.models import ParkingHistory
+from parking.history import HistoryQuery, first_page_query, next_page_query
 
 # ============ ADMIN VIEWS ============
 
@@ -185,11 +185,19 @@ def teacher_parking_history(request, vehicle_id):
         messages.error(request, 'Bạn không có quyền xem lịch sử xe này')
         return redirect('teacher_vehicles_list')
 
-    # Fetch history
-    history = ParkingHistory.get_by_vehicle(vehicle_id, limit=100)
+    # 1 trang lịch sử (keyset, chỉ các trường hiển thị)
+    try:
+        history_query = HistoryQuery.from_params(request.GET, vehicle_ids=[vehicle['_id']])
+        page = history_query.page(request.GET.get('cursor'), request.GET.get('page_size'))
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('teacher_parking_history', vehicle_id=vehicle_id)
 
     context = {
         'vehicle': vehicle,
-        'history': history
+        'history': page['items'],
+        'next_query': next_page_query(request.GET, page['next_cursor']),
+        'first_query': first_page_query(request.GET),
+        'is_first_page': not request.GET.get('cursor')
     }
     return render(request, 'teacher/parking_history.html', context)
\ No newline at end of file
@@ -9,6 +9,7 @@ import django
 django.setup()
 
 from core.mongodb import db
+from core.indexes import create_indexes
 
 def init_mongodb():
     """Khởi tạo MongoDB collections và indexes"""
@@ -22,7 +23,8 @@ def init_mongodb():
         'qr_codes',
         'parking_history',
         'parking_config',
-        'faculty_stats'
+        'faculty_stats',
+        'presence'
     ]
     
     for collection_name in collections:
@@ -35,17 +37,13 @@ def init_mongodb():
     # Create indexes
     print("\n📑 Creating indexes...")
     
-    # Users indexes
-    db.users.create_index('username', unique=True)
-    db.users.create_index('email', unique=True)
-    db.users.create_index('role')
-    print("✅ Users indexes created")
-    
-    # Teachers indexes
-    db.teachers.create_index('user_id', unique=True)
-    db.teachers.create_index('employee_id', unique=True)
-    db.teachers.create_index('faculty')
-    print("✅ Teachers indexes created")
+    # Index khai báo trong các module model (users, vehicles, parking)
+    diff = create_indexes()
+    for spec in diff['missing']:
+        print(f"✅ Created index: {spec}")
+    for spec, info in diff['changed']:
+        print(f"⚠️  Index khác khai báo: {spec} (xem: python manage.py mongo_indexes)")
+    print(f"ℹ️  {len(diff['ok'])} indexes already exist")
     
     print("\n✅ MongoDB initialization completed!")
 